@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
 import os
+import re
+import sys
 import time
+import random
 import argparse
 import platform
 import base64
@@ -15,6 +18,21 @@ logger = logging.getLogger('__undefined__')
 
 
 def main():
+    args = parse_args()
+
+    set_logging_level(args.debug)
+    logger = logging.getLogger('oneID-connect/benchmark')
+
+    logger.debug('args=%s', args)
+
+    if (args.environment):
+        show_environment()
+
+    run_crypto_tasks(args)
+    run_library_tasks(args)
+
+
+def parse_args():
     parser = argparse.ArgumentParser(description='Run specific benchmark for oneID-connect library')
     parser.add_argument('-d', '--debug',
                         choices=['NONE', 'INFO', 'DEBUG', 'WARNING', 'ERROR'],
@@ -41,10 +59,39 @@ def main():
                         action='store_true',
                         help='Sign and verify signatures'
                         )
+    parser.add_argument('-K', '--public-keys',
+                        action='store_true',
+                        help='Get public keys and their encodings from a Keypair'
+                        )
     parser.add_argument('-J', '--jwt',
                         action='store_true',
                         help='Create and verify JWTs'
                         )
+    parser.add_argument('-O', '--json-codecs',
+                        action='store_true',
+                        help='Encode and decode claims, and create and verify JWTs, with each '
+                             'installed JSON codec at several payload sizes'
+                        )
+    parser.add_argument('-N', '--nonces',
+                        action='store_true',
+                        help='Create nonces and parse their timestamps, comparing against '
+                             'per-character SystemRandom and dateutil'
+                        )
+    parser.add_argument('-C', '--sessions',
+                        action='store_true',
+                        help='Create server sessions from the default configuration, '
+                             'with and without the configuration cache'
+                        )
+    parser.add_argument('-I', '--imports',
+                        action='store_true',
+                        help='Time importing oneid modules in fresh interpreters, '
+                             'and list the heavy dependencies each one loads'
+                        )
+    parser.add_argument('-H', '--http',
+                        action='store_true',
+                        help='Make HTTP requests to a local stub server, with and without '
+                             'connection pooling'
+                        )
     parser.add_argument('-s', '--data-size',
                         type=int,
                         default=256,
@@ -56,15 +103,10 @@ def main():
                         help='Number of operations to perform (default: %(default)s)'
                         )
 
-    args = parser.parse_args()
+    return parser.parse_args()
 
-    set_logging_level(args.debug)
-    logger = logging.getLogger('oneID-connect/benchmark')
-
-    logger.debug('args=%s', args)
 
-    if (args.environment):
-        show_environment()
+def run_crypto_tasks(args):
     if args.aes_keys:
         run_aes_keys_tasks(args.count)
     if args.symmetric:
@@ -73,15 +115,30 @@ def main():
         run_ecdsa_key_tasks(args.count)
     if args.asymmetric:
         run_asymmetric_tasks(args.data_size, args.count)
+    if args.public_keys:
+        run_public_key_tasks(args.count)
     if args.jwt:
         run_jwt_tasks(args.data_size, args.count)
 
 
+def run_library_tasks(args):
+    if args.json_codecs:
+        run_json_codec_tasks(args.count)
+    if args.nonces:
+        run_nonce_tasks(args.count)
+    if args.sessions:
+        run_session_tasks(args.count)
+    if args.http:
+        run_http_tasks(args.data_size, args.count)
+    if args.imports:
+        run_import_tasks(args.count)
+
+
 @contextmanager
-def operations_timer(numops, oplabel='operations'):
-    start = time.process_time()
+def operations_timer(numops, oplabel='operations', clock=time.process_time):
+    start = clock()
     yield
-    end = time.process_time()
+    end = clock()
     delta = end - start
     rate = numops/delta
 
@@ -119,6 +176,53 @@ def run_symmetric_tasks(data_size, count):
         for _ in range(count):
             oneid.service.decrypt_attr_value(edata, key)
 
+    run_aes_context_tasks(key, data, count)
+    run_attr_batch_tasks(key, data, count)
+
+
+def run_aes_context_tasks(key, data, count):
+    print('Comparing a new AES-GCM context per message with a reused one')
+
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.backends import default_backend
+
+    credentials = oneid.keychain.ProjectCredentials(
+        'benchmark', oneid.service.create_secret_key(), key,
+    )
+
+    with operations_timer(count, 'encryptions (new context)'):
+        for _ in range(count):
+            encryptor = Cipher(
+                algorithms.AES(key), modes.GCM(os.urandom(16)), backend=default_backend()
+            ).encryptor()
+            encryptor.update(data) + encryptor.finalize() + encryptor.tag
+
+    with operations_timer(count, 'encryptions (reused context)'):
+        for _ in range(count):
+            credentials.encrypt(data)
+
+    edata = credentials.encrypt(data)
+
+    with operations_timer(count, 'decryptions (reused context)'):
+        for _ in range(count):
+            credentials.decrypt(edata)
+
+
+def run_attr_batch_tasks(key, data, count):
+    print('Encrypting/Decrypting {:,d} message(s) in batches'.format(count))
+
+    with operations_timer(count, 'batch encryptions'):
+        edata = list(oneid.service.encrypt_attr_values((data for _ in range(count)), key))
+
+    with operations_timer(count, 'batch decryptions'):
+        for _ in oneid.service.decrypt_attr_values(edata, key):
+            pass
+
+    with operations_timer(count, 'batch encryptions (process pool)', clock=time.time):
+        for _ in oneid.service.encrypt_attr_values((data for _ in range(count)), key,
+                                                   backend='process'):
+            pass
+
 
 def run_ecdsa_key_tasks(count):
     print('Creating {:,d} ECDSA key(s)'.format(count))
@@ -144,6 +248,68 @@ def run_asymmetric_tasks(data_size, count):
             if not keypair.verify(data, sig):
                 raise RuntimeError('error verifying signature')
 
+    run_signature_codec_tasks(keypair, data, count)
+
+
+def run_signature_codec_tasks(keypair, data, count):
+    print('Converting {:,d} signatures between DER and raw R||S'.format(count))
+
+    import binascii
+    from cryptography.hazmat.primitives.asymmetric.utils \
+        import decode_dss_signature, encode_dss_signature
+
+    raw = oneid.utils.base64url_decode(keypair.sign(data))
+    der = oneid.signatures.raw_to_der(raw)
+    size = len(raw) // 2
+
+    with operations_timer(count, 'hex DER->raw conversions'):
+        for _ in range(count):
+            r, s = decode_dss_signature(der)
+            binascii.unhexlify('%0*x' % (2 * size, r)) + \
+                binascii.unhexlify('%0*x' % (2 * size, s))
+
+    with operations_timer(count, 'hex raw->DER conversions'):
+        for _ in range(count):
+            encode_dss_signature(int(binascii.hexlify(raw[:size]), 16),
+                                 int(binascii.hexlify(raw[size:]), 16))
+
+    with operations_timer(count, 'codec DER->raw conversions'):
+        for _ in range(count):
+            oneid.signatures.der_to_raw(der, size)
+
+    with operations_timer(count, 'codec raw->DER conversions'):
+        for _ in range(count):
+            oneid.signatures.raw_to_der(raw)
+
+
+def run_public_key_tasks(count):
+    print('Getting {:,d} public keys and encodings'.format(count))
+
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+    keypair = oneid.service.create_secret_key()
+    private_key = keypair._private_key
+
+    with operations_timer(count, 'uncached DER+PEM encodings'):
+        for _ in range(count):
+            private_key.public_key().public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo)
+            private_key.public_key().public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo)
+
+    with operations_timer(count, 'cached DER+PEM encodings'):
+        for _ in range(count):
+            keypair.public_key_der
+            keypair.public_key_pem
+
+    with operations_timer(count, 'cached thumbprints'):
+        for _ in range(count):
+            keypair.thumbprint
+
+    overhead = sum(sys.getsizeof(value) for value in [
+        keypair._public_key_der, keypair._public_key_pem, keypair._thumbprint,
+    ])
+    print('Cached encodings use {:,d} bytes per Keypair (plus the public key object)'
+          .format(overhead))
+
 
 def run_jwt_tasks(data_size, count):
     print('Creating/Verifying {:,d} JWTs with {:,d}-byte random payloads'.format(count, data_size))
@@ -161,6 +327,259 @@ def run_jwt_tasks(data_size, count):
             if not oneid.jwts.verify_jwt(jwt, keypair):
                 raise RuntimeError('error verifying jwt')
 
+    keypair.identity = 'benchmark'
+    jws = oneid.jwts.make_jws(data, keypair)
+
+    with operations_timer(count, 'JWS creates'):
+        for _ in range(count):
+            oneid.jwts.make_jws(data, keypair)
+
+    with operations_timer(count, 'JWS verifies'):
+        for _ in range(count):
+            if not oneid.jwts.verify_jws(jws, keypair):
+                raise RuntimeError('error verifying jws')
+
+    run_multi_signature_jws_tasks(data, count)
+    run_junk_jwt_tasks(keypair, data, count)
+
+
+def run_junk_jwt_tasks(keypair, data, count):
+    print('Rejecting {:,d} junk JWTs'.format(count))
+
+    impostor = oneid.service.create_secret_key()
+    junk = [
+        'not a jwt',
+        oneid.jwts.make_jwt(dict(data, exp=int(time.time()) - 60), keypair),
+        oneid.jwts.make_jwt(data, impostor),
+    ]
+
+    oneid.jwts.reset_rejection_counts()
+
+    with operations_timer(count, 'rejections'):
+        for index in range(count):
+            try:
+                oneid.jwts.verify_jwt(junk[index % len(junk)], keypair)
+            except ValueError:
+                pass
+            except oneid.exceptions.InvalidSignatureError:
+                pass
+
+    print('Rejected at: {}'.format(', '.join(
+        '{}={:,d}'.format(stage, count)
+        for stage, count in sorted(oneid.jwts.get_rejection_counts().items()) if count
+    )))
+
+
+def run_multi_signature_jws_tasks(data, count):
+    print('Verifying {:,d} 3-signature device messages'.format(count))
+
+    keypairs = [oneid.service.create_secret_key() for _ in range(3)]
+    for index, keypair in enumerate(keypairs):
+        keypair.identity = 'benchmark-{}'.format(index)
+
+    jws = oneid.jwts.make_jws(data, keypairs)
+
+    for signers in (3, 5, 10):
+        signer_keypairs = [oneid.service.create_secret_key() for _ in range(signers)]
+        for index, keypair in enumerate(signer_keypairs):
+            keypair.identity = 'benchmark-signer-{}'.format(index)
+
+        with operations_timer(count, '{}-signer JWS creates'.format(signers)):
+            for _ in range(count):
+                oneid.jwts.make_jws(data, signer_keypairs)
+
+    # as in DeviceSession.verify_message with rekey credentials
+    with operations_timer(count, 'JWS key ID lookups + verifies'):
+        for _ in range(count):
+            oneid.jwts.get_jws_key_ids(jws)
+            oneid.jwts.verify_jws(jws, keypairs)
+
+    with operations_timer(count, 'parsed JWS key ID lookups + verifies'):
+        for _ in range(count):
+            parsed = oneid.jwts.ParsedJWS(jws)
+            oneid.jwts.get_jws_key_ids(parsed)
+            oneid.jwts.verify_jws(parsed, keypairs)
+
+    from concurrent import futures
+
+    with futures.ThreadPoolExecutor(len(keypairs)) as executor:
+        with operations_timer(count, 'sequential JWS verifies', clock=time.time):
+            for _ in range(count):
+                oneid.jwts.verify_jws(jws, keypairs)
+
+        with operations_timer(count, 'concurrent JWS verifies', clock=time.time):
+            for _ in range(count):
+                oneid.jwts.verify_jws(jws, keypairs, backend=executor)
+
+
+def run_json_codec_tasks(count, data_sizes=(16, 1024, 64 * 1024)):
+    import json
+
+    keypair = oneid.service.create_secret_key()
+    keypair.identity = 'benchmark'
+
+    for data_size in data_sizes:
+        data = {
+            'd': base64.b64encode(os.urandom(data_size)).decode('utf-8')[:data_size],
+            'n': list(range(data_size // 64)),
+        }
+        print('JSON codecs with {:,d}-byte payloads '
+              '(stdlib json.dumps: {:,d} bytes)'.format(data_size, len(json.dumps(data))))
+
+        for name in oneid.jsoncodecs.available_json_codecs():
+            codec = oneid.jsoncodecs.get_json_codec(name)
+            encoded = codec.encode(data)
+            print('{}: {:,d} bytes'.format(name, len(encoded)))
+
+            with operations_timer(count, '{} encodes'.format(name)):
+                for _ in range(count):
+                    codec.encode(data)
+
+            with operations_timer(count, '{} decodes'.format(name)):
+                for _ in range(count):
+                    codec.decode(encoded)
+
+            jwt = oneid.jwts.make_jwt(data, keypair, json_encoder=codec.encode)
+
+            with operations_timer(count, '{} JWT creates'.format(name)):
+                for _ in range(count):
+                    oneid.jwts.make_jwt(data, keypair, json_encoder=codec.encode)
+
+            with operations_timer(count, '{} JWT verifies'.format(name)):
+                for _ in range(count):
+                    oneid.jwts.verify_jwt(jwt, keypair, json_decoder=codec.decode)
+
+
+def run_nonce_tasks(count):
+    print('Creating/Parsing {:,d} nonces'.format(count))
+
+    from datetime import datetime
+    from dateutil import parser, tz
+
+    system_random = random.SystemRandom()
+
+    with operations_timer(count, 'SystemRandom creates'):
+        for _ in range(count):
+            prefix = '001' + time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            valid_chars = ''.join(chr(c) for c in range(128) if chr(c).isalnum())
+            prefix + ''.join(system_random.choice(valid_chars) for _ in range(6))
+
+    with operations_timer(count, 'buffered creates'):
+        for _ in range(count):
+            oneid.utils.make_nonce()
+
+    nonce = oneid.utils.make_nonce()
+    nonce_re = (r'^001[2-9][0-9]{3}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])'
+                r'T([01][0-9]|2[0-3])(:[0-5][0-9]){2}Z[A-Za-z0-9]{6}$')
+    epoch = datetime(1970, 1, 1, tzinfo=tz.tzutc())
+
+    with operations_timer(count, 'dateutil parses'):
+        for _ in range(count):
+            if re.match(nonce_re, nonce):
+                (parser.parse(nonce[3:-6]) - epoch).total_seconds()
+
+    with operations_timer(count, 'fixed-format parses'):
+        for _ in range(count):
+            oneid.utils.parse_nonce_timestamp(nonce)
+
+    with operations_timer(count, 'nonce verifies'):
+        for _ in range(count):
+            if not oneid.utils.verify_and_burn_nonce(nonce):
+                raise RuntimeError('error verifying nonce')
+
+
+def run_import_tasks(count):
+    count = min(count, 20)  # each import needs a new interpreter
+    print('Importing oneid modules in {:,d} fresh interpreters each'.format(count))
+
+    import json
+    import subprocess
+
+    heavy_modules = ['requests', 'yaml', 'concurrent.futures', 'multiprocessing']
+    script = (
+        'import sys, time, json\n'
+        'start = time.perf_counter()\n'
+        'import {module}\n'
+        'print(json.dumps([time.perf_counter() - start, '
+        '[m for m in {heavy!r} if m in sys.modules]]))\n'
+    )
+
+    for module in ['oneid', 'oneid.jwts', 'oneid.keychain', 'oneid.session']:
+        elapsed = []
+        for _ in range(count):
+            output = subprocess.check_output([
+                sys.executable, '-c', script.format(module=module, heavy=heavy_modules),
+            ])
+            seconds, loaded = json.loads(output.decode('utf-8'))
+            elapsed.append(seconds)
+
+        print('Imported {} in {:,.2f} ms on average, loading: {}'.format(
+            module, 1000 * sum(elapsed) / count, ', '.join(loaded) or 'none',
+        ))
+
+
+def run_session_tasks(count):
+    print('Creating {:,d} server sessions'.format(count))
+
+    keypair = oneid.service.create_secret_key()
+    credentials = oneid.keychain.Credentials('benchmark', keypair)
+
+    with operations_timer(count, 'uncached sessions'):
+        for _ in range(count):
+            oneid.session._config_cache.clear()
+            oneid.service._service_class_cache.clear()
+            oneid.session.ServerSession(credentials)
+
+    with operations_timer(count, 'cached sessions'):
+        for _ in range(count):
+            oneid.session.ServerSession(credentials)
+
+
+def run_http_tasks(data_size, count):
+    print('Making {:,d} HTTP requests with {:,d}-byte bodies to a local stub server'
+          .format(count, data_size))
+
+    import threading
+    import requests
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    url = 'http://127.0.0.1:{}/'.format(server.server_port)
+    body = os.urandom(data_size)
+    transport = oneid.transport.HTTPTransport()
+
+    try:
+        # wall-clock time, as most of the cost of a new connection is spent waiting
+        with operations_timer(count, 'unpooled requests', time.perf_counter):
+            for _ in range(count):
+                requests.request('POST', url, data=body)
+
+        with operations_timer(count, 'pooled requests', time.perf_counter):
+            for _ in range(count):
+                transport.request('POST', url, data=body)
+    finally:
+        transport.close()
+        server.shutdown()
+        server.server_close()
+
 
 def set_logging_level(debug_level):
     level = getattr(logging, debug_level.upper(), 100)
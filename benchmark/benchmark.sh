@@ -55,6 +55,11 @@ for size in 10 100 1000 10000 100000 1000000; do
   $MPROF_PLOT
 done
 
+# Public key encodings
+echo 'Public key encodings'
+time python $BENCHMARK_PY --public-keys --count $n
+$MPROF_RUN python $BENCHMARK_PY --public-keys --count $n
+
 # JWT creation/verification
 echo 'JWT creation/verification'
 for size in 10 100 1000 10000 100000 1000000; do
@@ -64,4 +69,28 @@ for size in 10 100 1000 10000 100000 1000000; do
   $MPROF_PLOT
 done
 
+# JSON codecs
+echo 'JSON codecs'
+time python $BENCHMARK_PY --json-codecs --count $n
+$MPROF_RUN python $BENCHMARK_PY --json-codecs --count $n
+
+# Nonce parsing
+echo 'Nonce parsing'
+time python $BENCHMARK_PY --nonces --count $n
+$MPROF_RUN python $BENCHMARK_PY --nonces --count $n
+
+# Session creation
+echo 'Session creation'
+time python $BENCHMARK_PY --sessions --count $n
+$MPROF_RUN python $BENCHMARK_PY --sessions --count $n
+
+# Import time
+echo 'Import time'
+python $BENCHMARK_PY --imports --count 20
+
+# HTTP connection pooling
+echo 'HTTP connection pooling'
+time python $BENCHMARK_PY --http --count $n
+$MPROF_RUN python $BENCHMARK_PY --http --count $n
+
 echo 'Benchmarks complete'
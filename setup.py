@@ -47,6 +47,10 @@ setup(
         'oneid': ['data/*.yaml'],
     },
     install_requires=['cryptography>=1.3.0,<1.4', 'PyYAML>=3.11,<4',
-                      'requests[security]>=2.9.1,<2.10', 'python-dateutil>=2.4.2,<2.5',
+                      'requests[security]>=2.9.1,<2.10',
                       'pytz>=2015.7', 'six>=1.10.0,<1.11'],
+    extras_require={
+        ':python_version < "3"': ['futures>=3.0.5'],
+        'aio:python_version >= "3.5.3"': ['aiohttp>=3.3'],
+    },
 )
@@ -1,8 +1,32 @@
-from . import keychain
-from . import service
-from . import session
-from . import jwts
-from . import utils
+import sys
 
+__all__ = (
+    'keychain', 'service', 'session', 'batching', 'jwts', 'jsoncodecs', 'nonces', 'signatures',
+    'tokens', 'transport', 'utils',
+)
 
-__all__ = (keychain, service, session, jwts, utils)
+if sys.version_info >= (3, 7):
+    import importlib
+
+    def __getattr__(name):
+        # import submodules on first use, so that e.g. verifying JWTs doesn't
+        # load the session and HTTP machinery (PEP 562)
+        if name in __all__:
+            return importlib.import_module('.' + name, __name__)
+
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+    def __dir__():
+        return sorted(set(globals()) | set(__all__))
+else:  # pragma: no cover
+    from . import keychain
+    from . import service
+    from . import session
+    from . import batching
+    from . import jwts
+    from . import jsoncodecs
+    from . import nonces
+    from . import signatures
+    from . import tokens
+    from . import transport
+    from . import utils
@@ -0,0 +1,242 @@
+"""
+asyncio versions of the server and admin sessions.
+
+Service methods created for these sessions are coroutines. Requests are made over
+a pooled :py:mod:`aiohttp` client, with a cap on how many are in flight at once,
+and signing is run in an executor so that it doesn't block the event loop.
+
+Requires Python 3.5 or later, and `aiohttp` (``pip install oneID-connect[aio]``).
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import functools
+import collections
+import logging
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from . import service, session, jwts, exceptions
+from .transport import HTTP_POOL_MAXSIZE, HTTP_CONNECT_TIMEOUT_SEC, HTTP_READ_TIMEOUT_SEC
+
+logger = logging.getLogger(__name__)
+
+
+AIO_MAX_CONCURRENCY = HTTP_POOL_MAXSIZE
+
+AsyncResponse = collections.namedtuple('AsyncResponse', ['status_code', 'content'])
+
+
+class AsyncHTTPTransport(object):
+    """
+    Makes HTTP requests from coroutines, over pooled, keep-alive connections.
+
+    The underlying :py:class:`aiohttp.ClientSession` is created on first use, and
+    is bound to the event loop that was running at the time.
+    """
+    def __init__(self, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT_SEC, read_timeout=HTTP_READ_TIMEOUT_SEC,
+                 max_concurrency=AIO_MAX_CONCURRENCY):
+        """
+        :param pool_maxsize: maximum number of connections to keep open to each host
+        :param connect_timeout: seconds to wait to establish a connection, or None to wait forever
+        :param read_timeout: seconds to wait for the server to respond, or None to wait forever
+        :param max_concurrency: maximum number of requests in flight at once
+        :raises: :py:class:`ImportError` if `aiohttp` isn't installed
+        """
+        if aiohttp is None:  # pragma: no cover
+            raise ImportError('AsyncHTTPTransport requires aiohttp')
+
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_concurrency = max_concurrency
+
+        self._client = None
+        self._semaphore = None
+
+    async def request(self, http_method, url, headers=None, data=None):
+        """
+        Make an HTTP request
+
+        :param http_method: GET, PUT, POST, DELETE
+        :param url: full URL to request
+        :param headers: Dictionary of additional headers
+        :param data: Body/payload
+        :return: :py:class:`AsyncResponse`
+        """
+        if self._client is None:
+            self._client = self._create_client()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            async with self._client.request(
+                http_method, url, headers=headers, data=data,
+            ) as response:
+                return AsyncResponse(response.status, await response.read())
+
+    async def close(self):
+        """
+        Close all pooled connections
+        """
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def _create_client(self):
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=self.pool_maxsize),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=self.connect_timeout, sock_read=self.read_timeout,
+            ),
+        )
+
+
+class AsyncBaseService(service.BaseService):
+    """
+    Dynamically loaded by data files, for async sessions.
+    """
+    async def _make_api_request(self, endpoint, http_method, **kwargs):
+        """
+        Convenience method to make HTTP requests and handle responses/error codes
+
+        :param endpoint: URL to the resource
+        :param http_method: HTTP method, GET, POST, PUT, DELETE
+        :param kwargs: Params to pass to the body or url
+        """
+        url = self._format_url(endpoint, **kwargs)
+
+        if kwargs.get('body_args'):
+            claims = {arg: kwargs[arg] for arg in kwargs.get('body_args')}
+            jwt = await self.session.run_in_executor(
+                jwts.make_jwt, claims, self.credentials.keypair,
+            )
+            return await self.session.service_request(http_method, url, body=jwt)
+        else:
+            # Replace the entire body with kwargs['body'] (if present)
+            return await self.session.service_request(http_method, url, body=kwargs.get('body'))
+
+
+class AsyncServiceCreator(service.ServiceCreator):
+    """
+    Creates services whose API methods are coroutines
+    """
+    service_class = AsyncBaseService
+
+    def _create_api_method(self, name,
+                           endpoint, http_method,
+                           all_body_args, required_body_args):
+        async def _api_call(self, *args, **kwargs):
+            service._check_body_args(kwargs, all_body_args, required_body_args)
+            return await self._make_api_request(endpoint, http_method, **kwargs)
+
+        _api_call.__name__ = str(name)
+        return _api_call
+
+
+class AsyncSessionMixin(object):
+    """
+    Makes a session's HTTP requests coroutines
+
+    :ivar executor: :py:class:`concurrent.futures.Executor` to sign in,
+        or None for the event loop's default executor
+    """
+    service_creator_class = AsyncServiceCreator
+
+    def __init__(self, identity_credentials=None, project_credentials=None,
+                 oneid_credentials=None, config=None, transport=None, executor=None):
+        """
+        :param transport: (optional) :py:class:`AsyncHTTPTransport`.
+            Defaults to a new transport for this session
+        :param executor: (optional) :py:class:`concurrent.futures.Executor` to sign in
+        """
+        self.executor = executor
+
+        super(AsyncSessionMixin, self).__init__(
+            identity_credentials, project_credentials, oneid_credentials, config,
+            transport or AsyncHTTPTransport(),
+        )
+
+    async def run_in_executor(self, func, *args):
+        """
+        Run a (CPU-bound) function in :py:attr:`executor`
+
+        :return: the result of `func(*args)`
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def make_http_request(self, http_method, url, headers=None, body=None):
+        """
+        Generic HTTP request
+
+        :param headers:
+        :param body:
+        :return:
+        """
+        session._check_http_method(http_method)
+
+        req = await self.transport.request(http_method, url, headers=headers, data=body)
+
+        logger.debug(
+            'made http %s request to %s, headers=%s, data=%s, req=%s',
+            http_method, url, headers, body, req,
+        )
+
+        # 403 is Forbidden, raise an error if this occurs
+        if req.status_code == 403:
+            raise exceptions.InvalidAuthentication()
+
+        return req.content
+
+    async def service_request(self, http_method, endpoint, body=None):
+        """
+        Make an API Request
+
+        :param method:
+        :param endpoint:
+        :param body:
+        :return:
+        """
+        auth_jwt_header = await self.run_in_executor(self._get_auth_tokens().get_token)
+        headers = self._service_request_headers(auth_jwt_header)
+
+        return await self.make_http_request(http_method, endpoint, headers=headers, body=body)
+
+    async def close(self):
+        """
+        Stop pre-signing authorization tokens, and close the session's transport
+        """
+        super(AsyncSessionMixin, self).close()
+        await self.transport.close()
+
+    def __enter__(self):
+        raise TypeError('use "async with" for asyncio sessions')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class AsyncServerSession(AsyncSessionMixin, session.ServerSession):
+    """
+    Enable Server to request two-factor Authentication from oneID, from coroutines
+    """
+
+    def create_cosign_batcher(self, *args, **kwargs):
+        """
+        Not supported, as service methods are coroutines.
+        Use :py:func:`asyncio.gather` to make concurrent calls instead.
+        """
+        raise NotImplementedError('use asyncio.gather to make concurrent calls')
+
+
+class AsyncAdminSession(AsyncSessionMixin, session.AdminSession):
+    """
+    Admin Users will only interface with oneID service, from coroutines
+    """
@@ -0,0 +1,191 @@
+"""
+Batch up API calls, such as cosign requests, that are made one message at a time.
+
+Calls that are queued are dispatched together over the session's pooled transport,
+with a cap on how many are in flight at once. Each caller gets a
+:py:class:`~concurrent.futures.Future` for its own result.
+
+The API has no bulk endpoint, so each call is still its own request. By default,
+calls aren't held back to wait for others to batch with, which would only add latency.
+"""
+from __future__ import unicode_literals
+
+import os
+import time
+import threading
+import logging
+
+from concurrent import futures
+from six.moves import queue
+
+from . import exceptions
+from .transport import HTTP_POOL_MAXSIZE
+
+logger = logging.getLogger(__name__)
+
+
+BATCH_MAX_SIZE = 32
+BATCH_MAX_DELAY_SEC = 0
+BATCH_MAX_CONCURRENCY = HTTP_POOL_MAXSIZE
+BATCH_MAX_PENDING = 1024
+BATCH_POLL_INTERVAL_SEC = 0.001
+
+
+class CosignBatcher(object):
+    """
+    Collects calls to an API method and dispatches them in batches.
+
+    Callers are held up in :py:meth:`submit` once `max_pending` calls are waiting
+    for results, so that a burst of messages can't queue without limit.
+    """
+    def __init__(self, method, max_size=BATCH_MAX_SIZE, max_delay=BATCH_MAX_DELAY_SEC,
+                 max_concurrency=BATCH_MAX_CONCURRENCY, max_pending=BATCH_MAX_PENDING):
+        """
+        :param method: function to call with each submitted set of keyword arguments,
+            usually a service method, such as `session.authenticate.edge_device`
+        :param max_size: maximum number of calls to collect into a batch
+        :param max_delay: seconds to wait for more calls after the first one in a batch.
+            If 0, a batch is just the calls already queued
+        :param max_concurrency: maximum number of calls in flight at once.
+            Should not exceed the transport's `pool_maxsize`
+        :param max_pending: maximum number of submitted calls waiting for results
+        """
+        self.method = method
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+
+        self._queue = queue.Queue()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._collector = None
+        self._executor = None
+        self._pid = None
+
+    def submit(self, timeout=None, **kwargs):
+        """
+        Queue a call to :py:attr:`method`
+
+        :param timeout: seconds to wait if `max_pending` calls are already waiting,
+            or None to wait as long as it takes
+        :param kwargs: keyword arguments for the call
+        :return: :py:class:`~concurrent.futures.Future` for the result of the call
+        :raises: :py:class:`~oneid.exceptions.BatchFullError` if the call couldn't be
+            queued within `timeout`
+        :raises: :py:class:`RuntimeError` if the batcher has been closed
+        """
+        self._start()
+
+        if not self._acquire_pending(timeout):
+            raise exceptions.BatchFullError('{} calls already pending'.format(self.max_pending))
+
+        future = futures.Future()
+
+        # queued under the lock, so that nothing can be queued after close()'s sentinel
+        with self._lock:
+            if self._closed:
+                self._pending.release()
+                raise RuntimeError('cannot submit to a closed batcher')
+
+            self._queue.put((future, kwargs))
+
+        return future
+
+    def close(self, wait=True):
+        """
+        Dispatch any queued calls and stop accepting new ones
+
+        :param wait: if True, wait for all dispatched calls to complete
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            collector = self._collector
+
+        if collector is not None:
+            self._queue.put(None)
+            collector.join()
+            self._executor.shutdown(wait)
+
+    def _acquire_pending(self, timeout):
+        if timeout is None:
+            return self._pending.acquire()
+
+        if not hasattr(threading, 'TIMEOUT_MAX'):  # pragma: no cover
+            # Python 2 semaphores can't time out
+            deadline = time.time() + timeout
+            while not self._pending.acquire(False):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(BATCH_POLL_INTERVAL_SEC, remaining))
+            return True
+
+        return self._pending.acquire(timeout=timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('cannot submit to a closed batcher')
+
+            if self._collector is not None and self._pid == os.getpid():
+                return
+
+            # neither threads nor queued calls survive a fork
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+            self._pending = threading.BoundedSemaphore(self.max_pending)
+            self._executor = futures.ThreadPoolExecutor(self.max_concurrency)
+            self._collector = threading.Thread(
+                target=self._run_collector, name='oneid-cosign-batcher',
+            )
+            self._collector.daemon = True
+            self._collector.start()
+
+    def _run_collector(self):
+        running = True
+
+        while running:
+            batch, running = self._collect_batch()
+
+            if batch:
+                logger.debug('dispatching batch of %d calls', len(batch))
+
+            for future, kwargs in batch:
+                if future.set_running_or_notify_cancel():
+                    self._executor.submit(self._call, future, kwargs)
+                else:
+                    self._pending.release()
+
+    def _collect_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return [], False
+
+        batch = [item]
+        deadline = time.time() + self.max_delay
+
+        while len(batch) < self.max_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                break
+
+            if item is None:
+                return batch, False
+
+            batch.append(item)
+
+        return batch, True
+
+    def _call(self, future, kwargs):
+        try:
+            future.set_result(self.method(**kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            self._pending.release()
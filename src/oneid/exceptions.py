@@ -29,3 +29,7 @@ class KeySignatureMismatch(InvalidSignature):
 
 class InvalidSignatureError(InvalidSignature):
     pass
+
+
+class BatchFullError(Exception):
+    pass
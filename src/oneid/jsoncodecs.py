@@ -0,0 +1,157 @@
+"""
+JSON encoders and decoders for JWTs and JWSs.
+
+By default, the standard library's :py:mod:`json` is used. Faster libraries,
+such as `orjson`, `ujson` and `simplejson`, can be chosen instead by setting the
+`ONEID_JSON_CODEC` environment variable, or calling :py:func:`set_default_json_codec`.
+They are opt-in, as they don't all accept the same claims as :py:mod:`json`.
+
+Encoders use compact separators, so tokens don't carry unneeded whitespace,
+and always return a :py:class:`str`.
+"""
+from __future__ import unicode_literals
+
+import os
+import json
+import threading
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_JSON_CODEC = 'json'
+JSON_CODEC = os.environ.get('ONEID_JSON_CODEC')
+
+JSONCodec = collections.namedtuple('JSONCodec', ['name', 'encode', 'decode'])
+
+_COMPACT_SEPARATORS = (',', ':')
+
+_codec_loaders = collections.OrderedDict()
+_codecs = {}
+_codecs_lock = threading.Lock()
+_default_codec = None
+
+
+def get_json_codec(name=None):
+    """
+    Get a JSON codec by name, or the default one
+
+    :param name: (optional) name of a registered codec, such as `'orjson'` or `'json'`
+    :return: :py:class:`JSONCodec`
+    :raises: :py:class:`ValueError` if the codec is unknown, or its library isn't installed
+    """
+    if name is None:
+        return _default_codec or _load_default_codec()
+
+    with _codecs_lock:
+        if name not in _codecs:
+            if name not in _codec_loaders:
+                raise ValueError('unknown JSON codec: {}'.format(name))
+
+            try:
+                _codecs[name] = _codec_loaders[name]()
+            except ImportError:
+                raise ValueError('JSON codec not installed: {}'.format(name))
+
+        return _codecs[name]
+
+
+def set_default_json_codec(name=None):
+    """
+    Choose the codec used by :py:mod:`oneid.jwts` when no encoder or decoder is given
+
+    :param name: name of a registered codec, or None to go back to `ONEID_JSON_CODEC`,
+        or :py:mod:`json` if that isn't set
+    :raises: :py:class:`ValueError` if the codec is unknown, or its library isn't installed
+    """
+    global _default_codec
+
+    _default_codec = name and get_json_codec(name)
+
+
+def register_json_codec(name, encode, decode):
+    """
+    Add a codec that can be chosen by name
+
+    :param name: name to choose the codec with
+    :param encode: a function to encode a :py:class:`dict` into a JSON :py:class:`str`
+    :param decode: a function to decode a JSON :py:class:`str` or :py:class:`bytes`
+        into a :py:class:`dict`
+    """
+    codec = JSONCodec(name, encode, decode)
+
+    with _codecs_lock:
+        _codec_loaders[name] = lambda: codec
+        _codecs[name] = codec
+
+
+def available_json_codecs():
+    """
+    :return: names of the codecs that can be used
+    :rtype: list
+    """
+    available = []
+
+    for name in list(_codec_loaders):
+        try:
+            get_json_codec(name)
+            available.append(name)
+        except ValueError:
+            logger.debug('JSON codec not available: %s', name)
+
+    return available
+
+
+def _load_default_codec():
+    global _default_codec
+
+    _default_codec = get_json_codec(JSON_CODEC or DEFAULT_JSON_CODEC)
+
+    logger.debug('using JSON codec: %s', _default_codec.name)
+    return _default_codec
+
+
+def _load_orjson():
+    import orjson
+
+    def encode(obj):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # e.g. integers larger than 64 bits, which json accepts
+            return _json_encode(obj)
+
+    return JSONCodec('orjson', encode, orjson.loads)
+
+
+def _load_ujson():
+    import ujson
+
+    def encode(obj):
+        return ujson.dumps(obj, escape_forward_slashes=False)
+
+    return JSONCodec('ujson', encode, ujson.loads)
+
+
+def _load_simplejson():
+    import simplejson
+
+    def encode(obj):
+        return simplejson.dumps(obj, separators=_COMPACT_SEPARATORS)
+
+    return JSONCodec('simplejson', encode, simplejson.loads)
+
+
+def _load_json():
+    return JSONCodec('json', _json_encode, json.loads)
+
+
+def _json_encode(obj):
+    return json.dumps(obj, separators=_COMPACT_SEPARATORS)
+
+
+_codec_loaders['orjson'] = _load_orjson
+_codec_loaders['ujson'] = _load_ujson
+_codec_loaders['simplejson'] = _load_simplejson
+_codec_loaders['json'] = _load_json
@@ -12,12 +12,14 @@ IETF RFCs.
 from __future__ import unicode_literals
 
 import collections
-import json
+import itertools
 import re
 import time
+import timeit
+import threading
 import logging
 
-from . import utils, exceptions
+from . import utils, exceptions, jsoncodecs
 
 logger = logging.getLogger(__name__)
 
@@ -37,29 +39,158 @@ TOKEN_EXPIRATION_TIME_SEC = (1*60*60)  # one hour
 TOKEN_NOT_BEFORE_LEEWAY_SEC = (2*60)   # two minutes
 TOKEN_EXPIRATION_LEEWAY_SEC = (3)      # three seconds
 
+HEADER_CACHE_SIZE = 1024
+PROCESS_KEYPAIR_CACHE_SIZE = 1024
 
-def make_jwt(raw_claims, keypair, json_encoder=json.dumps):
+TOKEN_MAX_SIZE = 32 * 1024 * 1024  # large enough for a few MB of claims, once encoded
+
+BATCH_BACKENDS = (None, 'thread', 'process')
+SIGNATURE_BACKENDS = (None, 'thread')
+
+# cheapest first, so junk is rejected before paying for JSON parsing or ECDSA
+VERIFICATION_STAGES = ('size', 'structure', 'header', 'kid', 'claims', 'signature', 'nonce')
+BATCH_CHUNK_SIZE = 64
+
+_COMPACT_JWS_PATTERN = re.compile(COMPACT_JWS_RE)
+
+JWTResult = collections.namedtuple('JWTResult', ['claims', 'error'])
+
+_rejections = collections.Counter()
+_rejections_lock = threading.Lock()
+
+_header_cache = collections.OrderedDict()
+_header_cache_lock = threading.Lock()
+
+# keypairs loaded in process pool workers, by public key DER
+_process_keypairs = collections.OrderedDict()
+_process_keypairs_lock = threading.Lock()
+
+
+class ParsedJWS(object):
+    """
+    A JWS (or JWT) decoded once, so that it can be passed to :py:func:`get_jws_key_ids`,
+    :py:func:`verify_jws` and :py:func:`extend_jws_signatures` in turn without
+    being parsed again.
+
+    Each signature's protected header is decoded and checked the first time it's
+    needed, then remembered.
+
+    :ivar compact: the JWS as given, if in compact serialization, otherwise None
+    """
+    def __init__(self, jws, json_decoder=None):
+        """
+        :param jws: JWS (Compact or JSON) or JWT
+        :type jws: str or bytes
+        :param json_decoder: a function to decode JSON into a :py:class:`dict`.
+            Defaults to the :py:mod:`~oneid.jsoncodecs` default
+        :raises: :py:class:`~oneid.exceptions.InvalidFormatError`: if not a valid JWS
+        """
+        self.json_decoder = json_decoder or jsoncodecs.get_json_codec().decode
+        self.compact = None
+        self._jws = None
+        self._compact_jws = {}
+        self._headers = {}
+
+        jws = utils.to_string(jws)
+
+        if _COMPACT_JWS_PATTERN.match(jws):
+            self.compact = jws
+            return
+
+        try:
+            self._jws = self.json_decoder(jws)
+        except:
+            logger.debug('error parsing JWS', exc_info=True)
+            raise exceptions.InvalidFormatError
+
+        if not isinstance(self._jws, dict) or \
+                'payload' not in self._jws or 'signatures' not in self._jws:
+            raise exceptions.InvalidFormatError
+
+    def as_dict(self, default_kid=None):
+        """
+        :param default_kid: (optional) value for 'kid' header field if converting
+            a compact JWT without one
+        :return: JWS in JSON serialization, as a :py:class:`dict` with `payload`
+            and `signatures`. Shouldn't be modified.
+        """
+        if self.compact is None:
+            return self._jws
+
+        if default_kid not in self._compact_jws:
+            self._compact_jws[default_kid] = _jws_as_dict(
+                self.compact, default_kid, self.json_decoder
+            )
+
+        return self._compact_jws[default_kid]
+
+    def get_header(self, signature):
+        """
+        :param signature: one of the `signatures` from :py:meth:`as_dict`
+        :return: the signature's protected header
+        :raises: :py:class:`~oneid.exceptions.InvalidFormatError`: if the header isn't valid
+        :raises: :py:class:`~oneid.exceptions.InvalidAlgorithmError`: if unsupported
+            algorithm specified
+        """
+        protected = signature['protected']
+
+        if protected not in self._headers:
+            self._headers[protected] = _get_signature_header(signature, self.json_decoder)
+
+        return self._headers[protected]
+
+    def get_kid(self, signature, default_kid=None):
+        """
+        :param signature: one of the `signatures` from :py:meth:`as_dict`
+        :param default_kid: Value to use if no `kid` found in the signature's headers
+        :return: ID of the key that made the signature
+        :raises: :py:class:`~oneid.exceptions.InvalidFormatError`: if no `kid` was found
+        """
+        # TODO: check for overlapping keys in `protected` and `header`, merge together
+        #       for now, we only look for `kid` in `header`, and only if it isn't in `protected`
+        header = self.get_header(signature)
+        kid = header.get('kid', signature.get('header', {}).get('kid', default_kid))
+
+        if not kid:
+            logger.warning(
+                'invalid header in signature, missing "kid": %s', signature
+            )
+            raise exceptions.InvalidFormatError
+
+        return kid
+
+    def get_key_ids(self, default_kid=None):
+        """
+        :param default_kid: Value to use if no `kid` found in a signature's headers
+        :return: IDs of the keys that signed the JWS, in order
+        :rtype: list
+        """
+        return [
+            self.get_kid(signature, default_kid)
+            for signature in self.as_dict(default_kid)['signatures']
+        ]
+
+
+def make_jwt(raw_claims, keypair, json_encoder=None):
     """
     Convert claims into JWT
 
     :param raw_claims: payload data that will be converted to json
     :type raw_claims: dict
     :param keypair: :py:class:`~oneid.keychain.Keypair` to sign the request
-    :param json_encoder: a function to encode a :py:class:`dict` into JSON. Defaults to `json.dumps`
+    :param json_encoder: a function to encode a :py:class:`dict` into JSON.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
     :return: JWT
     """
     if not isinstance(raw_claims, dict):
         raise TypeError('dict required for claims, type=' + str(type(raw_claims)))
 
+    json_encoder = json_encoder or jsoncodecs.get_json_codec().encode
     claims = _normalize_claims(raw_claims, keypair.identity)
     claims_serialized = json_encoder(claims)
     claims_b64 = utils.to_string(utils.base64url_encode(claims_serialized))
 
-    header = {}
-    header.update(MINIMAL_JWT_HEADER)
-    if keypair.identity:
-        header['kid'] = keypair.identity
-    header_b64 = utils.to_string(utils.base64url_encode(json_encoder(header)))
+    header_b64 = _get_encoded_header(_make_jwt_header, keypair.identity, json_encoder)
 
     payload = '{header}.{claims}'.format(header=header_b64, claims=claims_b64)
 
@@ -68,7 +199,7 @@ def make_jwt(raw_claims, keypair, json_encoder=json.dumps):
     return '{payload}.{sig}'.format(payload=payload, sig=signature)
 
 
-def verify_jwt(jwt, keypair=None, json_decoder=json.loads):
+def verify_jwt(jwt, keypair=None, json_decoder=None, nonce_store=None):
     """
     Convert a JWT back to it's claims, if validated by the :py:class:`~oneid.keychain.Keypair`
 
@@ -76,7 +207,10 @@ def verify_jwt(jwt, keypair=None, json_decoder=json.loads):
     :type jwt: str or bytes
     :param keypair: :py:class:`~oneid.keychain.Keypair` to verify the JWT
     :type keypair: :py:class:`~oneid.keychain.Keypair`
-    :param json_decoder: a function to decode JSON into a :py:class:`dict`. Defaults to `json.loads`
+    :param json_decoder: a function to decode JSON into a :py:class:`dict`.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
+    :param nonce_store: (optional) :py:class:`~oneid.nonces.BaseNonceStore` to record
+        the `jti` nonce in, rejecting the JWT if it has been used before
     :returns: claims
     :rtype: dict
     :raises: :py:class:`~oneid.exceptions.InvalidFormatError` if not a valid JWT
@@ -85,31 +219,71 @@ def verify_jwt(jwt, keypair=None, json_decoder=json.loads):
         including expiration, re-used nonce, etc.
     :raises: :py:class:`~oneid.exceptions.InvalidSignatureError` if signature is not valid
     """
-    jwt = utils.to_string(jwt)
-    if not re.match(COMPACT_JWS_RE, jwt):
-        logger.debug('Given JWT doesnt match pattern: %s', jwt)
-        raise exceptions.InvalidFormatError
-
-    try:
-        header_json, claims_json, signature = [utils.base64url_decode(p) for p in jwt.split('.')]
-    except:
-        logger.debug('invalid JWT, error splitting/decoding: %s', jwt, exc_info=True)
-        raise exceptions.InvalidFormatError
-
-    header = _verify_jose_header(utils.to_string(header_json), True, json_decoder)
-    claims = _verify_claims(utils.to_string(claims_json), json_decoder)
+    json_decoder = json_decoder or jsoncodecs.get_json_codec().decode
+    jwt, header, claims, _ = _parse_jwt(jwt, json_decoder)
 
     if keypair:
-        try:
-            keypair.verify(*(jwt.rsplit('.', 1)))
-        except:
-            logger.debug('invalid signature, header=%s, claims=%s', header, claims, exc_info=True)
-            raise exceptions.InvalidSignatureError
+        with _VerificationStage('signature'):
+            _verify_jwt_signature(jwt, keypair, header, claims)
+
+    with _VerificationStage('nonce'):
+        _verify_nonce(claims, nonce_store)
 
     return claims
 
 
-def make_jws(raw_claims, keypairs, json_encoder=json.dumps):
+def verify_jwts(tokens, keypair_resolver=None, json_decoder=None,
+                backend=None, max_workers=None, nonce_store=None):
+    """
+    Verify a batch of JWTs, returning the claims or error for each one
+
+    Parsing work is shared across the batch (identical headers are only decoded
+    once, and keypairs are only resolved once per `kid`). Signature verification
+    can optionally be spread across a thread or process pool.
+
+    :param tokens: JWTs to verify and convert
+    :type tokens: iterable of str or bytes
+    :param keypair_resolver: (optional) callable returning the
+        :py:class:`~oneid.keychain.Keypair` to verify a JWT with, given the `kid`
+        from its header (or `None` if the header has no `kid`).
+        If not given, signatures are not checked, as with :py:func:`verify_jwt`
+    :type keypair_resolver: callable
+    :param json_decoder: a function to decode JSON into a :py:class:`dict`.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
+    :param backend: `None` to verify signatures in the calling thread,
+        `'thread'` to use a thread pool, `'process'` to use a process pool,
+        or an existing :py:class:`concurrent.futures.Executor` to reuse
+    :type backend: str or :py:class:`concurrent.futures.Executor`
+    :param max_workers: (optional) size of the thread or process pool, if one is created.
+        Defaults to the number of CPUs
+    :param nonce_store: (optional) :py:class:`~oneid.nonces.BaseNonceStore` to record
+        `jti` nonces in, rejecting JWTs that have been used before (including earlier
+        in the same batch)
+    :type max_workers: int
+    :returns: a :py:class:`JWTResult` for each token, in order.
+        `error` is the exception that would have been raised by :py:func:`verify_jwt`
+    :rtype: list
+    :raises: :py:class:`ValueError` if an unknown backend is specified
+    """
+    from concurrent import futures  # only needed for batches, keep single JWTs light
+
+    if backend not in BATCH_BACKENDS and not isinstance(backend, futures.Executor):
+        raise ValueError('backend must be one of %s' % ', '.join(map(str, BATCH_BACKENDS)))
+
+    json_decoder = json_decoder or jsoncodecs.get_json_codec().decode
+    results, pending = _parse_jwts(tokens, keypair_resolver, json_decoder)
+
+    for index, valid in _verify_jwt_signatures(pending, backend, max_workers):
+        if not valid:
+            _count_rejection('signature')
+            results[index] = JWTResult(None, exceptions.InvalidSignatureError())
+
+    _verify_jwt_nonces(results, nonce_store)
+
+    return results
+
+
+def make_jws(raw_claims, keypairs, json_encoder=None):
     """
     Convert claims into JWS format (compact or JSON)
 
@@ -117,15 +291,17 @@ def make_jws(raw_claims, keypairs, json_encoder=json.dumps):
     :type raw_claims: dict
     :param keypairs: :py:class:`~oneid.keychain.Keypair`\s to sign the request with
     :type keypairs: list
-    :param json_encoder: a function to encode a :py:class:`dict` into JSON. Defaults to `json.dumps`
+    :param json_encoder: a function to encode a :py:class:`dict` into JSON.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
     :return: JWS
     """
+    json_encoder = json_encoder or jsoncodecs.get_json_codec().encode
     claims = _normalize_claims(raw_claims)
     claims_serialized = json_encoder(claims)
-    claims_b64 = utils.to_string(utils.base64url_encode(claims_serialized))
+    claims_b64 = utils.base64url_encode(claims_serialized)
 
     ret = {
-        "payload": claims_b64,
+        "payload": utils.to_string(claims_b64),
         "signatures": [],
     }
 
@@ -137,14 +313,10 @@ def make_jws(raw_claims, keypairs, json_encoder=json.dumps):
             logger.debug('Missing Keypair.identity')
             raise exceptions.InvalidKeyError
 
-        header = {
-            'kid': keypair.identity,
-        }
-        header.update(MINIMAL_JSON_JWS_HEADER)
-        header_b64 = utils.to_string(utils.base64url_encode(json_encoder(header)))
-        to_sign = '{header}.{claims}'.format(header=header_b64, claims=claims_b64)
+        header_b64 = _get_encoded_header(_make_jws_header, keypair.identity, json_encoder)
 
-        signature = utils.to_string(keypair.sign(to_sign))
+        # hash the (possibly large) payload in place, rather than copying it into `to_sign`
+        signature = utils.to_string(keypair.sign_chunks([header_b64, '.', claims_b64]))
 
         ret['signatures'].append({
             'protected': header_b64,
@@ -156,23 +328,27 @@ def make_jws(raw_claims, keypairs, json_encoder=json.dumps):
 
 def extend_jws_signatures(
     jws, keypairs, default_jwt_kid=None,
-    json_encoder=json.dumps, json_decoder=json.loads,
+    json_encoder=None, json_decoder=None,
 ):
     """
     Add signatures to an existing JWS (or JWT)
 
     :param jws: existing JWS (Compact or JSON) or JWT
-    :type jws: str
+    :type jws: str or :py:class:`ParsedJWS`
     :param keypairs: additional :py:class:`~oneid.keychain.Keypair`\s to sign the request with
     :type keypairs: list
     :param default_jwt_kid: (optional) value for 'kid' header field if passing a JWT without one
     :type default_jwt_kid: str
-    :param json_encoder: a function to encode a :py:class:`dict` into JSON. Defaults to `json.dumps`
-    :param json_decoder: a function to decode JSON into a :py:class:`dict`. Defaults to `json.loads`
+    :param json_encoder: a function to encode a :py:class:`dict` into JSON.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
+    :param json_decoder: a function to decode JSON into a :py:class:`dict`.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
     :return: JWS
     """
-    ret = _jws_as_dict(jws, default_jwt_kid, json_decoder)
-    payload = ret['payload']
+    json_encoder = json_encoder or jsoncodecs.get_json_codec().encode
+    ret = dict(_as_parsed_jws(jws, json_decoder).as_dict(default_jwt_kid))
+    ret['signatures'] = list(ret['signatures'])
+    payload = utils.to_bytes(ret['payload'])
 
     if not isinstance(keypairs, collections.Iterable):
         keypairs = [keypairs]
@@ -182,14 +358,9 @@ def extend_jws_signatures(
             logger.debug('Missing Keypair.identity')
             raise exceptions.InvalidKeyError
 
-        header = {
-            'kid': keypair.identity,
-        }
-        header.update(MINIMAL_JSON_JWS_HEADER)
-        header_b64 = utils.to_string(utils.base64url_encode(json_encoder(header)))
-        to_sign = '{header}.{claims}'.format(header=header_b64, claims=payload)
+        header_b64 = _get_encoded_header(_make_jws_header, keypair.identity, json_encoder)
 
-        signature = utils.to_string(keypair.sign(to_sign))
+        signature = utils.to_string(keypair.sign_chunks([header_b64, '.', payload]))
 
         ret['signatures'].append({
             'protected': header_b64,
@@ -199,39 +370,33 @@ def extend_jws_signatures(
     return json_encoder(ret)
 
 
-def get_jws_key_ids(jws, default_kid=None, json_decoder=json.loads):
+def get_jws_key_ids(jws, default_kid=None, json_decoder=None):
     """
     Extract the IDs of the keys used to sign a given JWS
 
     :param jws: JWS to get key IDs from
-    :type jws: str or bytes
+    :type jws: str or bytes or :py:class:`ParsedJWS`
     :param default_kid: Value to use for looking up keypair if no `kid` found
                     in a given signature header, as may happen when extending a JWT
     :type default_kid: str
-    :param json_decoder: a function to decode JSON into a :py:class:`dict`. Defaults to `json.loads`
+    :param json_decoder: a function to decode JSON into a :py:class:`dict`.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
     :returns: key IDs
     :rtype: list
     :raises: :py:class:`~oneid.exceptions.InvalidFormatError`: if not a valid JWS
     """
-    try:
-        jws = json_decoder(utils.to_string(jws))
-    except:
-        logger.debug('error parsing JWS', exc_info=True)
-        raise exceptions.InvalidFormatError
+    return _as_parsed_jws(jws, json_decoder).get_key_ids(default_kid)
 
-    return [
-        _get_kid_for_signature(signature, default_kid, json_decoder)
-        for signature in jws['signatures']
-    ]
 
-
-def verify_jws(jws, keypairs=None, verify_all=True, default_kid=None, json_decoder=json.loads):
+def verify_jws(jws, keypairs=None, verify_all=True, default_kid=None, json_decoder=None,
+               nonce_store=None, keypair_resolver=None, backend=None, max_workers=None,
+               timings=None):
     """
     Convert a JWS back to it's claims, if validated by a set of
     required :py:class:`~oneid.keychain.Keypair`\s
 
     :param jws: JWS to verify and convert
-    :type jws: str or bytes
+    :type jws: str or bytes or :py:class:`ParsedJWS`
     :param keypairs: :py:class:`~oneid.keychain.Keypair`\s to verify the JWS with.
                     Must include one for each specified in the JWS headers' `kid` values.
     :type keypairs: list
@@ -244,7 +409,24 @@ def verify_jws(jws, keypairs=None, verify_all=True, default_kid=None, json_decod
     :param default_kid: Value to use for looking up keypair if no `kid` found
                     in a given signature header, as may happen when extending a JWT
     :type default_kid: str
-    :param json_encoder: a function to encode a :py:class:`dict` into JSON. Defaults to `json.dumps`
+    :param json_decoder: a function to decode JSON into a :py:class:`dict`.
+        Defaults to the :py:mod:`~oneid.jsoncodecs` default
+    :param nonce_store: (optional) :py:class:`~oneid.nonces.BaseNonceStore` to record
+        the `jti` nonce in, rejecting the JWS if it has been used before
+    :param keypair_resolver: (optional) if no `keypairs` are given, a callable returning
+        the :py:class:`~oneid.keychain.Keypair` for each signature's `kid`, or `None`
+        if unknown, such as :py:meth:`oneid.keychain.Keyring.get`
+    :type keypair_resolver: callable
+    :param backend: (optional) None to verify signatures one after another, 'thread' to
+        verify them concurrently on a new thread pool, or an existing
+        :py:class:`concurrent.futures.Executor` to reuse, which avoids starting
+        threads for every message. Remaining signatures are cancelled once one fails.
+    :type backend: str or :py:class:`concurrent.futures.Executor`
+    :param max_workers: (optional) size of the thread pool, if one is created.
+        Defaults to the number of signatures
+    :param timings: (optional) :py:class:`dict` to record the seconds taken to verify
+        each signature in, by `kid`. Only filled in for JSON serialized JWSs
+    :type timings: dict
     :returns: claims
     :rtype: dict
     :raises: :py:class:`~oneid.exceptions.InvalidFormatError`: if not a valid JWS
@@ -258,30 +440,113 @@ def verify_jws(jws, keypairs=None, verify_all=True, default_kid=None, json_decod
     if keypairs and not isinstance(keypairs, collections.Iterable):
         keypairs = [keypairs]
 
-    jws = utils.to_string(jws)
+    _check_signature_backend(backend)
+
+    with _VerificationStage('size') as progress:
+        if not isinstance(jws, ParsedJWS):
+            _check_token_size(jws)
 
-    if re.match(COMPACT_JWS_RE, jws):
+        progress.stage = 'structure'
+        jws = _as_parsed_jws(jws, json_decoder)
 
-        if verify_all and keypairs and len(keypairs) != 1:
-            raise exceptions.InvalidSignatureError(
-                'Compact JWS found but multiple signatures required'
+        if jws.compact is not None:
+            keypair = _get_compact_jws_keypair(
+                jws, keypairs, verify_all, default_kid, keypair_resolver, progress,
             )
 
-        return verify_jwt(jws, keypairs and keypairs[0])
+    if jws.compact is not None:
+        return verify_jwt(jws.compact, keypair, nonce_store=nonce_store)
 
-    jws = json_decoder(jws)
+    with _VerificationStage('kid') as progress:
+        pending = None
+        if keypairs or keypair_resolver:
+            pending = _match_jws_keypairs(
+                jws, keypairs, verify_all, default_kid, keypair_resolver, progress,
+            )
 
-    if 'payload' not in jws or 'signatures' not in jws:
-        raise exceptions.InvalidFormatError
+        progress.stage = 'claims'
+        claims = _verify_claims(
+            utils.to_string(utils.base64url_decode(jws.as_dict()['payload'])), jws.json_decoder
+        )
 
-    claims = _verify_claims(utils.to_string(utils.base64url_decode(jws['payload'])), json_decoder)
+        progress.stage = 'signature'
+        if pending:
+            payload = utils.to_bytes(jws.as_dict()['payload'])
+            _verify_jws_signatures(payload, pending, backend, max_workers, timings)
 
-    if keypairs:
-        _verify_jws_signatures(jws, keypairs, verify_all, default_kid, json_decoder)
+        progress.stage = 'nonce'
+        _verify_nonce(claims, nonce_store)
 
     return claims
 
 
+def get_rejection_counts():
+    """
+    Count the tokens rejected by :py:func:`verify_jwt`, :py:func:`verify_jwts` and
+    :py:func:`verify_jws` since :py:func:`reset_rejection_counts` was last called,
+    by the stage of verification that rejected them
+
+    Stages are run in the order of `VERIFICATION_STAGES`, cheapest first:
+    `size` (`TOKEN_MAX_SIZE`), `structure`, `header` (including `alg` and `typ`),
+    `kid` (finding keypairs for the signatures), `claims` (including `exp` and `nbf`),
+    `signature`, then `nonce`.
+
+    :returns: count for each stage
+    :rtype: dict
+    """
+    with _rejections_lock:
+        return {stage: _rejections[stage] for stage in VERIFICATION_STAGES}
+
+
+def reset_rejection_counts():
+    """
+    Set all the counts returned by :py:func:`get_rejection_counts` back to zero
+    """
+    with _rejections_lock:
+        _rejections.clear()
+
+
+def _make_jwt_header(kid):
+    header = {}
+    header.update(MINIMAL_JWT_HEADER)
+    if kid:
+        header['kid'] = kid
+    return header
+
+
+def _make_jws_header(kid):
+    header = {
+        'kid': kid,
+    }
+    header.update(MINIMAL_JSON_JWS_HEADER)
+    return header
+
+
+def _get_encoded_header(make_header, kid, json_encoder):
+    """
+    Get the base64url encoded header for a signer, reusing one of the
+    `HEADER_CACHE_SIZE` most recently used
+    """
+    key = (make_header, kid, json_encoder)
+
+    with _header_cache_lock:
+        header_b64 = _header_cache.pop(key, None)
+
+        if header_b64 is not None:
+            _header_cache[key] = header_b64
+            return header_b64
+
+    header_b64 = utils.to_string(utils.base64url_encode(json_encoder(make_header(kid))))
+
+    with _header_cache_lock:
+        _header_cache[key] = header_b64
+
+        while len(_header_cache) > HEADER_CACHE_SIZE:
+            _header_cache.popitem(last=False)
+
+    return header_b64
+
+
 def _normalize_claims(raw_claims, issuer=None):
     now = int(time.time())
     claims = {
@@ -298,22 +563,242 @@ def _normalize_claims(raw_claims, issuer=None):
     return claims
 
 
-def _jws_as_dict(jws, kid, json_decoder):
+class _VerificationStage(object):
+    # tracks how far a token has got through verification,
+    # and counts the stage that rejected it, if any
+    def __init__(self, stage):
+        self.stage = stage
 
-    if not re.match(COMPACT_JWS_RE, jws):
-        return json_decoder(jws)
+    def __enter__(self):
+        return self
 
-    header_b64, payload, signature = utils.to_string(jws).split('.')
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            _count_rejection(self.stage)
 
-    header = json_decoder(utils.to_string(utils.base64url_decode(header_b64)))
-    extra_header = None
 
-    if 'kid' not in header:
-        claims = json_decoder(utils.to_string(utils.base64url_decode(payload)))
-        kid = kid or claims.get('iss')
-        extra_header = kid and {
-            'kid': kid
-        }
+def _count_rejection(stage):
+    with _rejections_lock:
+        _rejections[stage] += 1
+
+
+def _check_token_size(token):
+    if len(token) > TOKEN_MAX_SIZE:
+        logger.debug('token too large, size=%d', len(token))
+        raise exceptions.InvalidFormatError
+
+
+def _parse_jwt(jwt, json_decoder, header_cache=None, keypair_resolver=None):
+    with _VerificationStage('size') as progress:
+        _check_token_size(jwt)
+
+        progress.stage = 'structure'
+        jwt = utils.to_string(jwt)
+        header_b64, claims_b64 = _split_jwt(jwt)
+
+        progress.stage = 'header'
+        header = _decode_jwt_header(header_b64, json_decoder, header_cache)
+
+        progress.stage = 'kid'
+        keypair = keypair_resolver and _resolve_jwt_keypair(header, keypair_resolver)
+
+        progress.stage = 'claims'
+        try:
+            claims_json = utils.base64url_decode(claims_b64)
+        except:
+            logger.debug('invalid JWT, error decoding claims: %s', jwt, exc_info=True)
+            raise exceptions.InvalidFormatError
+
+        claims = _verify_claims(utils.to_string(claims_json), json_decoder)
+
+    return jwt, header, claims, keypair
+
+
+def _split_jwt(jwt):
+    if not _COMPACT_JWS_PATTERN.match(jwt):
+        logger.debug('Given JWT doesnt match pattern: %s', jwt)
+        raise exceptions.InvalidFormatError
+
+    header_b64, claims_b64, signature_b64 = jwt.split('.')
+
+    try:
+        utils.base64url_decode(signature_b64)
+    except:
+        logger.debug('invalid JWT, error decoding signature: %s', jwt, exc_info=True)
+        raise exceptions.InvalidFormatError
+
+    return header_b64, claims_b64
+
+
+def _decode_jwt_header(header_b64, json_decoder, header_cache):
+    if header_cache is not None and header_b64 in header_cache:
+        return header_cache[header_b64]
+
+    try:
+        header_json = utils.base64url_decode(header_b64)
+    except:
+        logger.debug('invalid JWT, error decoding header: %s', header_b64, exc_info=True)
+        raise exceptions.InvalidFormatError
+
+    header = _verify_jose_header(utils.to_string(header_json), True, json_decoder)
+
+    if header_cache is not None:
+        header_cache[header_b64] = header
+
+    return header
+
+
+def _resolve_jwt_keypair(header, keypair_resolver):
+    kid = header.get('kid')
+    keypair = keypair_resolver(kid)
+
+    if not keypair:
+        logger.debug('no keypair found for kid=%s', kid)
+        raise exceptions.InvalidKeyError
+
+    return keypair
+
+
+def _parse_jwts(tokens, keypair_resolver, json_decoder):
+    results = []
+    pending = []
+    header_cache = {}
+    keypair_cache = {}
+
+    def resolve_keypair(kid):
+        if kid not in keypair_cache:
+            keypair_cache[kid] = keypair_resolver(kid)
+        return keypair_cache[kid]
+
+    for index, token in enumerate(tokens):
+        try:
+            jwt, header, claims, keypair = _parse_jwt(
+                token, json_decoder, header_cache, keypair_resolver and resolve_keypair,
+            )
+
+            if keypair:
+                pending.append((index, jwt, keypair))
+
+            results.append(JWTResult(claims, None))
+        except Exception as e:
+            results.append(JWTResult(None, e))
+
+    return results, pending
+
+
+def _verify_jwt_nonces(results, nonce_store):
+    for index, result in enumerate(results):
+        if result.claims:
+            try:
+                with _VerificationStage('nonce'):
+                    _verify_nonce(result.claims, nonce_store)
+            except exceptions.InvalidClaimsError as e:
+                results[index] = JWTResult(None, e)
+
+
+def _verify_jwt_signature(jwt, keypair, header, claims):
+    try:
+        keypair.verify(*(jwt.rsplit('.', 1)))
+    except:
+        logger.debug('invalid signature, header=%s, claims=%s', header, claims, exc_info=True)
+        raise exceptions.InvalidSignatureError
+
+
+def _verify_jwt_signatures(pending, backend, max_workers):
+    if not pending:
+        return []
+
+    if backend is None:
+        return _verify_jwt_signature_chunk(pending)
+
+    chunks = [
+        pending[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(pending), BATCH_CHUNK_SIZE)
+    ]
+
+    import multiprocessing
+    from concurrent import futures
+
+    if isinstance(backend, futures.Executor):
+        return _map_jwt_signature_chunks(backend, chunks)
+
+    executor_class = futures.ThreadPoolExecutor
+    if backend == 'process':
+        executor_class = futures.ProcessPoolExecutor
+
+    with executor_class(max_workers or multiprocessing.cpu_count()) as executor:
+        return _map_jwt_signature_chunks(executor, chunks)
+
+
+def _map_jwt_signature_chunks(executor, chunks):
+    from concurrent import futures
+
+    if isinstance(executor, futures.ProcessPoolExecutor):
+        # Keypairs can't be pickled, so send DER-encoded public keys to the worker processes
+        chunks = [
+            [(index, jwt, keypair.public_key_der) for index, jwt, keypair in chunk]
+            for chunk in chunks
+        ]
+        return list(itertools.chain(*executor.map(_verify_jwt_signature_der_chunk, chunks)))
+
+    return list(itertools.chain(*executor.map(_verify_jwt_signature_chunk, chunks)))
+
+
+def _verify_jwt_signature_chunk(chunk):
+    ret = []
+    for index, jwt, keypair in chunk:
+        try:
+            _verify_jwt_signature(jwt, keypair, None, None)
+            ret.append((index, True))
+        except exceptions.InvalidSignatureError:
+            ret.append((index, False))
+    return ret
+
+
+def _verify_jwt_signature_der_chunk(chunk):
+    ret = []
+    for index, jwt, public_key_der in chunk:
+        ret.append((index, jwt, _get_process_keypair(public_key_der)))
+    return _verify_jwt_signature_chunk(ret)
+
+
+def _get_process_keypair(public_key_der):
+    """
+    Get the keypair for a public key in a process pool worker, reusing one of the
+    `PROCESS_KEYPAIR_CACHE_SIZE` most recently used
+    """
+    from .keychain import Keypair
+
+    with _process_keypairs_lock:
+        keypair = _process_keypairs.pop(public_key_der, None)
+
+        if keypair is None:
+            keypair = Keypair.from_public_der(public_key_der)
+
+        _process_keypairs[public_key_der] = keypair
+
+        while len(_process_keypairs) > PROCESS_KEYPAIR_CACHE_SIZE:
+            _process_keypairs.popitem(last=False)
+
+        return keypair
+
+
+def _jws_as_dict(jws, kid, json_decoder):
+    # only called for compact JWSs, by ParsedJWS
+    header_b64, payload, signature = utils.to_string(jws).split('.')
+
+    try:
+        header = json_decoder(utils.to_string(utils.base64url_decode(header_b64)))
+        extra_header = None
+
+        if 'kid' not in header:
+            claims = json_decoder(utils.to_string(utils.base64url_decode(payload)))
+            kid = kid or claims.get('iss')
+            extra_header = kid and {
+                'kid': kid
+            }
+    except Exception:
+        logger.debug('invalid compact JWS: %s', jws, exc_info=True)
+        raise exceptions.InvalidFormatError
 
     ret = {
         'payload': payload,
@@ -383,14 +868,69 @@ def _verify_claims(payload, json_decoder):
         logger.warning('Early token, nbf=%s, now=%s', claims['nbf'], now)
         raise exceptions.InvalidClaimsError
 
-    if 'jti' in claims and not utils.verify_and_burn_nonce(claims['jti']):
-        logger.warning('Invalid nonce: %s', claims['jti'])
+    return claims
+
+
+def _verify_nonce(claims, nonce_store):
+    # only check and burn nonces once signatures are verified,
+    # so forged messages can't use them up
+    if 'jti' in claims and not utils.verify_and_burn_nonce(claims['jti'], nonce_store):
+        logger.warning('Invalid or replayed nonce: %s', claims['jti'])
         raise exceptions.InvalidClaimsError
 
-    return claims
 
+def _as_parsed_jws(jws, json_decoder):
+    if isinstance(jws, ParsedJWS):
+        return jws
+
+    return ParsedJWS(jws, json_decoder)
+
+
+def _check_signature_backend(backend):
+    if backend in SIGNATURE_BACKENDS:
+        return
+
+    from concurrent import futures  # only needed for concurrent verification
+
+    if not isinstance(backend, futures.Executor):
+        raise ValueError('backend must be one of %s' % ', '.join(map(str, SIGNATURE_BACKENDS)))
+
+
+def _get_compact_jws_keypair(parsed_jws, keypairs, verify_all, default_kid, keypair_resolver,
+                             progress):
+    if keypair_resolver and not keypairs:
+        progress.stage = 'header'
+        parsed_jws.get_key_ids(default_kid)
+
+        progress.stage = 'kid'
+        keypairs = list(
+            _resolve_keypairs(parsed_jws, keypair_resolver, verify_all, default_kid).values()
+        )
+
+    progress.stage = 'kid'
+    if verify_all and keypairs and len(keypairs) != 1:
+        raise exceptions.InvalidSignatureError(
+            'Compact JWS found but multiple signatures required'
+        )
+
+    return keypairs and keypairs[0]
+
+
+def _match_jws_keypairs(parsed_jws, keypairs, verify_all, default_kid, keypair_resolver,
+                        progress):
+    progress.stage = 'header'
+    parsed_jws.get_key_ids(default_kid)
+
+    progress.stage = 'kid'
+    if keypair_resolver and not keypairs:
+        keypairs = _resolve_keypairs(parsed_jws, keypair_resolver, verify_all, default_kid)
+
+    return _get_jws_signatures_to_verify(parsed_jws, keypairs, verify_all, default_kid)
+
+
+def _get_jws_signatures_to_verify(parsed_jws, keypairs, verify_all, default_kid):
+    jws = parsed_jws.as_dict()
 
-def _verify_jws_signatures(jws, keypairs, verify_all, default_kid, json_decoder):
     if len(jws['signatures']) == 0:
         logger.warning('No signatures found, rejecting')
         raise exceptions.InvalidSignatureError
@@ -398,15 +938,11 @@ def _verify_jws_signatures(jws, keypairs, verify_all, default_kid, json_decoder)
     if verify_all and len(keypairs) != len(jws['signatures']):
         raise exceptions.KeySignatureMismatch('number of keys doesn\'t match number of signatures')
 
-    keypair_map = {str(keypair.identity): keypair for keypair in keypairs}
+    # resolved keypairs are already mapped by the kid they were resolved for
+    keypair_map = keypairs if isinstance(keypairs, dict) else _map_keypairs_by_identity(keypairs)
 
-    if len(keypairs) != len(keypair_map):
-        raise exceptions.InvalidKeyError('redundant keypairs found, unable to verify')
-
-    found_sigs = [
-        _get_kid_for_signature(sig, default_kid, json_decoder)
-        in keypair_map for sig in jws['signatures']
-    ]
+    kids = [parsed_jws.get_kid(signature, default_kid) for signature in jws['signatures']]
+    found_sigs = [kid in keypair_map for kid in kids]
 
     # need at least one signature
     if not any(found_sigs):
@@ -418,30 +954,97 @@ def _verify_jws_signatures(jws, keypairs, verify_all, default_kid, json_decoder)
         logger.warning('Not all keys have corresponding signatures, rejecting')
         raise exceptions.KeySignatureMismatch
 
-    for signature in jws['signatures']:
-        kid = _get_kid_for_signature(signature, default_kid, json_decoder)
+    return [
+        (kid, keypair_map.get(kid), signature)
+        for kid, signature in zip(kids, jws['signatures'])
+        if verify_all or kid in keypair_map
+    ]
 
-        if verify_all or kid in keypair_map:
-            _verify_jws_signature(jws['payload'], keypair_map.get(kid), signature)
 
+def _map_keypairs_by_identity(keypairs):
+    keypair_map = {str(keypair.identity): keypair for keypair in keypairs}
 
-def _get_kid_for_signature(signature, default_kid, json_decoder):
-    header = _get_signature_header(signature, json_decoder)
-    kid = header.get('kid', signature.get('header', {}).get('kid', default_kid))
+    if len(keypairs) != len(keypair_map):
+        raise exceptions.InvalidKeyError('redundant keypairs found, unable to verify')
 
-    if not kid:
-        logger.warning(
-            'invalid header in signature, missing "kid": %s', signature
-        )
-        raise exceptions.InvalidFormatError
+    return keypair_map
 
-    return kid
 
+def _verify_jws_signatures(payload, pending, backend=None, max_workers=None, timings=None):
+    if backend is None:
+        for kid, keypair, signature in pending:
+            _record_jws_signature(kid, _time_jws_signature(payload, keypair, signature), timings)
+    else:
+        _verify_jws_signatures_concurrently(payload, pending, backend, max_workers, timings)
 
-def _get_signature_header(signature, json_decoder):
-    # TODO: check for overlapping keys in `protected` and `header`, merge together
-    #       for now, we only look for `kid` in `header`, and only if it isn't in `protected`
 
+def _verify_jws_signatures_concurrently(payload, pending, backend, max_workers, timings):
+    from concurrent import futures
+
+    executor = backend
+    if not isinstance(backend, futures.Executor):
+        executor = futures.ThreadPoolExecutor(max_workers or len(pending))
+
+    try:
+        kids = {
+            executor.submit(_time_jws_signature, payload, keypair, signature): kid
+            for kid, keypair, signature in pending
+        }
+
+        for future in futures.as_completed(kids):
+            try:
+                _record_jws_signature(kids[future], future.result(), timings)
+            except:
+                for other in kids:
+                    other.cancel()
+                raise
+    finally:
+        if executor is not backend:
+            executor.shutdown(wait=False)
+
+
+def _time_jws_signature(payload, keypair, signature):
+    start = timeit.default_timer()
+
+    try:
+        _verify_jws_signature(payload, keypair, signature)
+        error = None
+    except exceptions.InvalidSignatureError as e:
+        error = e
+
+    return timeit.default_timer() - start, error
+
+
+def _record_jws_signature(kid, result, timings):
+    elapsed, error = result
+
+    if timings is not None:
+        timings[kid] = elapsed
+
+    if error is not None:
+        raise error
+
+
+def _resolve_keypairs(parsed_jws, keypair_resolver, verify_all, default_kid):
+    keypairs = collections.OrderedDict()
+
+    for kid in parsed_jws.get_key_ids(default_kid):
+        keypair = keypair_resolver(kid)
+
+        if keypair:
+            keypairs[kid] = keypair
+        elif verify_all:
+            logger.warning('No keypair found for kid=%s, rejecting', kid)
+            raise exceptions.KeySignatureMismatch
+
+    if not keypairs:
+        logger.warning('No keypairs found for any signatures, rejecting')
+        raise exceptions.KeySignatureMismatch
+
+    return keypairs
+
+
+def _get_signature_header(signature, json_decoder):
     return _verify_jose_header(
         utils.to_string(utils.base64url_decode(signature['protected'])),
         False, json_decoder,
@@ -450,7 +1053,7 @@ def _get_signature_header(signature, json_decoder):
 
 def _verify_jws_signature(payload, keypair, signature):
     try:
-        keypair.verify('.'.join([signature['protected'], payload]), signature['signature'])
+        keypair.verify_chunks([signature['protected'], '.', payload], signature['signature'])
     except:
         logger.debug('invalid signature', exc_info=True)
         raise exceptions.InvalidSignatureError
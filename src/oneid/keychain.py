@@ -5,8 +5,13 @@ A Keypair is used to sign and verify signatures
 Keys should be kept in a secure storage enclave.
 """
 import os
+import mmap
+import time
+import struct
+import itertools
+import threading
+import collections
 
-import binascii
 import base64
 import logging
 
@@ -17,17 +22,49 @@ from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.serialization import load_pem_private_key, \
     load_pem_public_key, load_der_private_key, load_der_public_key
 
-from cryptography.hazmat.primitives.asymmetric.utils \
-    import decode_dss_signature, encode_dss_signature
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.serialization \
     import Encoding, PublicFormat, PrivateFormat, NoEncryption
 
-from . import utils
+try:
+    from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+except ImportError:  # pragma: no cover
+    Prehashed = None  # requires cryptography>=1.6
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # pragma: no cover
+    AESGCM = None  # requires cryptography>=2.0
+
+from . import utils, signatures
 
 KEYSIZE = 256
 KEYSIZE_BYTES = (KEYSIZE // 8)
 
+KEYRING_MAX_SIZE = 100000
+
+AES_GCM_IV_BYTES = 16
+AES_GCM_TAG_BYTES = 16
+AES_GCM_MIN_TAG_BYTES = 8
+
+STREAM_MAGIC = b'OIDS'
+STREAM_VERSION = 1
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_MAX_CHUNK_SIZE = 16 * 1024 * 1024
+STREAM_NONCE_PREFIX_BYTES = 8
+STREAM_MAX_CHUNKS = 2 ** 32
+
+_STREAM_HEADER = struct.Struct('>4sBI{}s'.format(STREAM_NONCE_PREFIX_BYTES))
+_STREAM_FRAME = struct.Struct('>BI')
+_STREAM_COUNTER = struct.Struct('>I')
+
+JWK_CURVES = {
+    'secp256r1': 'P-256',
+    'secp384r1': 'P-384',
+    'secp521r1': 'P-521',
+}
+
 logger = logging.getLogger(__name__)
 
 
@@ -64,6 +101,7 @@ class ProjectCredentials(Credentials):
         """
         super(ProjectCredentials, self).__init__(project_id, keypair)
         self._encryption_key = encryption_key
+        self._cipher = None
 
     def encrypt(self, plain_text):
         """
@@ -72,17 +110,7 @@ class ProjectCredentials(Credentials):
         :param plain_text: String or bytes to encrypt with project encryption key.
         :returns: Dictionary with cipher text and encryption params.
         """
-        iv = os.urandom(16)
-        cipher_alg = Cipher(
-            algorithms.AES(self._encryption_key),
-            modes.GCM(iv),
-            backend=default_backend()
-        )
-        encryptor = cipher_alg.encryptor()
-        encr_value = encryptor.update(utils.to_bytes(plain_text)) + encryptor.finalize()
-        encr_value_b64 = base64.b64encode(encr_value + encryptor.tag)
-        iv_b64 = base64.b64encode(iv)
-        return {'cipher': 'aes', 'mode': 'gcm', 'ts': 128, 'iv': iv_b64, 'ct': encr_value_b64}
+        return self._get_cipher().encrypt(plain_text)
 
     def decrypt(self, cipher_text, iv=None, cipher='aes', mode='gcm', tag_size=128):
         """
@@ -113,18 +141,258 @@ class ProjectCredentials(Credentials):
         if iv is None:
             raise ValueError('IV must be specified with using AES and GCM')
 
-        iv = base64.b64decode(iv)
-        tag_ct = base64.b64decode(b64_ct)
-        ts = 16  # 128 // 8
-        tag = tag_ct[-ts:]
-        ct = tag_ct[:-ts]
-        cipher_alg = Cipher(algorithms.AES(self._encryption_key),
-                            modes.GCM(iv, tag, min_tag_length=8),
-                            backend=default_backend())
-        decryptor = cipher_alg.decryptor()
+        return self._get_cipher().decrypt(base64.b64decode(iv), base64.b64decode(b64_ct))
+
+    def encrypt_stream(self, in_file, out_file, chunk_size=STREAM_CHUNK_SIZE, use_mmap=False):
+        """
+        Encrypt a file with the project encryption key, without reading it all into memory.
+
+        See :py:class:`AESGCMStream` for details.
+
+        :param in_file: binary file object to read plain text from
+        :param out_file: binary file object to write the encrypted stream to
+        :param chunk_size: number of plain text bytes per encrypted chunk
+        :param use_mmap: if True, memory-map `in_file` rather than reading it
+        :returns: number of bytes written
+        """
+        return AESGCMStream(self._encryption_key, chunk_size).encrypt(
+            in_file, out_file, use_mmap,
+        )
+
+    def decrypt_stream(self, in_file, out_file):
+        """
+        Decrypt a stream written by :py:meth:`encrypt_stream`
+
+        :param in_file: binary file object to read the encrypted stream from
+        :param out_file: binary file object to write plain text to
+        :returns: number of bytes written
+        """
+        return AESGCMStream(self._encryption_key).decrypt(in_file, out_file)
+
+    def _get_cipher(self):
+        # created on first use, as credentials may be made without a usable encryption key
+        if self._cipher is None:
+            self._cipher = AESGCMCipher(self._encryption_key)
+
+        return self._cipher
+
+
+class AESGCMCipher(object):
+    """
+    AES-GCM encryption and decryption with a single key.
+
+    The key schedule and backend are set up once, rather than on every call,
+    which is most of the cost of encrypting short values. Uses the one-shot
+    :py:class:`~cryptography.hazmat.primitives.ciphers.aead.AESGCM` when available.
+    """
+    def __init__(self, key):
+        """
+        :param key: AES key bytes
+        """
+        self._algorithm = algorithms.AES(key)
+        self._backend = default_backend()
+        self._aead = AESGCM(key) if AESGCM is not None else None
+
+    def encrypt(self, plain_text, iv=None):
+        """
+        Encrypt plain text
+
+        :param plain_text: String or bytes to encrypt
+        :param iv: (optional) initialization vector to use. Must never be reused with the
+            same key. Defaults to random bytes
+        :returns: Dictionary with base64 encoded cipher text and encryption params.
+        """
+        iv = iv or os.urandom(AES_GCM_IV_BYTES)
+        tag_ct = self._seal(iv, utils.to_bytes(plain_text))
+
+        return {
+            'cipher': 'aes', 'mode': 'gcm', 'ts': AES_GCM_TAG_BYTES * 8,
+            'iv': base64.b64encode(iv), 'ct': base64.b64encode(tag_ct),
+        }
+
+    def decrypt(self, iv, tag_ct, tag_size=AES_GCM_TAG_BYTES):
+        """
+        Decrypt and authenticate cipher text
+
+        :param iv: initialization vector bytes
+        :param tag_ct: cipher text bytes, followed by the authentication tag
+        :param tag_size: length of the authentication tag, in bytes
+        :returns: plain text bytes
+        :raises: :py:class:`~cryptography.exceptions.InvalidTag` if the cipher text
+            can't be authenticated
+        """
+        return self._open(iv, tag_ct, tag_size=tag_size)
+
+    def _seal(self, iv, data, associated_data=None):
+        if self._aead is not None:
+            return self._aead.encrypt(iv, data, associated_data)
+
+        encryptor = Cipher(self._algorithm, modes.GCM(iv), self._backend).encryptor()
+        if associated_data:
+            encryptor.authenticate_additional_data(associated_data)
+        return encryptor.update(data) + encryptor.finalize() + encryptor.tag
+
+    def _open(self, iv, tag_ct, associated_data=None, tag_size=AES_GCM_TAG_BYTES):
+        if self._aead is not None and tag_size == AES_GCM_TAG_BYTES:
+            return self._aead.decrypt(iv, tag_ct, associated_data)
+
+        # truncated tags aren't supported by AESGCM
+        tag = tag_ct[-tag_size:]
+        ct = tag_ct[:-tag_size]
+        decryptor = Cipher(
+            self._algorithm,
+            modes.GCM(iv, tag, min_tag_length=AES_GCM_MIN_TAG_BYTES),
+            self._backend,
+        ).decryptor()
+        if associated_data:
+            decryptor.authenticate_additional_data(associated_data)
         return decryptor.update(ct) + decryptor.finalize()
 
 
+class AESGCMStream(object):
+    """
+    Chunked AES-GCM encryption of file objects, for data too large to hold in memory.
+
+    The stream starts with a header (magic bytes, format version, chunk size and a
+    random nonce prefix), followed by one frame per chunk: a final-chunk flag, the
+    chunk length, then the cipher text and tag. Each chunk's nonce is the prefix
+    followed by the chunk's index, and its frame and the stream header are
+    authenticated along with it, so chunks can't be reordered, dropped, or
+    truncated from the end without :py:meth:`decrypt` failing.
+
+    At most two chunks are buffered at a time.
+    """
+    def __init__(self, key, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        :param key: AES key bytes
+        :param chunk_size: number of plain text bytes per encrypted chunk
+        """
+        if not 0 < chunk_size <= STREAM_MAX_CHUNK_SIZE:
+            raise ValueError('chunk_size must be between 1 and {}'.format(STREAM_MAX_CHUNK_SIZE))
+
+        self.chunk_size = chunk_size
+        self._cipher = AESGCMCipher(key)
+
+    def encrypt(self, in_file, out_file, use_mmap=False):
+        """
+        Encrypt a file
+
+        :param in_file: binary file object to read plain text from
+        :param out_file: binary file object to write the encrypted stream to
+        :param use_mmap: if True, memory-map `in_file` (which must be a regular file)
+            from its start, rather than reading it
+        :returns: number of bytes written
+        """
+        header = _STREAM_HEADER.pack(
+            STREAM_MAGIC, STREAM_VERSION, self.chunk_size,
+            os.urandom(STREAM_NONCE_PREFIX_BYTES),
+        )
+        out_file.write(header)
+        written = len(header)
+
+        chunks = _iter_stream_chunks(in_file, self.chunk_size, use_mmap)
+        chunk = next(chunks, b'')
+
+        for index in itertools.count():  # pragma: no branch
+            _check_stream_index(index)
+
+            next_chunk = next(chunks, None)
+            frame = _STREAM_FRAME.pack(next_chunk is None, len(chunk))
+            sealed = self._cipher._seal(
+                self._nonce(header, index), chunk, header + frame
+            )
+
+            out_file.write(frame)
+            out_file.write(sealed)
+            written += len(frame) + len(sealed)
+
+            if next_chunk is None:
+                return written
+
+            chunk = next_chunk
+
+    def decrypt(self, in_file, out_file):
+        """
+        Decrypt and authenticate a stream written by :py:meth:`encrypt`
+
+        Chunks are written out as they are authenticated, so if an exception is raised,
+        anything already written to `out_file` must be discarded.
+
+        :param in_file: binary file object to read the encrypted stream from
+        :param out_file: binary file object to write plain text to
+        :returns: number of bytes written
+        :raises: :py:class:`ValueError` if the stream is malformed or truncated
+        :raises: :py:class:`~cryptography.exceptions.InvalidTag` if a chunk
+            can't be authenticated
+        """
+        header = _read_exactly(in_file, _STREAM_HEADER.size)
+        magic, version, chunk_size, _ = _STREAM_HEADER.unpack(header)
+
+        if magic != STREAM_MAGIC or version != STREAM_VERSION:
+            raise ValueError('not an encrypted stream, or unsupported version')
+
+        if chunk_size > STREAM_MAX_CHUNK_SIZE:
+            raise ValueError('stream chunk size is too large')
+
+        written = 0
+
+        for index in itertools.count():  # pragma: no branch
+            _check_stream_index(index)
+
+            frame = _read_exactly(in_file, _STREAM_FRAME.size)
+            final, length = _STREAM_FRAME.unpack(frame)
+
+            if length > chunk_size:
+                raise ValueError('chunk larger than stream chunk size')
+
+            chunk = self._cipher._open(
+                self._nonce(header, index),
+                _read_exactly(in_file, length + AES_GCM_TAG_BYTES),
+                header + frame,
+            )
+            out_file.write(chunk)
+            written += len(chunk)
+
+            if final:
+                break
+
+        if in_file.read(1):
+            raise ValueError('unexpected data after final chunk')
+
+        return written
+
+    @staticmethod
+    def _nonce(header, index):
+        return header[-STREAM_NONCE_PREFIX_BYTES:] + _STREAM_COUNTER.pack(index)
+
+
+def _iter_stream_chunks(in_file, chunk_size, use_mmap):
+    if use_mmap and os.fstat(in_file.fileno()).st_size:
+        mapped = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for offset in range(0, len(mapped), chunk_size):
+                yield mapped[offset:offset + chunk_size]
+        finally:
+            mapped.close()
+        return
+
+    for chunk in iter(lambda: in_file.read(chunk_size), b''):
+        yield chunk
+
+
+def _check_stream_index(index):
+    # the index is the nonce counter, so it must never wrap around
+    if index >= STREAM_MAX_CHUNKS:
+        raise ValueError('too many chunks in stream, use a larger chunk_size')
+
+
+def _read_exactly(in_file, size):
+    data = in_file.read(size)
+    if len(data) != size:
+        raise ValueError('encrypted stream is truncated')
+    return data
+
+
 class BaseKeypair(object):
     """
     Generic :py:class:`~oneid.keychain.Keypair` functionality.
@@ -143,6 +411,10 @@ class BaseKeypair(object):
     def public_key_pem(self):
         raise NotImplementedError
 
+    @property
+    def thumbprint(self):
+        raise NotImplementedError
+
     @property
     def secret_as_der(self):
         raise NotImplementedError
@@ -157,6 +429,34 @@ class BaseKeypair(object):
     def sign(self, payload):
         raise NotImplementedError
 
+    def verify_chunks(self, chunks, signature):
+        """
+        Verify a signature over a payload given as a sequence of chunks.
+
+        Subclasses should override this to avoid joining the chunks together.
+
+        :param chunks: iterable of strings or bytes that make up the signed payload
+        :param signature: URL safe base64 signature
+        """
+        return self.verify(b''.join(utils.to_bytes(chunk) for chunk in chunks), signature)
+
+    def sign_chunks(self, chunks):
+        """
+        Sign a payload given as a sequence of chunks.
+
+        Subclasses should override this to avoid joining the chunks together.
+
+        :param chunks: iterable of strings or bytes that make up the payload
+        :return: URL safe base64 signature
+        """
+        return self.sign(b''.join(utils.to_bytes(chunk) for chunk in chunks))
+
+    def verify_digest(self, digest, signature):
+        raise NotImplementedError
+
+    def sign_digest(self, digest):
+        raise NotImplementedError
+
     def save(self, *args, **kwargs):
         """
         Save a key.
@@ -178,6 +478,9 @@ class Keypair(BaseKeypair):
 
         self._private_key = None
         self._public_key = None
+        self._public_key_der = None
+        self._public_key_pem = None
+        self._thumbprint = None
 
         if kwargs.get('secret_bytes') and \
                 isinstance(kwargs['secret_bytes'], EllipticCurvePrivateKey):
@@ -185,6 +488,10 @@ class Keypair(BaseKeypair):
 
     def _load_secret_bytes(self, secret_bytes):
         self._private_key = secret_bytes
+        self._public_key = None
+        self._public_key_der = None
+        self._public_key_pem = None
+        self._thumbprint = None
 
     @property
     def secret_as_der(self):
@@ -283,17 +590,7 @@ class Keypair(BaseKeypair):
         :return:
 
         """
-        raw_sig = utils.base64url_decode(signature)
-        sig_r_bin = raw_sig[:len(raw_sig)//2]
-        sig_s_bin = raw_sig[len(raw_sig)//2:]
-
-        sig_r = unpack_bytes(sig_r_bin)
-        sig_s = unpack_bytes(sig_s_bin)
-
-        sig = encode_dss_signature(sig_r, sig_s)
-        signer = self.public_key.verifier(sig, ec.ECDSA(hashes.SHA256()))
-        signer.update(utils.to_bytes(payload))
-        return signer.verify()
+        return self.verify_chunks([payload], signature)
 
     def sign(self, payload):
         """
@@ -301,29 +598,96 @@ class Keypair(BaseKeypair):
         :param payload: String (usually jwt payload)
         :return: URL safe base64 signature
         """
+        return self.sign_chunks([payload])
+
+    def verify_chunks(self, chunks, signature):
+        """
+        Verify that the token signed a payload given as a sequence of chunks,
+        hashing each chunk in turn rather than joining them together
+
+        :param chunks: iterable of strings or bytes that make up the signed payload
+        :param signature: URL safe base64 signature
+        :return:
+        """
+        verifier = self.public_key.verifier(
+            self._der_signature(signature), ec.ECDSA(hashes.SHA256())
+        )
+
+        for chunk in chunks:
+            verifier.update(utils.to_bytes(chunk))
+
+        return verifier.verify()
+
+    def sign_chunks(self, chunks):
+        """
+        Sign a payload given as a sequence of chunks,
+        hashing each chunk in turn rather than joining them together
+
+        :param chunks: iterable of strings or bytes that make up the payload
+        :return: URL safe base64 signature
+        """
         signer = self._private_key.signer(ec.ECDSA(hashes.SHA256()))
 
-        signer.update(utils.to_bytes(payload))
-        signature = signer.finalize()
+        for chunk in chunks:
+            signer.update(utils.to_bytes(chunk))
+
+        return self._raw_signature(signer.finalize())
+
+    def verify_digest(self, digest, signature):
+        """
+        Verify that the token signed a payload, given its SHA-256 digest
+
+        Requires cryptography 1.6 or later.
 
-        r, s = decode_dss_signature(signature)
+        :param digest: SHA-256 digest of the signed payload
+        :type digest: bytes
+        :param signature: URL safe base64 signature
+        :return: True
+        :raises: :py:class:`~cryptography.exceptions.UnsupportedAlgorithm` if
+            prehashed signatures aren't supported by the installed cryptography
+        """
+        self.public_key.verify(
+            self._der_signature(signature), digest, _prehashed_ecdsa_sha256()
+        )
+        return True
+
+    def sign_digest(self, digest):
+        """
+        Sign a payload, given its SHA-256 digest
 
-        br = int2bytes(r, KEYSIZE_BYTES)
-        bs = int2bytes(s, KEYSIZE_BYTES)
-        str_sig = br + bs
-        b64_signature = utils.base64url_encode(str_sig)
-        return b64_signature
+        Requires cryptography 1.6 or later.
+
+        :param digest: SHA-256 digest of the payload
+        :type digest: bytes
+        :return: URL safe base64 signature
+        :raises: :py:class:`~cryptography.exceptions.UnsupportedAlgorithm` if
+            prehashed signatures aren't supported by the installed cryptography
+        """
+        return self._raw_signature(
+            self._private_key.sign(digest, _prehashed_ecdsa_sha256())
+        )
+
+    @staticmethod
+    def _der_signature(signature):
+        try:
+            return signatures.raw_to_der(utils.base64url_decode(signature))
+        except ValueError:
+            raise InvalidSignature('malformed signature')
+
+    @staticmethod
+    def _raw_signature(der_signature):
+        return utils.base64url_encode(signatures.der_to_raw(der_signature, KEYSIZE_BYTES))
 
     @property
     def public_key(self):
         """
-        If the private key is defined, generate the public key
+        If the private key is defined, generate the public key (once)
         :return:
         """
-        if self._public_key:
-            return self._public_key
-        elif self._private_key:
-            return self._private_key.public_key()
+        if self._public_key is None and self._private_key is not None:
+            self._public_key = self._private_key.public_key()
+
+        return self._public_key
 
     @property
     def public_key_der(self):
@@ -332,7 +696,12 @@ class Keypair(BaseKeypair):
 
         :return: Public Key in DER format
         """
-        return self.public_key.public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo)
+        if self._public_key_der is None:
+            self._public_key_der = self.public_key.public_bytes(
+                Encoding.DER, PublicFormat.SubjectPublicKeyInfo
+            )
+
+        return self._public_key_der
 
     @property
     def public_key_pem(self):
@@ -341,14 +710,170 @@ class Keypair(BaseKeypair):
 
         :return: Public Key in PEM format
         """
-        return self.public_key.public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo)
+        if self._public_key_pem is None:
+            self._public_key_pem = self.public_key.public_bytes(
+                Encoding.PEM, PublicFormat.SubjectPublicKeyInfo
+            )
+
+        return self._public_key_pem
+
+    @property
+    def thumbprint(self):
+        """
+        `JWK Thumbprint <https://tools.ietf.org/html/rfc7638>`_ of the public key,
+        a stable identifier for the key
+
+        :return: URL safe base64 SHA-256 thumbprint
+        """
+        if self._thumbprint is None:
+            numbers = self.public_key.public_numbers()
+            curve = JWK_CURVES.get(numbers.curve.name)
+
+            if not curve:
+                raise ValueError('unsupported curve: {}'.format(numbers.curve.name))
+
+            size = (numbers.curve.key_size + 7) // 8
+            jwk = '{{"crv":"{crv}","kty":"EC","x":"{x}","y":"{y}"}}'.format(
+                crv=curve,
+                x=utils.to_string(utils.base64url_encode(signatures.int_to_bytes(numbers.x, size))),
+                y=utils.to_string(utils.base64url_encode(signatures.int_to_bytes(numbers.y, size))),
+            )
+
+            digest = hashes.Hash(hashes.SHA256(), default_backend())
+            digest.update(utils.to_bytes(jwk))
+            self._thumbprint = utils.to_string(utils.base64url_encode(digest.finalize()))
+
+        return self._thumbprint
+
+
+class Keyring(object):
+    """
+    Cache of public :py:class:`~oneid.keychain.Keypair`\\s, by identity, for
+    verifying signatures without re-loading keys for every message.
+
+    The least-recently-used keypairs are dropped once `max_size` is reached,
+    and keypairs can optionally expire after `ttl` seconds.
+
+    :py:meth:`get` can be passed as the `keypair_resolver` to
+    :py:func:`~oneid.jwts.verify_jws` and :py:func:`~oneid.jwts.verify_jwts`.
+    """
+    def __init__(self, max_size=KEYRING_MAX_SIZE, ttl=None, loader=None):
+        """
+        :param max_size: maximum number of keypairs to keep
+        :param ttl: (optional) seconds to keep each keypair for
+        :param loader: (optional) callable to load a missing keypair, given its identity.
+            May return a :py:class:`~oneid.keychain.Keypair`,
+            PEM- or DER-formatted public key bytes, or `None` if not found.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.loader = loader
+
+        self._keypairs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keypairs)
+
+    def __contains__(self, identity):
+        with self._lock:
+            return self._lookup(identity) is not None
+
+    def __getitem__(self, identity):
+        keypair = self.get(identity)
+        if keypair is None:
+            raise KeyError(identity)
+        return keypair
+
+    def add(self, identity, keypair):
+        """
+        Add (or replace) the keypair for an identity
+
+        :param identity: identity the keypair belongs to
+        :param keypair: :py:class:`~oneid.keychain.Keypair`, or
+            PEM- or DER-formatted public key bytes.
+            A keypair without an identity is given this one
+        :return: :py:class:`~oneid.keychain.Keypair` that was added
+        """
+        keypair = self._as_keypair(identity, keypair)
+        expires = self.ttl and (time.time() + self.ttl)
+
+        with self._lock:
+            self._keypairs.pop(identity, None)
+            self._keypairs[identity] = (keypair, expires)
+
+            while len(self._keypairs) > self.max_size:
+                self._keypairs.popitem(last=False)
+
+        return keypair
+
+    def get(self, identity, default=None):
+        """
+        Get the keypair for an identity, loading it if necessary
+
+        :param identity: identity to get the keypair for
+        :param default: value to return if not found
+        :return: :py:class:`~oneid.keychain.Keypair`
+        """
+        with self._lock:
+            keypair = self._lookup(identity)
+
+        if keypair is None and self.loader:
+            loaded = self.loader(identity)
+            if loaded is not None:
+                keypair = self.add(identity, loaded)
+
+        return default if keypair is None else keypair
+
+    def remove(self, identity):
+        """
+        Remove the keypair for an identity, if present
+
+        :param identity: identity to remove
+        """
+        with self._lock:
+            self._keypairs.pop(identity, None)
+
+    def _lookup(self, identity):
+        entry = self._keypairs.pop(identity, None)
+        if entry is None:
+            return None
+
+        keypair, expires = entry
+        if expires and expires <= time.time():
+            return None
+
+        # re-insert as most-recently used
+        self._keypairs[identity] = entry
+        return keypair
+
+    @staticmethod
+    def _as_keypair(identity, keypair):
+        if isinstance(keypair, BaseKeypair):
+            if keypair.identity is None:
+                keypair.identity = identity
+            return keypair
+
+        key_bytes = utils.to_bytes(keypair)
+        if key_bytes.startswith(b'-----BEGIN'):
+            ret = Keypair.from_public_pem(key_bytes)
+        else:
+            ret = Keypair.from_public_der(key_bytes)
+
+        ret.identity = identity
+        return ret
+
+
+def _prehashed_ecdsa_sha256():
+    if Prehashed is None:  # pragma: no cover
+        raise UnsupportedAlgorithm('prehashed signatures require cryptography>=1.6')
+
+    return ec.ECDSA(Prehashed(hashes.SHA256()))
 
 
 def int2bytes(i, numbytes=None):
-    hex_string = '%x' % i
-    n = numbytes and (numbytes*2) or len(hex_string)
-    return binascii.unhexlify(hex_string.zfill(n + (n & 1)))
+    return signatures.int_to_bytes(i, max(numbytes or 0, (i.bit_length() + 7) // 8, 1))
 
 
 def unpack_bytes(stringbytes):
-    return int(binascii.hexlify(stringbytes), 16)
+    return signatures.bytes_to_int(stringbytes)
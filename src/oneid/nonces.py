@@ -0,0 +1,379 @@
+"""
+Nonce stores record which nonces have already been used, so that messages
+carrying them can't be replayed.
+
+Nonces are only valid for a limited time (see
+:py:func:`~oneid.utils.verify_and_burn_nonce`), so stores only need to
+remember them until they would be rejected as expired anyway.
+"""
+from __future__ import unicode_literals
+
+import os
+import mmap
+import struct
+import sqlite3
+import hashlib
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+
+NONCE_LIFETIME_SEC = (1*60*60)  # one hour
+NONCE_BUCKET_SEC = 60
+
+SHARED_NONCE_CAPACITY = 2**20
+SHARED_NONCE_MAX_PROBES = 32
+
+SQLITE_COMMIT_INTERVAL_SEC = 0.005
+SQLITE_PRUNE_INTERVAL_SEC = 60
+
+_SHARED_MAGIC = b'oneIDnc1'
+_SHARED_HEADER = struct.Struct(str('<8sQ'))
+_SHARED_SLOT = struct.Struct(str('<q24s'))  # nonce timestamp, nonce digest
+
+
+class BaseNonceStore(object):
+    """
+    Generic nonce store functionality.
+
+    Callers can subclass this to keep burned nonces in shared storage.
+    """
+    def __init__(self, lifetime=NONCE_LIFETIME_SEC):
+        """
+        :param lifetime: seconds after its timestamp that a nonce needs to be remembered
+        """
+        self.lifetime = lifetime
+
+    def burn(self, nonce, timestamp):
+        """
+        Record a nonce as used
+
+        :param nonce: Nonce as created with :func:`~oneid.utils.make_nonce`
+        :param timestamp: time embedded in the nonce, in seconds since the epoch
+        :return: True if the nonce had not been used before
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+
+class MemoryNonceStore(BaseNonceStore):
+    """
+    Keeps burned nonces in memory, grouped into buckets by their timestamp.
+
+    Once every nonce in a bucket has expired, the whole bucket is dropped at once,
+    so memory use is bounded by the number of nonces seen in one lifetime.
+    """
+    def __init__(self, lifetime=NONCE_LIFETIME_SEC, bucket_size=NONCE_BUCKET_SEC):
+        """
+        :param lifetime: seconds after its timestamp that a nonce needs to be remembered
+        :param bucket_size: seconds of nonce timestamps to group into each bucket
+        """
+        super(MemoryNonceStore, self).__init__(lifetime)
+        self.bucket_size = bucket_size
+
+        self._buckets = {}
+        self._oldest_bucket = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(bucket) for bucket in self._buckets.values())
+
+    def burn(self, nonce, timestamp):
+        index = int(timestamp) // self.bucket_size
+
+        with self._lock:
+            self._evict(time.time())
+
+            if index < self._oldest_bucket:
+                logger.debug('nonce has already expired: %s', nonce)
+                return False
+
+            bucket = self._buckets.setdefault(index, set())
+
+            if nonce in bucket:
+                return False
+
+            bucket.add(nonce)
+            return True
+
+    def _evict(self, now):
+        cutoff = int(now - self.lifetime) // self.bucket_size
+
+        if cutoff <= self._oldest_bucket:
+            return
+
+        if cutoff - self._oldest_bucket > len(self._buckets):
+            expired = [index for index in self._buckets if index < cutoff]
+        else:
+            expired = range(self._oldest_bucket, cutoff)
+
+        for index in expired:
+            self._buckets.pop(index, None)
+
+        self._oldest_bucket = cutoff
+
+
+class SharedMemoryNonceStore(BaseNonceStore):
+    """
+    Keeps burned nonces in a fixed-size hash table in a memory-mapped file,
+    so that every process on a host that opens the same file shares them.
+
+    Slots are reused once the nonce they hold has expired, based on the
+    timestamp embedded in the nonce. If every slot a nonce could be stored in
+    holds an unexpired nonce, the nonce is rejected, so `capacity` should
+    comfortably exceed the number of nonces expected in one lifetime.
+
+    Only available on platforms that support :py:func:`fcntl.flock`.
+    """
+    def __init__(self, path, capacity=SHARED_NONCE_CAPACITY, lifetime=NONCE_LIFETIME_SEC,
+                 max_probes=SHARED_NONCE_MAX_PROBES):
+        """
+        :param path: file to keep the table in, created if it doesn't exist
+        :param capacity: number of nonces the table can hold.
+            Must match the capacity of an existing file
+        :param lifetime: seconds after its timestamp that a nonce needs to be remembered
+        :param max_probes: number of slots to check for each nonce
+        :raises: :py:class:`ValueError` if an existing file doesn't match `capacity`
+        """
+        if fcntl is None:  # pragma: no cover
+            raise NotImplementedError('shared nonce store requires fcntl.flock')
+
+        super(SharedMemoryNonceStore, self).__init__(lifetime)
+        self.path = path
+        self.capacity = capacity
+        self.max_probes = min(max_probes, capacity)
+
+        self._size = _SHARED_HEADER.size + capacity * _SHARED_SLOT.size
+        self._fd = None
+        self._table = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self._open()
+
+    def burn(self, nonce, timestamp):
+        timestamp = int(timestamp)
+        expired_before = int(time.time()) - self.lifetime
+
+        if timestamp <= expired_before:
+            logger.debug('nonce has already expired: %s', nonce)
+            return False
+
+        digest = hashlib.sha256(utils.to_bytes(nonce)).digest()
+        start = struct.unpack(str('<Q'), digest[:8])[0] % self.capacity
+        key = digest[8:]
+
+        with self._locked_table() as table:
+            free = None
+
+            for probe in range(self.max_probes):
+                offset = _SHARED_HEADER.size + \
+                    ((start + probe) % self.capacity) * _SHARED_SLOT.size
+                slot_timestamp, slot_key = _SHARED_SLOT.unpack_from(table, offset)
+
+                if slot_timestamp == 0:
+                    # never used, so the nonce can't be further along
+                    free = free or offset
+                    break
+
+                if slot_timestamp <= expired_before:
+                    free = free or offset
+                elif slot_key == key:
+                    return False
+
+            if not free:
+                logger.warning('shared nonce store is full, rejecting nonce: %s', nonce)
+                return False
+
+            _SHARED_SLOT.pack_into(table, free, timestamp, key)
+            return True
+
+    def close(self):
+        """
+        Unmap and close the table file
+        """
+        with self._lock:
+            if self._table is not None:
+                self._table.close()
+                os.close(self._fd)
+                self._table = None
+                self._fd = None
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            existing_size = os.fstat(self._fd).st_size
+
+            if existing_size == 0:
+                os.ftruncate(self._fd, self._size)
+                os.write(self._fd, _SHARED_HEADER.pack(_SHARED_MAGIC, self.capacity))
+            elif existing_size != self._size or \
+                    os.read(self._fd, _SHARED_HEADER.size) != \
+                    _SHARED_HEADER.pack(_SHARED_MAGIC, self.capacity):
+                os.close(self._fd)
+                self._fd = None
+                raise ValueError('{} is not a nonce table with capacity {}'.format(
+                    self.path, self.capacity
+                ))
+
+            self._table = mmap.mmap(self._fd, self._size)
+        finally:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _locked_table(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # flock() doesn't exclude processes sharing a file description, re-open after fork
+                self._table.close()
+                os.close(self._fd)
+                self._open()
+
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._table
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class SQLiteNonceStore(BaseNonceStore):
+    """
+    Keeps burned nonces in an SQLite database, so that they are remembered
+    across restarts of a single verifier process.
+
+    The database is used in WAL mode, and new nonces are inserted in groups by a
+    background thread every `commit_interval` seconds, rather than committing once
+    per nonce. Nonces burned in the last `commit_interval` before a crash may be
+    forgotten. Expired nonces are pruned every `prune_interval` seconds.
+
+    Use :py:class:`SharedMemoryNonceStore` to share nonces between processes.
+    """
+    def __init__(self, path, lifetime=NONCE_LIFETIME_SEC,
+                 commit_interval=SQLITE_COMMIT_INTERVAL_SEC,
+                 prune_interval=SQLITE_PRUNE_INTERVAL_SEC):
+        """
+        :param path: database file, created if it doesn't exist
+        :param lifetime: seconds after its timestamp that a nonce needs to be remembered
+        :param commit_interval: seconds to collect new nonces before committing them
+        :param prune_interval: seconds between deleting expired nonces
+        """
+        super(SQLiteNonceStore, self).__init__(lifetime)
+        self.path = path
+        self.commit_interval = commit_interval
+        self.prune_interval = prune_interval
+
+        self._pending = {}
+        self._last_prune = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._flush_needed = threading.Event()
+
+        self._open()
+
+    def burn(self, nonce, timestamp):
+        timestamp = int(timestamp)
+
+        if timestamp <= int(time.time()) - self.lifetime:
+            logger.debug('nonce has already expired: %s', nonce)
+            return False
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # neither the connection nor the flusher thread survive a fork
+                self._pending.clear()
+                self._open()
+
+            if nonce in self._pending or \
+                    self._db.execute('SELECT 1 FROM nonces WHERE nonce = ?', (nonce,)).fetchone():
+                return False
+
+            self._pending[nonce] = timestamp
+
+        self._flush_needed.set()
+        return True
+
+    def flush(self):
+        """
+        Commit any pending nonces, and prune expired ones if it's time to
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """
+        Commit any pending nonces and close the database
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._flush_needed.set()
+        self._flusher.join()
+
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+    def _open(self):
+        self._pid = os.getpid()
+
+        self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS nonces (nonce TEXT PRIMARY KEY, ts INTEGER NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS nonces_ts ON nonces (ts)')
+
+        self._flusher = threading.Thread(target=self._run_flusher, name='oneid-nonce-flusher')
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def _flush(self):
+        now = int(time.time())
+
+        self._db.execute('BEGIN')
+        try:
+            if self._pending:
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO nonces (nonce, ts) VALUES (?, ?)',
+                    self._pending.items(),
+                )
+
+            if now - self._last_prune >= self.prune_interval:
+                self._db.execute('DELETE FROM nonces WHERE ts <= ?', (now - self.lifetime,))
+                self._last_prune = now
+
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+
+        self._pending.clear()
+
+    def _run_flusher(self):
+        while not self._closed:
+            self._flush_needed.wait()
+            time.sleep(self.commit_interval)
+            self._flush_needed.clear()
+
+            try:
+                self.flush()
+            except Exception:  # pragma: no cover
+                logger.warning('error committing nonces, will retry', exc_info=True)
+                self._flush_needed.set()
@@ -9,15 +9,19 @@ from __future__ import unicode_literals
 import os
 import base64
 import re
+import collections
+import itertools
+import threading
 import logging
 
+import six
+
 from cryptography.hazmat.primitives.asymmetric import ec
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.serialization \
     import Encoding, PrivateFormat, NoEncryption
 
-from .keychain import Keypair
+from .keychain import Keypair, AESGCMCipher, AES_GCM_IV_BYTES
 from . import jwts
 from . import utils
 
@@ -26,27 +30,115 @@ logger = logging.getLogger(__name__)
 
 AUTHENTICATION_ENDPOINT = 'http://developer-portal.oneid.com/api/{project}/authenticate'
 
+_URL_FIELD_RE = re.compile(r'{(\w+)}')
+
+_service_class_cache = {}
+_service_class_cache_lock = threading.Lock()
+
+ATTR_BATCH_CHUNK_SIZE = 256
+
+
+class UrlTemplate(object):
+    """
+    Endpoint URL with `{placeholders}`, parsed once so that each call
+    only has to look up the values and join them in.
+
+    :ivar fields: placeholder names, in the order they appear
+    """
+    def __init__(self, template):
+        """
+        :param template: url with `{placeholders}`
+        """
+        self.template = template
+
+        parts = _URL_FIELD_RE.split(template)
+        self.fields = tuple(parts[1::2])
+
+        literals = [literal.replace('{', '{{').replace('}', '}}') for literal in parts[0::2]]
+        self._format_string = '{}'.join(literals)
+
+    def __str__(self):
+        return self.template
+
+    def format(self, service, params):
+        """
+        Fill in the placeholders
+
+        :param service: object to get attribute placeholders from
+        :param params: Dictionary lookup to replace url arguments with
+        :return: url
+        :raises: :py:class:`TypeError` if a placeholder has no value
+        """
+        values = []
+
+        for field in self.fields:
+            if field in params:
+                values.append(params[field])
+            else:
+                try:
+                    values.append(getattr(service, field))
+                except AttributeError:
+                    raise TypeError('Missing URL argument %s' % field)
+
+        return self._format_string.format(*values)
+
 
 class ServiceCreator(object):
     """
     Read yaml file and add methods dynamically from file
     Created by Session
     """
-    def create_service_class(self, service_name, service_model, session, **kwargs):
+    @property
+    def service_class(self):
+        """
+        Base class for created services
+        """
+        return BaseService
+
+    def create_service_class(self, service_name, service_model, session,
+                             config_key=None, **kwargs):
         """
         Service Model is either user, server or edge_device
+
+        :param config_key: (optional) `(path, version)` of the configuration file the
+            service model was loaded from. Service classes are only created once
+            for each configuration, and reused for later sessions
         """
-        class_attrs = self._create_methods(service_model, **kwargs)
-        cls = type(str(service_name), (BaseService,), class_attrs)
+        if config_key is None:
+            cls = self._create_service_class(service_name, service_model, **kwargs)
+        else:
+            cls = self._get_cached_service_class(service_name, service_model,
+                                                 config_key, **kwargs)
 
         return cls(session, kwargs.get('project_credentials'))
 
+    def _create_service_class(self, service_name, service_model, **kwargs):
+        class_attrs = self._create_methods(service_model, **kwargs)
+        return type(str(service_name), (self.service_class,), class_attrs)
+
+    def _get_cached_service_class(self, service_name, service_model, config_key, **kwargs):
+        path, version = config_key
+        cache_key = (type(self), path, service_name, _get_base_url(**kwargs))
+
+        with _service_class_cache_lock:
+            cached = _service_class_cache.get(cache_key)
+
+        if cached and cached[0] == version:
+            return cached[1]
+
+        cls = self._create_service_class(service_name, service_model, **kwargs)
+
+        with _service_class_cache_lock:
+            _service_class_cache[cache_key] = (version, cls)
+
+        return cls
+
     def _create_methods(self, service_model, **kwargs):
         """
         :param service_model:
         :return: Dictionary of class attributes
         """
-        base_url = os.environ.get('ONEID_API_SERVER_BASE_URL', kwargs.get('base_url', ''))
+        base_url = _get_base_url(**kwargs)
 
         methods = dict()
         for method_name, method_values in service_model.items():
@@ -58,8 +150,9 @@ class ServiceCreator(object):
                     if arg_properties['required'] is True:
                         required_jwt.append(arg_name)
 
-            absolute_url = '{base}{endpoint}'.format(base=base_url,
-                                                     endpoint=method_values['endpoint'])
+            absolute_url = UrlTemplate('{base}{endpoint}'.format(
+                base=base_url, endpoint=method_values['endpoint'],
+            ))
 
             methods[method_name] = self._create_api_method(method_name,
                                                            absolute_url,
@@ -78,14 +171,7 @@ class ServiceCreator(object):
         :param method_name: method that will be called
         """
         def _api_call(self, *args, **kwargs):
-            if kwargs.get('body') is None:
-                # if the body isn't specified, check for
-                # required body arguments
-                for required in required_body_args:
-                    if required not in kwargs:
-                        raise TypeError('Missing Required Keyword Argument:'
-                                        ' %s' % required)
-                kwargs.update(body_args=all_body_args)
+            _check_body_args(kwargs, all_body_args, required_body_args)
             return self._make_api_request(endpoint, http_method, **kwargs)
 
         _api_call.__name__ = str(name)
@@ -123,21 +209,15 @@ class BaseService(object):
             /project/{project_id}
             >>> /project/abc-123
 
-        :param url_template: url with arguments that need replaced by vars
+        :param url_template: :py:class:`UrlTemplate`, or url with arguments that
+            need replaced by vars
         :param params: Dictionary lookup to replace url arguments with
         :return: absolute url
         """
-        encoded_params = dict()
-        url_args = re.findall(r'{(\w+)}', url_template)
-        for url_arg in url_args:
-            if url_arg in kwargs:
-                encoded_params[url_arg] = kwargs[url_arg]
-            elif hasattr(self, url_arg):
-                # Check if the argument is a class attribute (i.e. project_id)
-                encoded_params[url_arg] = getattr(self, url_arg)
-            else:
-                raise TypeError('Missing URL argument %s' % url_arg)
-        return url_template.format(**encoded_params)
+        if not isinstance(url_template, UrlTemplate):
+            url_template = UrlTemplate(url_template)
+
+        return url_template.format(self, kwargs)
 
     def _make_api_request(self, endpoint, http_method, **kwargs):
         """
@@ -159,6 +239,21 @@ class BaseService(object):
             return self.session.service_request(http_method, url, body=kwargs.get('body'))
 
 
+def _get_base_url(**kwargs):
+    return os.environ.get('ONEID_API_SERVER_BASE_URL', kwargs.get('base_url', ''))
+
+
+def _check_body_args(kwargs, all_body_args, required_body_args):
+    if kwargs.get('body') is None:
+        # if the body isn't specified, check for
+        # required body arguments
+        for required in required_body_args:
+            if required not in kwargs:
+                raise TypeError('Missing Required Keyword Argument:'
+                                ' %s' % required)
+        kwargs.update(body_args=all_body_args)
+
+
 def create_secret_key(output=None):
     """
     Create a secret key and save it to a secure location
@@ -194,13 +289,7 @@ def encrypt_attr_value(attr_value, aes_key):
     :param aes_key: symmetric key to encrypt attribute value with
     :return: Dictionary with base64 encoded cipher text and base 64 encoded iv
     """
-    iv = os.urandom(16)
-    cipher_alg = Cipher(algorithms.AES(aes_key), modes.GCM(iv), backend=default_backend())
-    encryptor = cipher_alg.encryptor()
-    encr_value = encryptor.update(utils.to_bytes(attr_value)) + encryptor.finalize()
-    encr_value_b64 = base64.b64encode(encr_value + encryptor.tag)
-    iv_b64 = base64.b64encode(iv)
-    return {'cipher': 'aes', 'mode': 'gcm', 'ts': 128, 'iv': iv_b64, 'ct': encr_value_b64}
+    return AESGCMCipher(utils.to_bytes(aes_key)).encrypt(attr_value)
 
 
 def decrypt_attr_value(attr_ct, aes_key):
@@ -211,6 +300,10 @@ def decrypt_attr_value(attr_ct, aes_key):
     :param aes_key: symmetric key to decrypt attribute value with
     :return: plaintext bytes
     """
+    return _decrypt_attr_value(AESGCMCipher(utils.to_bytes(aes_key)), attr_ct)
+
+
+def _decrypt_attr_value(cipher, attr_ct):
     if not isinstance(attr_ct, dict) or \
             attr_ct.get('cipher', 'aes') != 'aes' or \
             attr_ct.get('mode', 'gcm') != 'gcm':
@@ -220,12 +313,122 @@ def decrypt_attr_value(attr_ct, aes_key):
     iv = base64.b64decode(attr_ct['iv'])
     tag_ct = base64.b64decode(attr_ct['ct'])
     ts = attr_ct.get('ts', 64) // 8
-    tag = tag_ct[-ts:]
-    ct = tag_ct[:-ts]
-    cipher_alg = Cipher(
-        algorithms.AES(aes_key),
-        modes.GCM(iv, tag, min_tag_length=8),
-        backend=default_backend()
-    )
-    decryptor = cipher_alg.decryptor()
-    return decryptor.update(ct) + decryptor.finalize()
+    return cipher.decrypt(iv, tag_ct, ts)
+
+
+def encrypt_attr_values(attr_values, aes_key, backend=None, max_workers=None):
+    """
+    Encrypt many attribute values with the same key
+
+    Values are encrypted in chunks of `ATTR_BATCH_CHUNK_SIZE`, taking all of a chunk's
+    IVs from a single call to :py:func:`os.urandom`. Only a few chunks are held in
+    memory at once, so `attr_values` can be a generator over a very large data set.
+
+    :param attr_values: iterable of plain text (string or bytes) values,
+        or a dict of attribute names to values
+    :param aes_key: symmetric key to encrypt attribute values with
+    :param backend: (optional) None to encrypt in this thread, 'thread' or 'process'
+        to create a pool of that kind, or an existing
+        :py:class:`concurrent.futures.Executor` to reuse
+    :param max_workers: (optional) size of the pool, if one is created.
+        Defaults to the number of CPUs
+    :return: generator of encrypted values, as from :py:func:`encrypt_attr_value`, in order,
+        or of `(name, encrypted value)` pairs if `attr_values` is a dict
+    """
+    _check_batch_backend(backend)
+    return _map_attr_values(_encrypt_attr_chunk, attr_values, aes_key, backend, max_workers)
+
+
+def decrypt_attr_values(attr_cts, aes_key, backend=None, max_workers=None):
+    """
+    Decrypt many attribute values with the same key
+
+    :param attr_cts: iterable of encrypted values, as from :py:func:`encrypt_attr_value`,
+        or a dict of attribute names to encrypted values
+    :param aes_key: symmetric key to decrypt attribute values with
+    :param backend: (optional) see :py:func:`encrypt_attr_values`
+    :param max_workers: (optional) see :py:func:`encrypt_attr_values`
+    :return: generator of plaintext bytes, in order,
+        or of `(name, plaintext bytes)` pairs if `attr_cts` is a dict.
+        Stops with an exception at the first value that can't be decrypted.
+    """
+    _check_batch_backend(backend)
+    return _map_attr_values(_decrypt_attr_chunk, attr_cts, aes_key, backend, max_workers)
+
+
+def _check_batch_backend(backend):
+    if backend in jwts.BATCH_BACKENDS:
+        return
+
+    from concurrent import futures  # only needed for batches, keep single values light
+
+    if not isinstance(backend, futures.Executor):
+        raise ValueError('backend must be one of %s' % ', '.join(map(str, jwts.BATCH_BACKENDS)))
+
+
+def _map_attr_values(func, attr_values, aes_key, backend, max_workers):
+    is_dict = isinstance(attr_values, dict)
+    items = six.iteritems(attr_values) if is_dict else ((None, value) for value in attr_values)
+
+    chunks = iter(lambda: list(itertools.islice(items, ATTR_BATCH_CHUNK_SIZE)), [])
+
+    for chunk, results in _map_attr_chunks(func, chunks, aes_key, backend, max_workers):
+        for (name, _), result in zip(chunk, results):
+            yield (name, result) if is_dict else result
+
+
+def _map_attr_chunks(func, chunks, aes_key, backend, max_workers):
+    if backend is None:
+        for chunk in chunks:
+            yield chunk, func([value for _, value in chunk], aes_key)
+        return
+
+    import multiprocessing
+    from concurrent import futures
+
+    max_workers = max_workers or multiprocessing.cpu_count()
+    executor = backend
+
+    if not isinstance(backend, futures.Executor):
+        executor_class = futures.ThreadPoolExecutor
+        if backend == 'process':
+            executor_class = futures.ProcessPoolExecutor
+
+        executor = executor_class(max_workers)
+
+    # keep a couple of chunks per worker in flight, rather than reading all of them in
+    in_flight = collections.deque()
+
+    try:
+        for chunk in chunks:
+            in_flight.append((chunk, executor.submit(func, [value for _, value in chunk], aes_key)))
+
+            if len(in_flight) > 2 * max_workers:
+                chunk, future = in_flight.popleft()
+                yield chunk, future.result()
+
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            yield chunk, future.result()
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+        if executor is not backend:
+            executor.shutdown()
+
+
+def _encrypt_attr_chunk(attr_values, aes_key):
+    cipher = AESGCMCipher(utils.to_bytes(aes_key))
+    ivs = os.urandom(AES_GCM_IV_BYTES * len(attr_values))
+
+    return [
+        cipher.encrypt(attr_value, ivs[i:i + AES_GCM_IV_BYTES])
+        for i, attr_value in zip(range(0, len(ivs), AES_GCM_IV_BYTES), attr_values)
+    ]
+
+
+def _decrypt_attr_chunk(attr_cts, aes_key):
+    cipher = AESGCMCipher(utils.to_bytes(aes_key))
+
+    return [_decrypt_attr_value(cipher, attr_ct) for attr_ct in attr_cts]
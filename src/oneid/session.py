@@ -1,17 +1,30 @@
 from __future__ import unicode_literals
 
 import os
-import yaml
+import json
+import hashlib
+import tempfile
+import threading
 import logging
 
-from requests import request
 from codecs import open
 
 from . import service, jwts, exceptions
+from .tokens import AuthTokenProvider
+from .transport import get_default_transport
 
 logger = logging.getLogger(__name__)
 
 
+VALID_HTTP_METHODS = ['GET', 'PUT', 'POST', 'DELETE']
+
+# set to a directory to keep parsed configuration files, to skip YAML parsing at start-up
+CONFIG_CACHE_DIR = os.environ.get('ONEID_CONFIG_CACHE_DIR')
+
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
+
 class SessionBase(object):
     """
     Abstract Session Class
@@ -19,30 +32,75 @@ class SessionBase(object):
     :ivar identity_credentials: oneID identity :class:`~oneid.keychain.Credentials`
     :ivar project_credentials: unique project credentials :class:`~oneid.keychain.Credentials`
     :ivar oneid_credentials: oneID project credentials :class:`~oneid.keychain.Credentials`
+    :ivar transport: :class:`~oneid.transport.HTTPTransport` used for API requests
+    :ivar auth_tokens: :class:`~oneid.tokens.AuthTokenProvider` for API request
+        `Authorization` headers, created on first use
     """
+    service_creator_class = service.ServiceCreator
+
     def __init__(self, identity_credentials=None, project_credentials=None,
-                 oneid_credentials=None, config=None):
+                 oneid_credentials=None, config=None, transport=None):
         """
 
         :param identity_credentials: :py:class:`~oneid.keychain.Credentials`
         :param project_credentials: :py:class:`~oneid.keychain.ProjectCredentials`
         :param oneid_credentials: :py:class:`~oneid.keychain.Credentials`
         :param config: Dictionary or configuration keyword arguments
+        :param transport: (optional) :py:class:`~oneid.transport.HTTPTransport`.
+            Defaults to a transport shared by all sessions
         :return:
         """
         self.identity_credentials = identity_credentials
         self.project_credentials = project_credentials
         self.oneid_credentials = oneid_credentials
+        self.transport = transport or get_default_transport()
+        self.auth_tokens = None
+        self._auth_tokens_lock = threading.Lock()
+        self._config_key = None
+
+    def close(self):
+        """
+        Stop pre-signing authorization tokens for this session
+
+        The transport may be shared with other sessions, so it is left open.
+        """
+        with self._auth_tokens_lock:
+            if self.auth_tokens is not None:
+                self.auth_tokens.close()
+                self.auth_tokens = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _load_config(self, config_file):
         """
         Load configuration from file
+
+        Parsed files are cached for the life of the process, until they are modified.
+        The returned dict is shared, and must not be changed.
+
         :return: dict()
         """
-        # Load params from configuration file
-        with open(config_file, mode='r', encoding='utf-8') as config:
-            params = yaml.safe_load(config)
-            return params
+        path = os.path.realpath(config_file)
+        stat = os.stat(path)
+        version = (stat.st_mtime, stat.st_size)
+
+        with _config_cache_lock:
+            cached = _config_cache.get(path)
+
+        if cached and cached[0] == version:
+            params = cached[1]
+        else:
+            params = _load_cached_config(path, version)
+
+            with _config_cache_lock:
+                _config_cache[path] = (version, params)
+
+        self._config_key = (path, version)
+        return params
 
     def _create_services(self, methods, **kwargs):
         """
@@ -50,7 +108,7 @@ class SessionBase(object):
 
         :return: None
         """
-        service_creator = service.ServiceCreator()
+        service_creator = self.service_creator_class()
 
         for method in methods:
             if method != 'GLOBAL':
@@ -58,6 +116,7 @@ class SessionBase(object):
                         service_creator.create_service_class(method,
                                                              methods[method],
                                                              self,
+                                                             config_key=self._config_key,
                                                              **kwargs)
                         )
 
@@ -69,12 +128,9 @@ class SessionBase(object):
         :param body:
         :return:
         """
-        valid_http_methods = ['GET', 'PUT', 'POST', 'DELETE']
-        if http_method not in valid_http_methods:
-            raise TypeError('HTTP method must be %s' %
-                            ', '.join(valid_http_methods))
+        _check_http_method(http_method)
 
-        req = request(http_method, url, headers=headers, data=body)
+        req = self.transport.request(http_method, url, headers=headers, data=body)
 
         logger.debug(
             'making http %s request to %s, headers=%s, data=%s, req=%s',
@@ -96,13 +152,28 @@ class SessionBase(object):
         :param body:
         :return:
         """
-        auth_jwt_header = jwts.make_jwt({}, self.identity_credentials.keypair)
+        headers = self._service_request_headers(self._get_auth_tokens().get_token())
+
+        return self.make_http_request(http_method, endpoint, headers=headers, body=body)
+
+    def _get_auth_tokens(self):
+        keypair = self.identity_credentials.keypair
+
+        with self._auth_tokens_lock:
+            if self.auth_tokens is None or self.auth_tokens.keypair is not keypair:
+                if self.auth_tokens is not None:
+                    self.auth_tokens.close()
+
+                self.auth_tokens = AuthTokenProvider(keypair)
 
-        headers = {
+            return self.auth_tokens
+
+    @staticmethod
+    def _service_request_headers(auth_jwt_header):
+        return {
             'Content-Type': 'application/jwt',
             'Authorization': 'Bearer %s' % auth_jwt_header
         }
-        return self.make_http_request(http_method, endpoint, headers=headers, body=body)
 
     def prepare_message(self, *args, **kwargs):
         raise NotImplementedError
@@ -116,19 +187,24 @@ class SessionBase(object):
 
 class DeviceSession(SessionBase):
     def __init__(self, identity_credentials=None, project_credentials=None,
-                 oneid_credentials=None, config=None):
+                 oneid_credentials=None, config=None, transport=None):
         super(DeviceSession, self).__init__(identity_credentials,
                                             project_credentials,
-                                            oneid_credentials, config)
+                                            oneid_credentials, config, transport)
 
     def verify_message(self, message, rekey_credentials=None):
         """
         Verify a message received from the server
 
-        :param message: JSON formatted JWS with at least two signatures
+        :param message: JSON formatted JWS with at least two signatures,
+            or a :py:class:`~oneid.jwts.ParsedJWS`
         :param rekey_credentials: List of :class:`~oneid.keychain.Credential`
         :return: verified message or False if not valid
         """
+        # parsed once, for both looking up key IDs and verifying
+        if not isinstance(message, jwts.ParsedJWS):
+            message = jwts.ParsedJWS(message)
+
         standard_keypairs = [
             self.project_credentials.keypair,
             self.oneid_credentials.keypair,
@@ -163,10 +239,10 @@ class ServerSession(SessionBase):
     Enable Server to request two-factor Authentication from oneID
     """
     def __init__(self, identity_credentials=None, project_credentials=None,
-                 oneid_credentials=None, config=None):
+                 oneid_credentials=None, config=None, transport=None):
         super(ServerSession, self).__init__(identity_credentials,
                                             project_credentials,
-                                            oneid_credentials, config)
+                                            oneid_credentials, config, transport)
 
         if isinstance(config, dict):
             params = config
@@ -183,7 +259,7 @@ class ServerSession(SessionBase):
         Populate session variables and create methods from
         :return: None
         """
-        global_kwargs = params.get('GLOBAL', {})
+        global_kwargs = dict(params.get('GLOBAL', {}))
         if self.project_credentials:
             global_kwargs['project_credentials'] = self.project_credentials
 
@@ -211,6 +287,28 @@ class ServerSession(SessionBase):
 
         return jwts.extend_jws_signatures(oneid_response, keypairs)
 
+    def create_cosign_batcher(self, service_name='authenticate', method_name='edge_device',
+                              **kwargs):
+        """
+        Batch up calls to a service method, for servers sending many messages to be cosigned
+
+        :Example:
+
+            batcher = session.create_cosign_batcher()
+            future = batcher.submit(identity=device_id, message=message)
+            oneid_response = future.result()
+
+        :param service_name: service to call, from the session configuration
+        :param method_name: method of the service to call
+        :param kwargs: options for :py:class:`~oneid.batching.CosignBatcher`
+        :return: :py:class:`~oneid.batching.CosignBatcher`
+        """
+        # imported on first use, so that importing sessions doesn't load the thread machinery
+        from .batching import CosignBatcher
+
+        method = getattr(getattr(self, service_name), method_name)
+        return CosignBatcher(method, **kwargs)
+
     def send_message(self, *args, **kwargs):
         raise NotImplementedError
 
@@ -225,10 +323,10 @@ class AdminSession(SessionBase):
     to verify responses
     """
     def __init__(self, identity_credentials, project_credentials=None,
-                 oneid_credentials=None, config=None):
+                 oneid_credentials=None, config=None, transport=None):
         super(AdminSession, self).__init__(identity_credentials,
                                            project_credentials,
-                                           oneid_credentials, config)
+                                           oneid_credentials, config, transport)
 
         if isinstance(config, dict):
             params = config
@@ -244,7 +342,7 @@ class AdminSession(SessionBase):
         Populate session variables and create methods from
         :return: None
         """
-        global_kwargs = params.get('GLOBAL', {})
+        global_kwargs = dict(params.get('GLOBAL', {}))
         if self.project_credentials:
             global_kwargs['project_credentials'] = self.project_credentials
 
@@ -258,3 +356,51 @@ class AdminSession(SessionBase):
 
     def verify_message(self, *args, **kwargs):
         raise NotImplementedError
+
+
+def _load_cached_config(path, version):
+    cache_path = None
+
+    if CONFIG_CACHE_DIR:
+        cache_name = hashlib.sha256(path.encode('utf-8')).hexdigest() + '.json'
+        cache_path = os.path.join(CONFIG_CACHE_DIR, cache_name)
+
+        try:
+            with open(cache_path, mode='r', encoding='utf-8') as cache_file:
+                cached = json.load(cache_file)
+
+            if cached['path'] == path and tuple(cached['version']) == version:
+                return cached['params']
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            logger.debug('no usable cached config for %s', path, exc_info=True)
+
+    import yaml  # only needed when a configuration isn't cached
+
+    # Load params from configuration file
+    with open(path, mode='r', encoding='utf-8') as config:
+        params = yaml.safe_load(config)
+
+    if cache_path:
+        _save_cached_config(cache_path, {'path': path, 'version': version, 'params': params})
+
+    return params
+
+
+def _save_cached_config(cache_path, cached):
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump(cached, cache_file)
+            os.rename(tmp_path, cache_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+    except (IOError, OSError, TypeError, ValueError):
+        logger.warning('unable to cache config in %s', cache_path, exc_info=True)
+
+
+def _check_http_method(http_method):
+    if http_method not in VALID_HTTP_METHODS:
+        raise TypeError('HTTP method must be %s' %
+                        ', '.join(VALID_HTTP_METHODS))
@@ -0,0 +1,161 @@
+"""
+Convert ECDSA signatures between the raw, fixed-width `R || S` format used by
+JWS and the DER-encoded format used by the cryptography backends.
+
+Conversions work directly on the big-endian bytes of `r` and `s`, without
+round-tripping through Python integers or hex strings.
+"""
+from __future__ import unicode_literals
+
+import binascii
+
+import six
+
+_DER_SEQUENCE = 0x30
+_DER_INTEGER = 0x02
+_DER_SEQUENCE_TAG = six.int2byte(_DER_SEQUENCE)
+_DER_INTEGER_TAG = six.int2byte(_DER_INTEGER)
+
+
+def raw_to_der(raw_signature):
+    """
+    Convert a raw `R || S` signature to DER
+
+    :param raw_signature: concatenated, equal-length, big-endian `r` and `s`
+    :type raw_signature: bytes
+    :return: DER-encoded signature
+    :rtype: bytes
+    :raises: :py:class:`ValueError` if not a valid raw signature
+    """
+    if not raw_signature or len(raw_signature) % 2:
+        raise ValueError('raw signature must be two equal-length integers')
+
+    size = len(raw_signature) // 2
+    body = _der_integer(raw_signature[:size]) + _der_integer(raw_signature[size:])
+
+    return _DER_SEQUENCE_TAG + _der_length(len(body)) + body
+
+
+def der_to_raw(der_signature, size):
+    """
+    Convert a DER signature to raw `R || S`
+
+    :param der_signature: DER-encoded signature
+    :type der_signature: bytes
+    :param size: number of bytes for each of `r` and `s`
+    :type size: int
+    :return: concatenated, fixed-width, big-endian `r` and `s`
+    :rtype: bytes
+    :raises: :py:class:`ValueError` if not a valid DER signature,
+        or `r` or `s` don't fit in `size` bytes
+    """
+    der = bytearray(der_signature)
+
+    if not der or der[0] != _DER_SEQUENCE:
+        raise ValueError('DER signature must be a SEQUENCE')
+
+    body_start, body_length = _read_der_length(der, 1)
+    if body_start + body_length != len(der):
+        raise ValueError('invalid DER signature length')
+
+    r_start, r_length = _read_der_integer(der, body_start)
+    s_start, s_length = _read_der_integer(der, r_start + r_length)
+    if s_start + s_length != len(der):
+        raise ValueError('unexpected data after DER signature')
+
+    return _fixed_width(der_signature[r_start:r_start + r_length], size) + \
+        _fixed_width(der_signature[s_start:s_start + s_length], size)
+
+
+def int_to_bytes(i, size):
+    """
+    Convert a non-negative integer to fixed-width, big-endian bytes
+
+    :param i: integer to convert
+    :param size: number of bytes to return
+    :return: bytes
+    :raises: :py:class:`OverflowError` if the integer doesn't fit in `size` bytes
+    """
+    if six.PY2:  # pragma: no cover
+        if i >> (size * 8):
+            raise OverflowError('int too big to convert')
+        return binascii.unhexlify('%0*x' % (size * 2, i))
+
+    return i.to_bytes(size, 'big')
+
+
+def bytes_to_int(data):
+    """
+    Convert big-endian bytes to a non-negative integer
+
+    :param data: bytes to convert
+    :return: integer
+    """
+    if six.PY2:  # pragma: no cover
+        return int(binascii.hexlify(data) or b'0', 16)
+
+    return int.from_bytes(data, 'big')
+
+
+def _der_integer(value):
+    value = value.lstrip(b'\x00') or b'\x00'
+
+    if value[:1] >= b'\x80':
+        value = b'\x00' + value
+
+    return _DER_INTEGER_TAG + _der_length(len(value)) + value
+
+
+def _der_length(length):
+    if length < 0x80:
+        return six.int2byte(length)
+
+    encoded = int_to_bytes(length, (length.bit_length() + 7) // 8)
+    return six.int2byte(0x80 | len(encoded)) + encoded
+
+
+def _read_der_length(der, offset):
+    if offset >= len(der):
+        raise ValueError('truncated DER signature')
+
+    length = der[offset]
+    offset += 1
+
+    if length < 0x80:
+        return offset, length
+
+    count = length & 0x7f
+    if count == 0 or count > 4 or offset + count > len(der) or der[offset] == 0:
+        raise ValueError('invalid DER length')
+
+    length = bytes_to_int(bytes(der[offset:offset + count]))
+    if length < 0x80:
+        raise ValueError('non-minimal DER length')
+
+    return offset + count, length
+
+
+def _read_der_integer(der, offset):
+    if offset >= len(der) or der[offset] != _DER_INTEGER:
+        raise ValueError('DER signature must contain two INTEGERs')
+
+    start, length = _read_der_length(der, offset + 1)
+    if length == 0 or start + length > len(der):
+        raise ValueError('invalid DER INTEGER length')
+
+    if der[start] & 0x80:
+        raise ValueError('DER signature INTEGERs must be positive')
+
+    if length > 1 and der[start] == 0 and not der[start + 1] & 0x80:
+        raise ValueError('non-minimal DER INTEGER')
+
+    return start, length
+
+
+def _fixed_width(value, size):
+    value = value.lstrip(b'\x00')
+
+    if len(value) > size:
+        raise ValueError('signature value too large')
+
+    return b'\x00' * (size - len(value)) + value
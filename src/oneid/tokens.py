@@ -0,0 +1,146 @@
+"""
+Authorization tokens for oneID API requests.
+
+Every API request carries a freshly signed JWT with a unique `jti`.
+:py:class:`AuthTokenProvider` signs a small pool of them in a background thread,
+so that busy sessions' requests don't have to wait for the signature.
+"""
+from __future__ import unicode_literals
+
+import os
+import time
+import threading
+import collections
+import logging
+
+from . import jwts
+
+logger = logging.getLogger(__name__)
+
+
+AUTH_TOKEN_POOL_SIZE = 8
+AUTH_TOKEN_MAX_AGE_SEC = 60
+AUTH_TOKEN_PREFETCH_AFTER = 3
+
+
+class AuthTokenProvider(object):
+    """
+    Hands out pre-signed JWTs for the `Authorization` header, each one only once.
+
+    Tokens are signed inline until `prefetch_after` have been requested, so that
+    short-lived sessions don't start threads or sign tokens they won't use.
+    After that, the pool is filled by a daemon thread, which stops once no tokens
+    have been requested for `max_age`, or when the provider is closed.
+    If the pool is empty, or its tokens are older than `max_age`, a token is signed inline.
+    """
+    def __init__(self, keypair, pool_size=AUTH_TOKEN_POOL_SIZE, max_age=AUTH_TOKEN_MAX_AGE_SEC,
+                 json_encoder=None, prefetch_after=AUTH_TOKEN_PREFETCH_AFTER):
+        """
+        :param keypair: :py:class:`~oneid.keychain.Keypair` to sign the tokens with
+        :param pool_size: number of tokens to keep ready. If 0, every token is signed inline
+        :param max_age: seconds a pre-signed token can wait in the pool before being discarded
+        :param json_encoder: a function to encode a :py:class:`dict` into JSON.
+            Defaults to the :py:mod:`~oneid.jsoncodecs` default
+        :param prefetch_after: number of tokens to sign inline before starting to pre-sign them
+        """
+        self.keypair = keypair
+        self.pool_size = pool_size
+        self.max_age = max_age
+        self.json_encoder = json_encoder
+        self.prefetch_after = prefetch_after
+
+        self._tokens = collections.deque()
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._closed = False
+        self._minter = None
+        self._requested = 0
+        self._pid = None
+
+    def get_token(self):
+        """
+        Get a signed JWT that hasn't been handed out before
+
+        :return: JWT
+        :rtype: str
+        """
+        if self.pool_size > 0 and not self._closed:
+            token = self._pop_token()
+            self._refill_needed.set()
+
+            if token:
+                return token
+
+        return self._make_token()
+
+    def close(self):
+        """
+        Stop the background thread and discard any pre-signed tokens
+        """
+        self._closed = True
+        self._refill_needed.set()
+
+        with self._lock:
+            self._tokens.clear()
+
+    def _pop_token(self):
+        oldest = time.time() - self.max_age
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # threads don't survive a fork, and tokens must not be shared with the parent
+                self._pid = os.getpid()
+                self._tokens.clear()
+                self._minter = None
+                self._requested = 0
+
+            self._requested += 1
+
+            if self._minter is None and self._requested >= self.prefetch_after:
+                self._start_minter()
+
+            while self._tokens:
+                minted_at, token = self._tokens.popleft()
+
+                if minted_at > oldest:
+                    return token
+
+        return None
+
+    def _start_minter(self):
+        self._refill_needed.set()
+
+        self._minter = threading.Thread(target=self._run_minter, name='oneid-auth-token-minter')
+        self._minter.daemon = True
+        self._minter.start()
+
+    def _make_token(self):
+        return jwts.make_jwt({}, self.keypair, json_encoder=self.json_encoder)
+
+    def _run_minter(self):
+        while not self._closed:
+            if not self._refill_needed.wait(self.max_age) and self._stop_idle_minter():
+                return
+
+            self._refill_needed.clear()
+
+            try:
+                while not self._closed and len(self._tokens) < self.pool_size:
+                    token = self._make_token()
+
+                    with self._lock:
+                        self._tokens.append((time.time(), token))
+            except Exception:  # pragma: no cover
+                logger.warning('error pre-signing authorization token', exc_info=True)
+
+    def _stop_idle_minter(self):
+        with self._lock:
+            if self._refill_needed.is_set():
+                return False
+
+            # nothing has been requested for max_age, so the pooled tokens have expired too
+            logger.debug('stopping idle authorization token minter')
+            self._tokens.clear()
+            self._minter = None
+            self._requested = 0
+            return True
@@ -0,0 +1,140 @@
+"""
+HTTP transport used by sessions to talk to the oneID API.
+
+A transport keeps a pool of keep-alive connections for each host, so that
+repeated API calls don't each pay for a new TCP and TLS handshake.
+Sessions share a single default transport unless given one explicitly.
+"""
+from __future__ import unicode_literals
+
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 10
+HTTP_CONNECT_TIMEOUT_SEC = 5
+HTTP_READ_TIMEOUT_SEC = 30
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+class HTTPTransport(object):
+    """
+    Makes HTTP requests over pooled, keep-alive connections.
+
+    Safe to share between threads. Cookies aren't kept between requests, as they
+    were before connections were pooled. After a fork, the child process
+    starts with fresh connection pools rather than sharing sockets with its parent.
+    """
+    def __init__(self, pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT_SEC, read_timeout=HTTP_READ_TIMEOUT_SEC,
+                 pool_block=False):
+        """
+        :param pool_connections: number of hosts to keep connection pools for
+        :param pool_maxsize: maximum number of connections to keep open to each host
+        :param connect_timeout: seconds to wait to establish a connection, or None to wait forever
+        :param read_timeout: seconds to wait for the server to respond, or None to wait forever
+        :param pool_block: if True, wait for a free connection when all `pool_maxsize`
+            connections to a host are in use, rather than opening an extra one
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_block = pool_block
+
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        """
+        :return: `(connect, read)` timeouts, as accepted by :py:mod:`requests`
+        """
+        return self.connect_timeout, self.read_timeout
+
+    def request(self, http_method, url, headers=None, data=None):
+        """
+        Make an HTTP request
+
+        :param http_method: GET, PUT, POST, DELETE
+        :param url: full URL to request
+        :param headers: Dictionary of additional headers
+        :param data: Body/payload
+        :return: :py:class:`requests.Response`
+        """
+        return self._get_session().request(
+            http_method, url, headers=headers, data=data, timeout=self.timeout,
+        )
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                self._session = self._create_session()
+                self._pid = os.getpid()
+
+            return self._session
+
+    def _create_session(self):
+        # imported on first use, so that importing oneid doesn't load requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        from six.moves.http_cookiejar import DefaultCookiePolicy
+
+        adapter_kwargs = {
+            'pool_connections': self.pool_connections,
+            'pool_maxsize': self.pool_maxsize,
+            'pool_block': self.pool_block,
+        }
+
+        http_session = requests.Session()
+        # the session is shared by every oneID session using this transport, so cookies
+        # set for one mustn't be sent with another's requests
+        http_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        http_session.mount('https://', HTTPAdapter(**adapter_kwargs))
+        http_session.mount('http://', HTTPAdapter(**adapter_kwargs))
+
+        logger.debug('created HTTP connection pools: %s', adapter_kwargs)
+        return http_session
+
+
+def get_default_transport():
+    """
+    Get the transport shared by sessions that weren't given one
+
+    :return: :py:class:`HTTPTransport`
+    """
+    global _default_transport
+
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = HTTPTransport()
+
+        return _default_transport
+
+
+def set_default_transport(transport):
+    """
+    Replace the transport shared by sessions created after this call
+
+    :param transport: :py:class:`HTTPTransport`, or None to create a new one when next needed
+    """
+    global _default_transport
+
+    with _default_transport_lock:
+        _default_transport = transport
@@ -4,16 +4,38 @@ Helpful utility functions
 from __future__ import unicode_literals
 import six
 
-import random
+import os
+import string
+import threading
 import time
 import base64
 import re
-from datetime import datetime, timedelta
-from dateutil import parser, tz
 import logging
 
 logger = logging.getLogger(__name__)
 
+NONCE_MAX_AGE_SEC = (1*60*60)    # one hour
+NONCE_MAX_FUTURE_SEC = (2*60)    # two minutes
+
+NONCE_CHARS = string.digits + string.ascii_uppercase + string.ascii_lowercase
+NONCE_RANDOM_LENGTH = 6
+NONCE_RANDOM_BUFFER_SIZE = 4096
+
+# map random bytes onto NONCE_CHARS, dropping the ones that would bias the result
+_NONCE_CHAR_TABLE = bytes(bytearray(
+    ord(NONCE_CHARS[i % len(NONCE_CHARS)]) for i in range(256)
+))
+_NONCE_BIASED_BYTES = bytes(bytearray(
+    range(256 - (256 % len(NONCE_CHARS)), 256)
+))
+
+_NONCE_RE = re.compile(
+    r'001([2-9][0-9]{3})-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])'
+    r'T([01][0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])Z[A-Za-z0-9]{6}\Z'
+)
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_DAYS_BEFORE_MONTH = (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+
 
 def to_bytes(data):
     return data.encode('utf-8') if isinstance(data, unicode if six.PY2 else str) else data
@@ -31,9 +53,7 @@ def base64url_encode(msg):
     :return: base64 en
     :rtype: bytes
     """
-    encoded_input = base64.urlsafe_b64encode(to_bytes(msg))
-    stripped_input = to_bytes(to_string(encoded_input).replace('=', ''))
-    return stripped_input
+    return base64.urlsafe_b64encode(to_bytes(msg)).rstrip(b'=')
 
 
 def base64url_decode(msg):
@@ -54,47 +74,117 @@ def base64url_decode(msg):
     return base64.urlsafe_b64decode(bmsg)
 
 
+class NonceGenerator(object):
+    """
+    Creates nonces in the same format as :func:`~oneid.utils.make_nonce`
+
+    The formatted time is cached for the current second, and random characters are
+    drawn from a buffer filled with one :py:func:`os.urandom` call at a time.
+    Safe to share between threads, and re-seeds itself after a fork.
+    """
+    def __init__(self, buffer_size=NONCE_RANDOM_BUFFER_SIZE):
+        """
+        :param buffer_size: number of random bytes to read at once
+        """
+        self.buffer_size = buffer_size
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._chars = ''
+        self._offset = 0
+        self._second = None
+        self._prefix = None
+
+    def __call__(self):
+        """
+        Create a nonce with timestamp included
+
+        :return: nonce
+        """
+        now = int(time.time())
+
+        with self._lock:
+            if now != self._second:
+                self._second = now
+                self._prefix = '001' + time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now))
+
+            return self._prefix + self._random_chars(NONCE_RANDOM_LENGTH)
+
+    def _random_chars(self, count):
+        if self._pid != os.getpid():
+            # don't hand out the same characters as our parent process
+            self._pid = os.getpid()
+            self._chars = ''
+            self._offset = 0
+
+        while self._offset + count > len(self._chars):
+            raw = os.urandom(self.buffer_size).translate(_NONCE_CHAR_TABLE, _NONCE_BIASED_BYTES)
+            self._chars = self._chars[self._offset:] + to_string(raw)
+            self._offset = 0
+
+        ret = self._chars[self._offset:self._offset + count]
+        self._offset += count
+        return ret
+
+
+_nonce_generator = NonceGenerator()
+
+
 def make_nonce():
     """
     Create a nonce with timestamp included
 
     :return: nonce
     """
-    time_format = '%Y-%m-%dT%H:%M:%SZ'
-    time_component = time.strftime(time_format, time.gmtime())
-    valid_chars = ''
+    return _nonce_generator()
 
-    # iterate over all the aschii characters for a list of all alpha-numeric characters
-    for char_index in range(0, 128):
-        if chr(char_index).isalpha() or chr(char_index).isalnum():
-            valid_chars += chr(char_index)
 
-    random_str = ''
-    random_chr = random.SystemRandom()
-    for i in range(0, 6):
-        random_str += random_chr.choice(valid_chars)
+def parse_nonce_timestamp(nonce):
+    """
+    Validate the format of a nonce and extract the time it was created
 
-    return '001{time_str}{random_str}'.format(time_str=time_component,
-                                              random_str=random_str)
+    :param nonce: Nonce as created with :func:`~oneid.utils.make_nonce`
+    :return: creation time, in seconds since the epoch, or None if not a valid nonce
+    :rtype: int
+    """
+    match = _NONCE_RE.match(nonce)
+    if not match:
+        return None
+
+    year, month, day, hour, minute, second = match.groups()
+    year, month, day = int(year), int(month), int(day)
+
+    leap = year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    if day > 28 and day > _DAYS_IN_MONTH[month] + (month == 2 and leap):
+        return None
 
+    days = (
+        (year - 1970) * 365 + (year - 1969) // 4 - (year - 1901) // 100 + (year - 1601) // 400 +
+        _DAYS_BEFORE_MONTH[month] + (month > 2 and leap) + day - 1
+    )
+    return ((days * 24 + int(hour)) * 60 + int(minute)) * 60 + int(second)
 
-def verify_and_burn_nonce(nonce):
+
+def verify_and_burn_nonce(nonce, nonce_store=None):
     """
     Ensure that the nonce is correct, less than one hour old,
     and not more than two minutes in the future
 
-    Callers should also store used nonces and reject messages
-    with previously-used ones.
+    If a nonce store is given, the nonce is also recorded as used, and
+    rejected if it had been used before. Otherwise, callers should store
+    used nonces and reject messages with previously-used ones.
 
     :param nonce: Nonce as created with :func:`~oneid.utils.make_nonce`
+    :param nonce_store: (optional) :py:class:`~oneid.nonces.BaseNonceStore` to burn the nonce in
     :return: True only if nonce meets validation criteria
     :rtype: bool
     """
-    ret = re.match(r'^001[2-9][0-9]{3}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])'
-                   r'T([01][0-9]|2[0-3])(:[0-5][0-9]){2}Z[A-Za-z0-9]{6}$', nonce)
-    if ret:
-        date = parser.parse(nonce[3:-6])
-        now = datetime.utcnow().replace(tzinfo=tz.tzutc())
-        ret = date < (now + timedelta(minutes=2)) and date > (now + timedelta(hours=-1))
-
-    return ret  # TODO: keep a record (at least for the last hour) of burned nonces
+    timestamp = parse_nonce_timestamp(nonce)
+    if timestamp is None:
+        return False
+
+    now = time.time()
+    if not (now - NONCE_MAX_AGE_SEC) < timestamp < (now + NONCE_MAX_FUTURE_SEC):
+        return False
+
+    return nonce_store is None or nonce_store.burn(nonce, timestamp)
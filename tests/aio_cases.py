@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for :py:mod:`oneid.aio`, which use Python 3.5+ syntax.
+Imported by `test_aio` only on Python 3.5 or later.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import threading
+import logging
+
+import unittest
+import mock
+
+from concurrent import futures
+from six.moves import BaseHTTPServer, socketserver
+
+from oneid import keychain, jwts, exceptions, aio
+
+from .test_session import TestSession, mock_request
+
+logger = logging.getLogger(__name__)
+
+
+class MockAsyncTransport(object):
+    def __init__(self):
+        self.requests = []
+        self.closed = False
+
+    def request(self, http_method, url, headers=None, data=None):
+        self.requests.append((http_method, url, headers, data))
+
+        response = mock_request(http_method, url, headers=headers, data=data)
+        future = asyncio.Future()
+        future.set_result(response)
+        return future
+
+    def close(self):
+        self.closed = True
+        return asyncio.sleep(0)
+
+
+class AsyncTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_async(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+
+class TestAsyncSessions(AsyncTestCase):
+    def setUp(self):
+        super(TestAsyncSessions, self).setUp()
+
+        keypair = keychain.Keypair.from_secret_pem(key_bytes=TestSession.id_key_bytes)
+        keypair.identity = 'server'
+        self.credentials = keychain.Credentials(keypair.identity, keypair)
+        self.transport = MockAsyncTransport()
+
+        self.config = {
+            'GLOBAL': {
+                'base_url': 'https://myservice',
+            },
+            'test_service': {
+                'get_method': {
+                    'endpoint': '/my/endpoint',
+                    'method': 'GET',
+                    'arguments': {},
+                },
+                'post_method': {
+                    'endpoint': '/my/endpoint',
+                    'method': 'POST',
+                    'arguments': {
+                        'my_argument': {'location': 'jwt', 'required': True},
+                    },
+                },
+                'forbidden_method': {
+                    'endpoint': '/unauthorized',
+                    'method': 'GET',
+                    'arguments': {},
+                },
+            },
+        }
+
+    def test_server_session(self):
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport)
+
+        self.assertIsInstance(sess.test_service, aio.AsyncBaseService)
+        self.assertTrue(asyncio.iscoroutinefunction(type(sess.test_service).get_method))
+        self.assertEqual(self.run_async(sess.test_service.get_method()), 'tested')
+
+        http_method, url, headers, data = self.transport.requests[0]
+        self.assertEqual(url, 'https://myservice/my/endpoint')
+        self.assertTrue(jwts.verify_jwt(
+            headers['Authorization'].split(' ', 1)[1], self.credentials.keypair
+        ))
+
+    def test_admin_session(self):
+        sess = aio.AsyncAdminSession(self.credentials, config=self.config,
+                                     transport=self.transport)
+
+        response = self.run_async(sess.test_service.post_method(my_argument='hello'))
+        self.assertEqual(response, 'hello world')
+
+        http_method, url, headers, data = self.transport.requests[0]
+        self.assertEqual(http_method, 'POST')
+        self.assertEqual(
+            jwts.verify_jwt(data, self.credentials.keypair)['my_argument'], 'hello'
+        )
+
+    def test_default_config(self):
+        sess = aio.AsyncServerSession(self.credentials)
+        self.assertIsInstance(sess.transport, aio.AsyncHTTPTransport)
+        self.assertIsInstance(sess.authenticate, aio.AsyncBaseService)
+
+    def test_missing_arg(self):
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport)
+
+        with self.assertRaises(TypeError):
+            self.run_async(sess.test_service.post_method())
+
+    def test_body(self):
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport)
+
+        jwt = jwts.make_jwt({'my_argument': 'hi'}, self.credentials.keypair)
+        self.assertEqual(self.run_async(sess.test_service.post_method(body=jwt)), 'hello world')
+
+    def test_authentication_error(self):
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport)
+
+        with self.assertRaises(exceptions.InvalidAuthentication):
+            self.run_async(sess.test_service.forbidden_method())
+
+    def test_invalid_method(self):
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport)
+
+        with self.assertRaises(TypeError):
+            self.run_async(sess.make_http_request('UNKNOWN', 'https://myservice/my/endpoint'))
+
+    def test_signs_in_executor(self):
+        executor = futures.ThreadPoolExecutor(1)
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport, executor=executor)
+
+        with mock.patch.object(executor, 'submit', wraps=executor.submit) as mock_submit:
+            self.run_async(sess.test_service.post_method(my_argument='hello'))
+
+        # claims JWT and Authorization JWT
+        self.assertEqual(mock_submit.call_count, 2)
+        executor.shutdown()
+
+    def test_close(self):
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport)
+        self.run_async(sess.close())
+        self.assertTrue(self.transport.closed)
+
+    def test_no_cosign_batcher(self):
+        sess = aio.AsyncServerSession(self.credentials, config=self.config,
+                                      transport=self.transport)
+
+        with self.assertRaises(NotImplementedError):
+            sess.create_cosign_batcher()
+
+    def test_async_with(self):
+        async def use_session():
+            async with aio.AsyncServerSession(self.credentials, config=self.config,
+                                              transport=self.transport) as sess:
+                return sess
+
+        sess = self.run_async(use_session())
+        self.assertTrue(self.transport.closed)
+        self.assertIsNone(sess.auth_tokens)
+
+        with self.assertRaises(TypeError):
+            with sess:
+                pass
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status = 403 if self.path == '/unauthorized' else 200
+        body = b'ok'
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@unittest.skipIf(aio.aiohttp is None, 'requires aiohttp')
+class TestAsyncHTTPTransport(AsyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.url = 'http://127.0.0.1:{}/'.format(cls.server.server_port)
+
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_request(self):
+        transport = aio.AsyncHTTPTransport(max_concurrency=2)
+
+        try:
+            responses = self.run_async(asyncio.gather(*[
+                transport.request('GET', self.url) for _ in range(5)
+            ]))
+        finally:
+            self.run_async(transport.close())
+
+        self.assertEqual(responses, [aio.AsyncResponse(200, b'ok')] * 5)
+        self.assertIsNone(transport._client)
+
+    def test_close_unused(self):
+        transport = aio.AsyncHTTPTransport()
+        self.run_async(transport.close())
+        self.assertIsNone(transport._client)
+
+    def test_session_request(self):
+        keypair = keychain.Keypair.from_secret_pem(key_bytes=TestSession.id_key_bytes)
+        sess = aio.AsyncAdminSession(keychain.Credentials('admin', keypair))
+
+        try:
+            with self.assertRaises(exceptions.InvalidAuthentication):
+                self.run_async(sess.make_http_request('GET', self.url + 'unauthorized'))
+        finally:
+            self.run_async(sess.close())
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import sys
+
+# the tests use async syntax, which older Pythons can't even compile
+if sys.version_info >= (3, 5):
+    from .aio_cases import *  # noqa: F401,F403
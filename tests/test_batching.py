@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import time
+import threading
+import logging
+
+import unittest
+import mock
+
+from oneid import batching, session, keychain, jwts, exceptions
+
+from .test_session import TestSession, mock_request
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingMethod(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        time.sleep(self.delay)
+
+        with self._lock:
+            self.in_flight -= 1
+
+        if kwargs.get('fail'):
+            raise ValueError('failed')
+
+        return kwargs['value'] * 2
+
+
+class TestCosignBatcher(unittest.TestCase):
+    def test_submit(self):
+        method = RecordingMethod()
+        batcher = batching.CosignBatcher(method)
+
+        results = [batcher.submit(value=i) for i in range(100)]
+        self.assertEqual([future.result(5) for future in results], [i * 2 for i in range(100)])
+        batcher.close()
+
+        self.assertEqual(len(method.calls), 100)
+
+    def test_exception(self):
+        batcher = batching.CosignBatcher(RecordingMethod())
+
+        with self.assertRaises(ValueError):
+            batcher.submit(value=1, fail=True).result(5)
+
+        self.assertEqual(batcher.submit(value=1).result(5), 2)
+        batcher.close()
+
+    def test_max_concurrency(self):
+        method = RecordingMethod(delay=0.01)
+        batcher = batching.CosignBatcher(method, max_concurrency=3)
+
+        results = [batcher.submit(value=i) for i in range(20)]
+        [future.result(5) for future in results]
+        batcher.close()
+
+        self.assertLessEqual(method.max_in_flight, 3)
+        self.assertGreater(method.max_in_flight, 1)
+
+    def test_collects_batches(self):
+        batcher = batching.CosignBatcher(RecordingMethod(), max_size=4, max_delay=1)
+        batch_sizes = []
+        collect_batch = batcher._collect_batch
+
+        def record_batch():
+            batch, running = collect_batch()
+            batch_sizes.append(len(batch))
+            return batch, running
+
+        batcher._collect_batch = record_batch
+
+        results = [batcher.submit(value=i) for i in range(10)]
+        [future.result(5) for future in results[:8]]
+        batcher.close()
+
+        self.assertEqual(batch_sizes[:2], [4, 4])
+        self.assertEqual(sum(batch_sizes), 10)
+        self.assertEqual(results[9].result(5), 18)
+
+    def test_max_pending(self):
+        release = threading.Event()
+
+        def blocked(**kwargs):
+            release.wait(5)
+            return kwargs['value']
+
+        batcher = batching.CosignBatcher(blocked, max_pending=2)
+        results = [batcher.submit(value=i) for i in range(2)]
+
+        with self.assertRaises(exceptions.BatchFullError):
+            batcher.submit(timeout=0.01, value=3)
+
+        release.set()
+        self.assertEqual([future.result(5) for future in results], [0, 1])
+        self.assertEqual(batcher.submit(timeout=1, value=3).result(5), 3)
+        batcher.close()
+
+    def test_cancelled(self):
+        batcher = batching.CosignBatcher(RecordingMethod(), max_delay=1, max_pending=1)
+        future = batcher.submit(value=1)
+        self.assertTrue(future.cancel())
+
+        batcher.close()
+        self.assertTrue(batcher._pending.acquire(False))
+
+    def test_close(self):
+        batcher = batching.CosignBatcher(RecordingMethod(), max_delay=1)
+        future = batcher.submit(value=1)
+        batcher.close()
+
+        self.assertEqual(future.result(0), 2)
+
+        with self.assertRaises(RuntimeError):
+            batcher.submit(value=2)
+
+        # closing again, or before starting, is harmless
+        batcher.close()
+        batching.CosignBatcher(RecordingMethod()).close()
+
+    def test_close_while_submitting(self):
+        batcher = batching.CosignBatcher(RecordingMethod())
+        batcher.submit(value=1).result(5)
+        acquire_pending = batcher._acquire_pending
+
+        def close_then_acquire(timeout):
+            # close() runs between the checks in submit() and queueing the call
+            threading.Thread(target=batcher.close).start()
+            for _ in range(500):
+                if batcher._closed:
+                    break
+                time.sleep(0.01)
+            return acquire_pending(timeout)
+
+        batcher._acquire_pending = close_then_acquire
+
+        with self.assertRaises(RuntimeError):
+            batcher.submit(value=2)
+
+        self.assertTrue(batcher._pending.acquire(False))
+
+    def test_new_threads_after_fork(self):
+        batcher = batching.CosignBatcher(RecordingMethod())
+        batcher.submit(value=1).result(5)
+        collector = batcher._collector
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.assertEqual(batcher.submit(value=2).result(5), 4)
+
+        self.assertIsNot(batcher._collector, collector)
+        batcher.close()
+
+
+class TestServerSessionBatcher(unittest.TestCase):
+    def setUp(self):
+        keypair = keychain.Keypair.from_secret_pem(key_bytes=TestSession.id_key_bytes)
+        keypair.identity = 'server'
+        self.credentials = keychain.Credentials(keypair.identity, keypair)
+
+        self.config = {
+            'GLOBAL': {
+                'base_url': 'https://myservice',
+            },
+            'test_service': {
+                'test_method': {
+                    'endpoint': '/my/endpoint',
+                    'method': 'POST',
+                    'arguments': {
+                        'message': {'location': 'jwt', 'required': True},
+                    },
+                },
+            },
+        }
+
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
+    def test_create_cosign_batcher(self, mock_request):
+        sess = session.ServerSession(self.credentials, config=self.config)
+        batcher = sess.create_cosign_batcher('test_service', 'test_method', max_concurrency=4)
+
+        self.assertEqual(batcher.max_concurrency, 4)
+
+        results = [batcher.submit(message='hello {}'.format(i)) for i in range(10)]
+        self.assertEqual([future.result(5) for future in results], ['hello world'] * 10)
+        batcher.close()
+
+        messages = [
+            jwts.verify_jwt(call[1]['data'], self.credentials.keypair)['message']
+            for call in mock_request.call_args_list
+        ]
+        self.assertEqual(sorted(messages), sorted('hello {}'.format(i) for i in range(10)))
+
+    def test_default_cosign_batcher(self):
+        sess = session.ServerSession(self.credentials)
+        batcher = sess.create_cosign_batcher()
+
+        self.assertEqual(batcher.method, sess.authenticate.edge_device)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import sys
+import subprocess
+import logging
+
+import unittest
+
+import oneid
+
+logger = logging.getLogger(__name__)
+
+
+def loaded_modules(statement):
+    script = 'import sys\n{}\nprint(" ".join(sys.modules))\n'.format(statement)
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return set(output.decode('utf-8').split())
+
+
+class TestImports(unittest.TestCase):
+    def test_submodules(self):
+        for name in oneid.__all__:
+            self.assertEqual(getattr(oneid, name).__name__, 'oneid.' + name)
+            self.assertIn(name, dir(oneid))
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            oneid.not_a_module
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'submodules are imported eagerly before 3.7')
+    def test_lazy_submodules(self):
+        modules = loaded_modules('import oneid')
+        self.assertIn('oneid', modules)
+        self.assertNotIn('oneid.jwts', modules)
+
+        modules = loaded_modules('import oneid\noneid.jwts')
+        self.assertIn('oneid.jwts', modules)
+        self.assertNotIn('oneid.session', modules)
+
+    def test_verifying_doesnt_load_http(self):
+        modules = loaded_modules(
+            'from cryptography.hazmat.primitives.asymmetric import ec\n'
+            'from cryptography.hazmat.backends import default_backend\n'
+            'from oneid import jwts, keychain\n'
+            'keypair = keychain.Keypair(\n'
+            '    secret_bytes=ec.generate_private_key(ec.SECP256R1(), default_backend())\n'
+            ')\n'
+            'assert jwts.verify_jwt(jwts.make_jwt({}, keypair), keypair)\n'
+        )
+
+        self.assertIn('oneid.jwts', modules)
+        self.assertNotIn('requests', modules)
+        self.assertNotIn('yaml', modules)
+
+    def test_session_doesnt_load_http(self):
+        modules = loaded_modules('import oneid.session')
+
+        self.assertNotIn('requests', modules)
+        self.assertNotIn('yaml', modules)
+        self.assertNotIn('oneid.batching', modules)
+        self.assertNotIn('concurrent.futures', modules)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import sys
+import json
+import logging
+
+import unittest
+import mock
+
+from oneid import jsoncodecs, jwts, service, utils
+
+logger = logging.getLogger(__name__)
+
+
+class TestJSONCodecs(unittest.TestCase):
+    def setUp(self):
+        self.data = {'a': 1, 'b': ['hoôray!🎉', None, 1.5], 'c': {'d': '/'}}
+
+        patchers = [
+            mock.patch.object(jsoncodecs, '_default_codec', None),
+            mock.patch.object(jsoncodecs, 'JSON_CODEC', None),
+            mock.patch.dict(jsoncodecs._codecs),
+            mock.patch.dict(jsoncodecs._codec_loaders),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_default(self):
+        self.assertIn('json', jsoncodecs.available_json_codecs())
+
+        # faster codecs are opt-in, even when installed
+        with mock.patch.dict(sys.modules, {'orjson': mock.Mock()}):
+            self.assertEqual(jsoncodecs.get_json_codec().name, 'json')
+
+    def test_codecs(self):
+        for name in jsoncodecs.available_json_codecs():
+            codec = jsoncodecs.get_json_codec(name)
+            encoded = codec.encode(self.data)
+
+            self.assertEqual(codec.name, name)
+            self.assertIsInstance(encoded, type(''))
+            self.assertEqual(json.loads(encoded), self.data)
+            self.assertEqual(codec.decode(json.dumps(self.data)), self.data)
+
+            # compact
+            self.assertEqual(codec.encode({'a': [1, 2]}), '{"a":[1,2]}')
+
+            with self.assertRaises(ValueError):
+                codec.decode('{not json')
+
+    def test_not_installed(self):
+        def load():
+            raise ImportError
+
+        jsoncodecs._codec_loaders['missing'] = load
+        self.assertNotIn('missing', jsoncodecs.available_json_codecs())
+
+        with self.assertRaises(ValueError):
+            jsoncodecs.get_json_codec('missing')
+
+        with self.assertRaises(ValueError):
+            jsoncodecs.get_json_codec('unknown')
+
+        with mock.patch.object(jsoncodecs, 'JSON_CODEC', 'missing'):
+            with self.assertRaises(ValueError):
+                jsoncodecs.get_json_codec()
+
+    def test_set_default(self):
+        jsoncodecs.set_default_json_codec('json')
+        self.assertEqual(jsoncodecs.get_json_codec().name, 'json')
+
+        with self.assertRaises(ValueError):
+            jsoncodecs.set_default_json_codec('unknown')
+
+        jsoncodecs.register_json_codec('custom', json.dumps, json.loads)
+        jsoncodecs.set_default_json_codec('custom')
+        self.assertEqual(jsoncodecs.get_json_codec().name, 'custom')
+
+        jsoncodecs.set_default_json_codec()
+        self.assertEqual(jsoncodecs.get_json_codec().name, 'json')
+
+    def test_environment(self):
+        with mock.patch.object(jsoncodecs, 'JSON_CODEC', 'json'):
+            self.assertEqual(jsoncodecs.get_json_codec().name, 'json')
+
+    def test_register(self):
+        encode = mock.Mock(side_effect=json.dumps)
+        decode = mock.Mock(side_effect=json.loads)
+
+        jsoncodecs.register_json_codec('custom', encode, decode)
+        self.assertIn('custom', jsoncodecs.available_json_codecs())
+
+        jsoncodecs.set_default_json_codec('custom')
+        keypair = service.create_secret_key()
+        keypair.identity = 'custom'
+
+        self.assertEqual(jwts.verify_jws(jwts.make_jws({'a': 1}, keypair), keypair)['a'], 1)
+        self.assertTrue(encode.called)
+        self.assertTrue(decode.called)
+
+
+class TestCodecLoaders(unittest.TestCase):
+    # the optional libraries are mocked, so that each loader is tested whether installed or not
+    def setUp(self):
+        patcher = mock.patch.dict(jsoncodecs._codecs, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, name, module):
+        with mock.patch.dict(sys.modules, {name: module}):
+            return jsoncodecs.get_json_codec(name)
+
+    def test_orjson(self):
+        orjson = mock.Mock(OPT_NON_STR_KEYS=4)
+        orjson.dumps.return_value = b'{"1":"x"}'
+        codec = self.load('orjson', orjson)
+
+        self.assertEqual(codec.encode({1: 'x'}), '{"1":"x"}')
+        orjson.dumps.assert_called_once_with({1: 'x'}, option=4)
+        self.assertIs(codec.decode, orjson.loads)
+
+        orjson.dumps.side_effect = TypeError('Integer exceeds 64-bit range')
+        self.assertEqual(codec.encode({'big': 2**70}), '{"big":1180591620717411303424}')
+
+    def test_ujson(self):
+        ujson = mock.Mock()
+        codec = self.load('ujson', ujson)
+
+        self.assertIs(codec.encode({'a': '/'}), ujson.dumps.return_value)
+        ujson.dumps.assert_called_once_with({'a': '/'}, escape_forward_slashes=False)
+        self.assertIs(codec.decode, ujson.loads)
+
+    def test_simplejson(self):
+        simplejson = mock.Mock()
+        codec = self.load('simplejson', simplejson)
+
+        self.assertIs(codec.encode({'a': 1}), simplejson.dumps.return_value)
+        simplejson.dumps.assert_called_once_with({'a': 1}, separators=(',', ':'))
+        self.assertIs(codec.decode, simplejson.loads)
+
+    def test_not_installed(self):
+        for name in ['orjson', 'ujson', 'simplejson']:
+            with mock.patch.dict(sys.modules, {name: None}):
+                with self.assertRaises(ValueError):
+                    jsoncodecs.get_json_codec(name)
+
+
+class TestJWTCodecs(unittest.TestCase):
+    def setUp(self):
+        self.keypair = service.create_secret_key()
+        self.keypair.identity = 'codecs'
+
+    def test_interoperable(self):
+        codecs = [jsoncodecs.get_json_codec(name) for name in jsoncodecs.available_json_codecs()]
+
+        for encoder in codecs:
+            jwt = jwts.make_jwt({'a': 'hoôray!🎉'}, self.keypair, json_encoder=encoder.encode)
+            jws = jwts.make_jws({'a': 'hoôray!🎉'}, self.keypair, json_encoder=encoder.encode)
+            self.assertIsInstance(jws, type(''))
+
+            for decoder in codecs:
+                self.assertEqual(
+                    jwts.verify_jwt(jwt, self.keypair, json_decoder=decoder.decode)['a'],
+                    'hoôray!🎉',
+                )
+                self.assertEqual(
+                    jwts.verify_jws(jws, self.keypair, json_decoder=decoder.decode)['a'],
+                    'hoôray!🎉',
+                )
+
+    def test_default_accepts_json_claims(self):
+        for claims in [{1: 'x'}, {'big': 2**70}]:
+            jwt = jwts.make_jwt(claims, self.keypair)
+            self.assertTrue(jwts.verify_jwt(jwt, self.keypair))
+
+    def test_compact_tokens(self):
+        header, claims, _ = jwts.make_jwt({'a': [1, 2]}, self.keypair).split('.')
+
+        self.assertNotIn(b' ', utils.base64url_decode(header))
+        self.assertNotIn(b' ', utils.base64url_decode(claims))
+        self.assertNotIn(' ', jwts.make_jws({'a': [1, 2]}, self.keypair))
@@ -6,13 +6,17 @@ import time
 import base64
 import uuid
 import json
+import threading
 import logging
 
 from unittest import TestCase
+import mock
+
+from concurrent import futures
 
 # from nose.tools import nottest
 
-from oneid import service, keychain, jwts, utils, exceptions
+from oneid import service, keychain, jwts, nonces, utils, exceptions
 
 logger = logging.getLogger(__name__)
 
@@ -280,6 +284,28 @@ class TestJWTs(TestCase):
         with self.assertRaises(exceptions.InvalidClaimsError):
             jwts.verify_jwt(jwt, self.keypair)
 
+    def test_replayed_nonce(self):
+        store = nonces.MemoryNonceStore()
+        jwt = jwts.make_jwt({'message': 'hi'}, self.keypair)
+
+        self.assertTrue(jwts.verify_jwt(jwt, self.keypair, nonce_store=store))
+
+        with self.assertRaises(exceptions.InvalidClaimsError):
+            jwts.verify_jwt(jwt, self.keypair, nonce_store=store)
+
+    def test_forged_jwt_does_not_burn_nonce(self):
+        store = nonces.MemoryNonceStore()
+        jwt = jwts.make_jwt({'message': 'hi'}, self.keypair)
+        forged = jwts.make_jwt(
+            {'message': 'hi', 'jti': jwts.verify_jwt(jwt)['jti']},
+            service.create_secret_key(),
+        )
+
+        with self.assertRaises(exceptions.InvalidSignatureError):
+            jwts.verify_jwt(forged, self.keypair, nonce_store=store)
+
+        self.assertTrue(jwts.verify_jwt(jwt, self.keypair, nonce_store=store))
+
 
 class TestKnownJWTs(TestCase):
     def setUp(self):
@@ -365,6 +391,112 @@ class TestKnownJWTs(TestCase):
                 jwts.verify_jwt(token, self.keypair)
 
 
+class TestVerifyJWTs(TestCase):
+    def setUp(self):
+        self.keypairs = {}
+
+        for _ in range(2):
+            key = service.create_secret_key()
+            key.identity = str(uuid.uuid4())
+            self.keypairs[key.identity] = key
+
+        self.tokens = [
+            jwts.make_jwt({'message': msg}, keypair)
+            for keypair in self.keypairs.values()
+            for msg in MSGS[:3]
+        ]
+
+    def _verify_sunny_day(self, **kwargs):
+        results = jwts.verify_jwts(self.tokens, self.keypairs.get, **kwargs)
+
+        self.assertEqual(len(results), len(self.tokens))
+
+        for result, msg in zip(results, MSGS[:3] * 2):
+            self.assertIsNone(result.error)
+            self.assertEqual(result.claims['message'], msg)
+
+    def test_sunny_day(self):
+        self._verify_sunny_day()
+
+    def test_thread_backend(self):
+        self._verify_sunny_day(backend='thread', max_workers=2)
+
+    def test_process_backend(self):
+        self._verify_sunny_day(backend='process', max_workers=2)
+
+    @mock.patch('oneid.jwts.PROCESS_KEYPAIR_CACHE_SIZE', 1)
+    def test_process_keypair_cache_size(self):
+        chunk = [
+            (index, jwt, self.keypairs[jwts.verify_jwt(jwt)['iss']].public_key_der)
+            for index, jwt in enumerate(self.tokens)
+        ]
+
+        self.assertEqual(jwts._verify_jwt_signature_der_chunk(chunk),
+                         [(index, True) for index in range(len(self.tokens))])
+        self.assertEqual(list(jwts._process_keypairs), [chunk[-1][2]])
+
+    def test_executor_backend(self):
+        with futures.ThreadPoolExecutor(2) as executor:
+            self._verify_sunny_day(backend=executor)
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            jwts.verify_jwts(self.tokens, backend='fibers')
+
+    def test_no_resolver(self):
+        results = jwts.verify_jwts(self.tokens)
+
+        self.assertTrue(all(result.claims for result in results))
+        self.assertTrue(all(result.error is None for result in results))
+
+    def test_mixed_results(self):
+        other = service.create_secret_key()
+        other.identity = list(self.keypairs)[0]
+        forged = jwts.make_jwt({'message': 'forged'}, other)
+        unknown = service.create_secret_key()
+        unknown.identity = 'unknown'
+
+        tokens = [
+            self.tokens[0],
+            'not a jwt',
+            forged,
+            jwts.make_jwt({'message': 'unknown'}, unknown),
+            self.tokens[-1],
+        ]
+
+        results = jwts.verify_jwts(tokens, self.keypairs.get)
+
+        self.assertEqual(results[0].claims['message'], MSGS[0])
+        self.assertIsInstance(results[1].error, exceptions.InvalidFormatError)
+        self.assertIsInstance(results[2].error, exceptions.InvalidSignatureError)
+        self.assertIsInstance(results[3].error, exceptions.InvalidKeyError)
+        self.assertEqual(results[4].claims['message'], MSGS[2])
+
+        for result in results[1:4]:
+            self.assertIsNone(result.claims)
+
+    def test_replayed_in_batch(self):
+        store = nonces.MemoryNonceStore()
+        tokens = self.tokens[:2] + self.tokens[:1]
+
+        results = jwts.verify_jwts(tokens, self.keypairs.get, nonce_store=store)
+
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].error)
+        self.assertIsInstance(results[2].error, exceptions.InvalidClaimsError)
+
+    def test_resolver_called_once_per_kid(self):
+        lookups = []
+
+        def resolver(kid):
+            lookups.append(kid)
+            return self.keypairs.get(kid)
+
+        jwts.verify_jwts(self.tokens, resolver)
+
+        self.assertEqual(sorted(lookups), sorted(self.keypairs))
+
+
 class TestJWSs(TestCase):
     def setUp(self):
         self.keypairs = []
@@ -603,8 +735,454 @@ class TestJWSs(TestCase):
 
         jwts.verify_jws(jws, self.keypairs[1:3], verify_all=False)
 
+    def test_jws_verify_with_keyring(self):
+        keyring = keychain.Keyring()
+        for keypair in self.keypairs:
+            keyring.add(keypair.identity, keypair.public_key_der)
+
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+        self.assertEqual(jwts.verify_jws(jws, keypair_resolver=keyring.get)['a'], 1)
+
+        jwt = jwts.make_jwt({'a': 2}, self.keypairs[0])
+        self.assertEqual(jwts.verify_jws(jwt, keypair_resolver=keyring.get)['a'], 2)
+
+        impostor = service.create_secret_key()
+        impostor.identity = self.keypairs[0].identity
+        forged = jwts.make_jws({'a': 3}, [impostor])
+        with self.assertRaises(exceptions.InvalidSignatureError):
+            jwts.verify_jws(forged, keypair_resolver=keyring.get)
+
+    def test_jws_verify_with_keyring_keypairs(self):
+        keyring = keychain.Keyring()
+        for keypair in self.keypairs:
+            keyring.add(keypair.identity, keychain.Keypair.from_public_der(keypair.public_key_der))
+
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+        self.assertEqual(jwts.verify_jws(jws, keypair_resolver=keyring.get)['a'], 1)
+
+    def test_jws_verify_resolved_keypairs_matched_by_kid(self):
+        # resolved keypairs are matched by kid, whatever their own identities
+        resolved = {}
+        for keypair in self.keypairs:
+            resolved[keypair.identity] = keychain.Keypair.from_public_der(keypair.public_key_der)
+            resolved[keypair.identity].identity = 'shared'
+
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+        self.assertEqual(jwts.verify_jws(jws, keypair_resolver=resolved.get)['a'], 1)
+
+    def test_jws_verify_with_keyring_missing_keys(self):
+        keyring = keychain.Keyring()
+        keyring.add(self.keypairs[0].identity, self.keypairs[0])
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+
+        with self.assertRaises(exceptions.KeySignatureMismatch):
+            jwts.verify_jws(jws, keypair_resolver=keyring.get)
+
+        verified_msg = jwts.verify_jws(jws, verify_all=False, keypair_resolver=keyring.get)
+        self.assertEqual(verified_msg['a'], 1)
+
+        with self.assertRaises(exceptions.KeySignatureMismatch):
+            jwts.verify_jws(jws, verify_all=False, keypair_resolver=keychain.Keyring().get)
+
+    def test_jws_replayed_nonce(self):
+        store = nonces.MemoryNonceStore()
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+
+        self.assertTrue(jwts.verify_jws(jws, self.keypairs, nonce_store=store))
+
+        with self.assertRaises(exceptions.InvalidClaimsError):
+            jwts.verify_jws(jws, self.keypairs, nonce_store=store)
+
     def test_jws_verify_any_signature_is_ok(self):
         jws = jwts.make_jws({'a': 1}, self.keypairs[:1])
 
         verified_msg = jwts.verify_jws(jws, self.keypairs[:2], verify_all=False)
         self.assertIn("a", verified_msg)
+
+    def test_jws_verify_concurrently(self):
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+        executor = futures.ThreadPoolExecutor(2)
+
+        for backend in ('thread', executor):
+            timings = {}
+            verified_msg = jwts.verify_jws(jws, self.keypairs, backend=backend, timings=timings)
+
+            self.assertEqual(verified_msg['a'], 1)
+            self.assertEqual(set(timings), set(keypair.identity for keypair in self.keypairs))
+
+        jwts.verify_jws(jws, self.keypairs[1:], verify_all=False, backend=executor)
+        executor.shutdown()
+
+    def test_jws_verify_timings(self):
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+        timings = {}
+
+        jwts.verify_jws(jws, self.keypairs, timings=timings)
+
+        self.assertEqual(set(timings), set(keypair.identity for keypair in self.keypairs))
+        self.assertTrue(all(elapsed >= 0 for elapsed in timings.values()))
+
+    def test_jws_verify_concurrently_invalid(self):
+        impostor = service.create_secret_key()
+        impostor.identity = self.keypairs[0].identity
+        jws = jwts.make_jws({'a': 1}, [impostor] + self.keypairs[1:])
+
+        executor = futures.ThreadPoolExecutor(1)
+        release = threading.Event()
+        verified = []
+        time_jws_signature = jwts._time_jws_signature
+
+        def blocking(payload, keypair, signature):
+            verified.append(keypair.identity)
+            if keypair is not self.keypairs[0]:
+                release.wait(5)
+            return time_jws_signature(payload, keypair, signature)
+
+        timings = {}
+        with mock.patch('oneid.jwts._time_jws_signature', side_effect=blocking):
+            with self.assertRaises(exceptions.InvalidSignatureError):
+                jwts.verify_jws(jws, self.keypairs, backend=executor, timings=timings)
+
+            release.set()
+            executor.shutdown()
+
+        # the first failure is reported, and signatures not yet started are skipped
+        self.assertEqual(list(timings), [self.keypairs[0].identity])
+        self.assertNotIn(self.keypairs[2].identity, verified)
+
+        with self.assertRaises(exceptions.InvalidSignatureError):
+            jwts.verify_jws(jws, self.keypairs, backend='thread')
+
+    def test_jws_verify_invalid_backend(self):
+        jws = jwts.make_jws({'a': 1}, self.keypairs)
+
+        with self.assertRaises(ValueError):
+            jwts.verify_jws(jws, self.keypairs, backend='process')
+
+
+class TestParsedJWS(TestCase):
+    def setUp(self):
+        self.keypairs = []
+
+        for _ in range(3):
+            key = service.create_secret_key()
+            key.identity = str(uuid.uuid4())
+            self.keypairs.append(key)
+
+        self.kids = [keypair.identity for keypair in self.keypairs]
+
+    def test_decodes_headers_once(self):
+        parsed = jwts.ParsedJWS(jwts.make_jws({'a': 1}, self.keypairs))
+        self.assertIsNone(parsed.compact)
+
+        with mock.patch('oneid.jwts._verify_jose_header',
+                        wraps=jwts._verify_jose_header) as mock_header:
+            self.assertEqual(jwts.get_jws_key_ids(parsed), self.kids)
+            self.assertEqual(jwts.verify_jws(parsed, self.keypairs)['a'], 1)
+            self.assertEqual(jwts.verify_jws(parsed, keypair_resolver=dict(
+                (keypair.identity, keypair) for keypair in self.keypairs
+            ).get)['a'], 1)
+
+        self.assertEqual(mock_header.call_count, 3)
+
+    def test_compact(self):
+        jwt = jwts.make_jwt({'a': 1}, self.keypairs[0])
+        parsed = jwts.ParsedJWS(utils.to_bytes(jwt))
+
+        self.assertEqual(parsed.compact, jwt)
+        self.assertEqual(jwts.get_jws_key_ids(parsed), self.kids[:1])
+        self.assertEqual(jwts.verify_jws(parsed, self.keypairs[:1])['a'], 1)
+
+        jws = jwts.extend_jws_signatures(parsed, self.keypairs[1:])
+        self.assertEqual(jwts.verify_jws(jws, self.keypairs)['a'], 1)
+
+    def test_extend(self):
+        parsed = jwts.ParsedJWS(jwts.make_jws({'a': 1}, self.keypairs[:2]))
+        jws = jwts.extend_jws_signatures(parsed, self.keypairs[2:])
+
+        self.assertEqual(jwts.verify_jws(jws, self.keypairs)['a'], 1)
+
+        # the parsed JWS is left as it was
+        self.assertEqual(parsed.get_key_ids(), self.kids[:2])
+        self.assertEqual(jwts.verify_jws(parsed, self.keypairs[:2])['a'], 1)
+
+    def test_default_kid(self):
+        parsed = jwts.ParsedJWS(jwts.make_jwt({'a': 1}, service.create_secret_key()))
+
+        with self.assertRaises(exceptions.InvalidFormatError):
+            parsed.get_key_ids()
+
+        self.assertEqual(parsed.get_key_ids('default'), ['default'])
+
+    def test_invalid(self):
+        for jws in ('not a jws', '[]', '{"payload": "e30"}', '{"signatures": []}'):
+            with self.assertRaises(exceptions.InvalidFormatError):
+                jwts.ParsedJWS(jws)
+
+    def test_invalid_header(self):
+        jws = json.loads(jwts.make_jws({'a': 1}, self.keypairs[:1]))
+        jws['signatures'][0]['protected'] = utils.to_string(
+            utils.base64url_encode('{"typ": "JWT", "alg": "none"}')
+        )
+        parsed = jwts.ParsedJWS(json.dumps(jws))
+
+        for _ in range(2):
+            with self.assertRaises(exceptions.InvalidAlgorithmError):
+                parsed.get_key_ids()
+
+
+class TestVerificationStages(TestCase):
+    def setUp(self):
+        self.keypair = service.create_secret_key()
+        self.keypair.identity = str(uuid.uuid4())
+        self.impostor = service.create_secret_key()
+        self.impostor.identity = self.keypair.identity
+
+        jwts.reset_rejection_counts()
+
+    def assertRejectedAt(self, stage, count=1):
+        counts = jwts.get_rejection_counts()
+        self.assertEqual(counts.pop(stage), count)
+        self.assertEqual(set(counts.values()), {0})
+
+    def test_counts(self):
+        self.assertEqual(
+            jwts.get_rejection_counts(), {stage: 0 for stage in jwts.VERIFICATION_STAGES}
+        )
+
+        with self.assertRaises(exceptions.InvalidFormatError):
+            jwts.verify_jwt('not a jwt')
+
+        self.assertRejectedAt('structure')
+
+        jwts.reset_rejection_counts()
+        self.assertEqual(set(jwts.get_rejection_counts().values()), {0})
+
+    def test_size(self):
+        jwt = jwts.make_jwt({'a': 'b' * 100}, self.keypair)
+
+        with mock.patch('oneid.jwts.TOKEN_MAX_SIZE', 100):
+            with self.assertRaises(exceptions.InvalidFormatError):
+                jwts.verify_jwt(jwt, self.keypair)
+
+            with self.assertRaises(exceptions.InvalidFormatError):
+                jwts.verify_jws(jwts.make_jws({'a': 'b' * 100}, self.keypair), self.keypair)
+
+        self.assertRejectedAt('size', 2)
+
+    def test_header(self):
+        header = utils.to_string(utils.base64url_encode('{"typ": "JWT", "alg": "none"}'))
+        jwt = jwts.make_jwt({'a': 1}, self.keypair)
+        jwt = '.'.join([header] + jwt.split('.')[1:])
+
+        with self.assertRaises(exceptions.InvalidFormatError):
+            jwts.verify_jwt(jwt, self.keypair)
+
+        self.assertRejectedAt('header')
+
+    def test_junk_segments(self):
+        header, claims, signature = jwts.make_jwt({'a': 1}, self.keypair).split('.')
+
+        with self.assertRaises(exceptions.InvalidFormatError):
+            jwts.verify_jwt('.'.join([header, claims, 'a']), self.keypair)
+
+        self.assertRejectedAt('structure')
+        jwts.reset_rejection_counts()
+
+        with self.assertRaises(exceptions.InvalidFormatError):
+            jwts.verify_jwt('.'.join([header, 'a', signature]), self.keypair)
+
+        self.assertRejectedAt('claims')
+
+    def test_compact_jws_too_many_keypairs(self):
+        jwt = jwts.make_jwt({'a': 1}, self.keypair)
+
+        with self.assertRaises(exceptions.InvalidSignatureError):
+            jwts.verify_jws(jwt, [self.keypair, self.impostor])
+
+        self.assertRejectedAt('kid')
+
+    def test_expired_before_signature(self):
+        jwt = jwts.make_jwt({'exp': int(time.time()) - 60}, self.impostor)
+
+        with mock.patch.object(self.keypair, 'verify') as mock_verify:
+            with self.assertRaises(exceptions.InvalidClaimsError):
+                jwts.verify_jwt(jwt, self.keypair)
+
+        mock_verify.assert_not_called()
+        self.assertRejectedAt('claims')
+
+    def test_signature_before_nonce(self):
+        store = nonces.MemoryNonceStore()
+        jwt = jwts.make_jwt({'a': 1}, self.impostor)
+
+        with self.assertRaises(exceptions.InvalidSignatureError):
+            jwts.verify_jwt(jwt, self.keypair, nonce_store=store)
+
+        with self.assertRaises(exceptions.InvalidSignatureError):
+            jwts.verify_jwt(jwts.make_jwt({'jti': 'invalid'}, self.impostor), self.keypair)
+
+        self.assertRejectedAt('signature', 2)
+
+        # the forged message didn't use up the nonce
+        jwt = jwts.make_jwt({'jti': jwts.verify_jwt(jwt)['jti']}, self.keypair)
+        self.assertTrue(jwts.verify_jwt(jwt, self.keypair, nonce_store=store))
+
+        with self.assertRaises(exceptions.InvalidClaimsError):
+            jwts.verify_jwt(jwt, self.keypair, nonce_store=store)
+
+        with self.assertRaises(exceptions.InvalidClaimsError):
+            jwts.verify_jwt(jwts.make_jwt({'jti': 'invalid'}, self.keypair), self.keypair)
+
+        self.assertEqual(jwts.get_rejection_counts()['nonce'], 2)
+
+    def test_batch_unknown_kid_before_claims(self):
+        decoder = mock.Mock(side_effect=json.loads)
+        tokens = [jwts.make_jwt({'a': i}, self.keypair) for i in range(3)]
+
+        results = jwts.verify_jwts(tokens, {}.get, json_decoder=decoder)
+
+        self.assertTrue(all(isinstance(result.error, exceptions.InvalidKeyError)
+                            for result in results))
+        # only the (shared) header was decoded
+        self.assertEqual(decoder.call_count, 1)
+        self.assertRejectedAt('kid', 3)
+
+    def test_batch_stages(self):
+        store = nonces.MemoryNonceStore()
+        valid = jwts.make_jwt({'a': 1}, self.keypair)
+        tokens = [valid, valid, jwts.make_jwt({'a': 2}, self.impostor), 'junk']
+
+        results = jwts.verify_jwts(tokens, {self.keypair.identity: self.keypair}.get,
+                                   nonce_store=store)
+
+        self.assertEqual([result.claims and result.claims['a'] for result in results],
+                         [1, None, None, None])
+        self.assertEqual(
+            {stage: count for stage, count in jwts.get_rejection_counts().items() if count},
+            {'structure': 1, 'signature': 1, 'nonce': 1},
+        )
+
+    def test_jws_unknown_kid_before_claims(self):
+        decoder = mock.Mock(side_effect=json.loads)
+        jws = jwts.make_jws({'a': 1}, self.keypair)
+
+        with self.assertRaises(exceptions.KeySignatureMismatch):
+            jwts.verify_jws(jws, keypair_resolver={}.get, json_decoder=decoder)
+
+        # the JWS and its header, but not the claims
+        self.assertEqual(decoder.call_count, 2)
+        self.assertRejectedAt('kid')
+
+    def test_jws_junk_compact_header(self):
+        resolver = mock.Mock(return_value=self.keypair)
+        payload = jwts.make_jwt({'a': 1}, self.keypair).split('.', 1)[1]
+
+        for header in ['_w', utils.to_string(utils.base64url_encode(b'\xff\xfe')), 'e30']:
+            with self.assertRaises(exceptions.InvalidFormatError):
+                jwts.verify_jws('.'.join([header, 'junk', 'junk']), keypair_resolver=resolver)
+
+        with self.assertRaises(exceptions.InvalidFormatError):
+            jwts.verify_jws('.'.join(['e30', payload]), keypair_resolver=resolver)
+
+        resolver.assert_not_called()
+        self.assertRejectedAt('header', 4)
+
+    def test_jws_stages(self):
+        jws = jwts.make_jws({'a': 1}, self.keypair)
+        expired = jwts.make_jws({'exp': int(time.time()) - 60}, self.keypair)
+
+        with self.assertRaises(exceptions.InvalidFormatError):
+            jwts.verify_jws('{"payload": "e30"}', self.keypair)
+
+        with self.assertRaises(exceptions.KeySignatureMismatch):
+            jwts.verify_jws(jws, service.create_secret_key())
+
+        with self.assertRaises(exceptions.InvalidClaimsError):
+            jwts.verify_jws(expired, self.keypair)
+
+        with self.assertRaises(exceptions.InvalidSignatureError):
+            jwts.verify_jws(jws, self.impostor)
+
+        store = nonces.MemoryNonceStore()
+        jwts.verify_jws(jws, self.keypair, nonce_store=store)
+        with self.assertRaises(exceptions.InvalidClaimsError):
+            jwts.verify_jws(jws, self.keypair, nonce_store=store)
+
+        with self.assertRaises(exceptions.KeySignatureMismatch):
+            jwts.verify_jws(jwts.make_jwt({'a': 1}, self.keypair), keypair_resolver={}.get)
+
+        self.assertEqual(
+            {stage: count for stage, count in jwts.get_rejection_counts().items() if count},
+            {'structure': 1, 'kid': 2, 'claims': 1, 'signature': 1, 'nonce': 1},
+        )
+
+
+def make_keypairs(count):
+    """
+    Create keypairs for signing, each with a unique identity
+
+    :param count: number of keypairs to create
+    :return: list of :py:class:`~oneid.keychain.Keypair`
+    """
+    keypairs = []
+
+    for _ in range(count):
+        keypair = service.create_secret_key()
+        keypair.identity = str(uuid.uuid4())
+        keypairs.append(keypair)
+
+    return keypairs
+
+
+class TestHeaderCache(TestCase):
+    def setUp(self):
+        self.keypairs = make_keypairs(3)
+
+    def test_reuses_headers(self):
+        encoder = mock.Mock(side_effect=json.dumps)
+
+        jwts.make_jws({'a': 1}, self.keypairs, json_encoder=encoder)
+        self.assertEqual(encoder.call_count, 5)  # claims, three headers, JWS
+
+        encoder.reset_mock()
+        jws = jwts.make_jws({'a': 1}, self.keypairs, json_encoder=encoder)
+        jws = jwts.extend_jws_signatures(jws, self.keypairs[:1], json_encoder=encoder)
+        jwts.make_jwt({'a': 1}, self.keypairs[0], json_encoder=encoder)
+
+        self.assertEqual(encoder.call_count, 5)  # claims, JWS, JWS, JWT header, JWT claims
+
+        self.assertEqual(
+            jwts.get_jws_key_ids(jws), [kp.identity for kp in self.keypairs + self.keypairs[:1]]
+        )
+
+    def test_headers(self):
+        jwt = jwts.make_jwt({'a': 1}, self.keypairs[0])
+        self.assertEqual(
+            json.loads(utils.to_string(utils.base64url_decode(jwt.split('.')[0]))),
+            dict(jwts.MINIMAL_JWT_HEADER, kid=self.keypairs[0].identity),
+        )
+
+        keypair = service.create_secret_key()
+        jwt = jwts.make_jwt({'a': 1}, keypair)
+        self.assertEqual(
+            json.loads(utils.to_string(utils.base64url_decode(jwt.split('.')[0]))),
+            jwts.MINIMAL_JWT_HEADER,
+        )
+
+        jws = json.loads(jwts.make_jws({'a': 1}, self.keypairs[0]))
+        self.assertEqual(
+            json.loads(utils.to_string(
+                utils.base64url_decode(jws['signatures'][0]['protected'])
+            )),
+            dict(jwts.MINIMAL_JSON_JWS_HEADER, kid=self.keypairs[0].identity),
+        )
+
+    @mock.patch('oneid.jwts.HEADER_CACHE_SIZE', 2)
+    def test_cache_size(self):
+        jwts.make_jws({'a': 1}, self.keypairs)
+
+        self.assertEqual(len(jwts._header_cache), 2)
+        self.assertEqual(
+            [key[1] for key in jwts._header_cache], [kp.identity for kp in self.keypairs[1:]]
+        )
@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import io
 import os
+import time
 import tempfile
 import uuid
 import base64
+import hashlib
 import logging
 import unittest
+import mock
+import six
 
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.asymmetric.ec import EllipticCurvePublicKey
+from cryptography.hazmat.backends import default_backend
 
-from oneid import keychain, utils
+from oneid import keychain, service, utils
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +74,13 @@ class TestProjectCredentials(TestCredentials):
             )
             self.assertEqual(cleartext, utils.to_string(text))
 
+    def test_no_encryption_key(self):
+        credentials = keychain.ProjectCredentials(self.uuid, self.keypair, None)
+        self.assertEqual(credentials.id, self.uuid)
+
+        with self.assertRaises(TypeError):
+            credentials.encrypt(self.data)
+
     def test_decrypt_dict(self):
         enc = self.project_credentials.encrypt(self.data)
 
@@ -101,6 +116,200 @@ class TestProjectCredentials(TestCredentials):
             self.project_credentials.decrypt("aa", None)
 
 
+class TestAESGCMCipher(unittest.TestCase):
+    def setUp(self):
+        self.key = os.urandom(32)
+        self.data = 'hoôray!🎉'
+
+    def test_round_trip(self):
+        cipher = keychain.AESGCMCipher(self.key)
+        enc = cipher.encrypt(self.data)
+
+        self.assertEqual(set(enc), {'cipher', 'mode', 'ts', 'iv', 'ct'})
+        self.assertEqual(enc['ts'], 128)
+        self.assertEqual(
+            utils.to_string(cipher.decrypt(base64.b64decode(enc['iv']),
+                                           base64.b64decode(enc['ct']))),
+            self.data,
+        )
+
+    def test_fallback_interoperates(self):
+        cipher = keychain.AESGCMCipher(self.key)
+
+        with mock.patch('oneid.keychain.AESGCM', None):
+            fallback = keychain.AESGCMCipher(self.key)
+
+        self.assertIsNone(fallback._aead)
+
+        iv = os.urandom(16)
+        self.assertEqual(cipher.encrypt(self.data, iv), fallback.encrypt(self.data, iv))
+
+        enc = fallback.encrypt(self.data)
+        iv, tag_ct = base64.b64decode(enc['iv']), base64.b64decode(enc['ct'])
+        self.assertEqual(cipher.decrypt(iv, tag_ct), fallback.decrypt(iv, tag_ct))
+
+    def test_truncated_tag(self):
+        cipher = keychain.AESGCMCipher(self.key)
+        enc = cipher.encrypt(self.data)
+        iv, tag_ct = base64.b64decode(enc['iv']), base64.b64decode(enc['ct'])
+
+        self.assertEqual(utils.to_string(cipher.decrypt(iv, tag_ct[:-8], 8)), self.data)
+
+    def test_invalid_tag(self):
+        cipher = keychain.AESGCMCipher(self.key)
+        enc = cipher.encrypt(self.data)
+        iv, tag_ct = base64.b64decode(enc['iv']), base64.b64decode(enc['ct'])
+
+        with self.assertRaises(InvalidTag):
+            keychain.AESGCMCipher(os.urandom(32)).decrypt(iv, tag_ct)
+
+        with self.assertRaises(InvalidTag):
+            cipher.decrypt(iv, tag_ct[:-1] + b'\0', 15)
+
+
+class TestAESGCMStream(unittest.TestCase):
+    def setUp(self):
+        self.key = os.urandom(32)
+        self.stream = keychain.AESGCMStream(self.key, chunk_size=16)
+
+    def encrypt(self, data, stream=None):
+        out_file = io.BytesIO()
+        written = (stream or self.stream).encrypt(io.BytesIO(data), out_file)
+
+        self.assertEqual(written, len(out_file.getvalue()))
+        return out_file.getvalue()
+
+    def decrypt(self, data, stream=None):
+        out_file = io.BytesIO()
+        written = (stream or self.stream).decrypt(io.BytesIO(data), out_file)
+
+        self.assertEqual(written, len(out_file.getvalue()))
+        return out_file.getvalue()
+
+    def test_round_trip(self):
+        for size in (0, 1, 15, 16, 17, 32, 100):
+            data = os.urandom(size)
+            encrypted = self.encrypt(data)
+
+            # header, plus at least one frame with a tag for every 16 bytes
+            self.assertEqual(len(encrypted), 17 + max(1, -(-size // 16)) * 21 + size)
+            self.assertEqual(self.decrypt(encrypted), data)
+
+    def test_mmap(self):
+        data = os.urandom(100)
+
+        for size in (0, 100):
+            with tempfile.TemporaryFile() as in_file:
+                in_file.write(data[:size])
+                in_file.flush()
+
+                out_file = io.BytesIO()
+                self.stream.encrypt(in_file, out_file, use_mmap=True)
+
+            self.assertEqual(self.decrypt(out_file.getvalue()), data[:size])
+
+    def test_bounded_reads(self):
+        in_file = io.BytesIO(os.urandom(100))
+
+        with mock.patch.object(in_file, 'read', wraps=in_file.read) as mock_read:
+            self.stream.encrypt(in_file, io.BytesIO())
+
+        self.assertEqual(set(call[0] for call in mock_read.call_args_list), {(16,)})
+
+    def test_fallback_interoperates(self):
+        with mock.patch('oneid.keychain.AESGCM', None):
+            fallback = keychain.AESGCMStream(self.key, chunk_size=16)
+
+        data = os.urandom(40)
+        self.assertEqual(self.decrypt(self.encrypt(data, fallback)), data)
+        self.assertEqual(self.decrypt(self.encrypt(data), fallback), data)
+
+    def test_tampered(self):
+        encrypted = self.encrypt(os.urandom(40))
+        header, frames = encrypted[:17], encrypted[17:]
+        first, second, last = frames[:37], frames[37:74], frames[74:]
+
+        with self.assertRaises(InvalidTag):
+            self.decrypt(header + second + first + last)
+
+        with self.assertRaises(InvalidTag):
+            self.decrypt(header + first + last)
+
+        with self.assertRaises(InvalidTag):
+            self.decrypt(encrypted[:-1] + bytearray([encrypted[-1] ^ 1]))
+
+        with self.assertRaises(InvalidTag):
+            keychain.AESGCMStream(os.urandom(32)).decrypt(io.BytesIO(encrypted), io.BytesIO())
+
+    def test_oversized_chunk(self):
+        encrypted = self.encrypt(os.urandom(40))
+        frame = keychain._STREAM_FRAME.pack(False, 17)
+
+        with six.assertRaisesRegex(self, ValueError, 'chunk larger'):
+            self.decrypt(encrypted[:17] + frame + encrypted[17 + len(frame):])
+
+    def test_truncated(self):
+        encrypted = self.encrypt(os.urandom(40))
+
+        for size in (0, 10, 17, 17 + 37, len(encrypted) - 1):
+            with self.assertRaises(ValueError):
+                self.decrypt(encrypted[:size])
+
+        with self.assertRaises(ValueError):
+            self.decrypt(encrypted + b'x')
+
+    def test_invalid_header(self):
+        encrypted = self.encrypt(b'hello')
+
+        with self.assertRaises(ValueError):
+            self.decrypt(b'XXXX' + encrypted[4:])
+
+        with self.assertRaises(ValueError):
+            self.decrypt(encrypted[:4] + b'\x02' + encrypted[5:])
+
+        with self.assertRaises(ValueError):
+            self.decrypt(encrypted[:5] + b'\xff\xff\xff\xff' + encrypted[9:])
+
+    def test_chunk_size(self):
+        with self.assertRaises(ValueError):
+            keychain.AESGCMStream(self.key, chunk_size=0)
+
+        with self.assertRaises(ValueError):
+            keychain.AESGCMStream(self.key, chunk_size=keychain.STREAM_MAX_CHUNK_SIZE + 1)
+
+        # the decryptor uses the chunk size recorded in the stream
+        data = os.urandom(100)
+        self.assertEqual(self.decrypt(self.encrypt(data), keychain.AESGCMStream(self.key)), data)
+
+    @mock.patch('oneid.keychain.STREAM_MAX_CHUNKS', 2)
+    def test_max_chunks(self):
+        encrypted = self.encrypt(os.urandom(32))
+        self.assertEqual(len(self.decrypt(encrypted)), 32)
+
+        with self.assertRaises(ValueError):
+            self.encrypt(os.urandom(33))
+
+        with mock.patch('oneid.keychain.STREAM_MAX_CHUNKS', 3):
+            encrypted = self.encrypt(os.urandom(33))
+
+        with self.assertRaises(ValueError):
+            self.decrypt(encrypted)
+
+    def test_project_credentials(self):
+        credentials = keychain.ProjectCredentials(
+            'proj', service.create_secret_key(), self.key,
+        )
+        data = os.urandom(100)
+
+        encrypted = io.BytesIO()
+        credentials.encrypt_stream(io.BytesIO(data), encrypted, chunk_size=16)
+        self.assertEqual(self.decrypt(encrypted.getvalue()), data)
+
+        decrypted = io.BytesIO()
+        credentials.decrypt_stream(io.BytesIO(encrypted.getvalue()), decrypted)
+        self.assertEqual(decrypted.getvalue(), data)
+
+
 class TestKeypair(unittest.TestCase):
     BASE_PATH = os.path.dirname(__file__)
     x509_PATH = os.path.join(BASE_PATH, 'x509')
@@ -185,6 +394,20 @@ class TestKeypair(unittest.TestCase):
             signature = token.sign(b'MESSAGE')
             self.assertTrue(token.verify(b"MESSAGE", signature))
 
+    def test_verify_malformed_signature(self):
+        pem_path = os.path.join(self.x509_PATH, 'ec_sha256.pem')
+        token = keychain.Keypair.from_secret_pem(path=pem_path)
+
+        with self.assertRaises(InvalidSignature):
+            token.verify(b'MESSAGE', utils.base64url_encode(b'\x01\x02\x03'))
+
+    def test_int2bytes(self):
+        self.assertEqual(keychain.int2bytes(0), b'\x00')
+        self.assertEqual(keychain.int2bytes(0x1234), b'\x12\x34')
+        self.assertEqual(keychain.int2bytes(0x1234, 4), b'\x00\x00\x12\x34')
+        self.assertEqual(keychain.int2bytes(0x123456, 2), b'\x12\x34\x56')
+        self.assertEqual(keychain.unpack_bytes(b'\x12\x34'), 0x1234)
+
     def test_public_key(self):
         pem_path = os.path.join(self.x509_PATH, 'ec_public_key.pem')
         pubkeypair = keychain.Keypair.from_public_pem(path=pem_path)
@@ -212,3 +435,167 @@ class TestKeypair(unittest.TestCase):
             pem = f.read()
             keypair = keychain.Keypair.from_public_pem(pem)
             self.assertEqual(keypair.public_key_pem, pem)
+
+    def test_public_key_cached(self):
+        pem_path = os.path.join(self.x509_PATH, 'ec_sha256.pem')
+        keypair = keychain.Keypair.from_secret_pem(path=pem_path)
+
+        self.assertIs(keypair.public_key, keypair.public_key)
+        self.assertIs(keypair.public_key_der, keypair.public_key_der)
+        self.assertIs(keypair.public_key_pem, keypair.public_key_pem)
+        self.assertIs(keypair.thumbprint, keypair.thumbprint)
+
+    def test_thumbprint(self):
+        pem_path = os.path.join(self.x509_PATH, 'ec_public_key.pem')
+        keypair = keychain.Keypair.from_public_pem(path=pem_path)
+
+        self.assertEqual(keypair.thumbprint, '4-fJay8H_HAfmamEW0XXhtF9oGvtmk5SUu1g8d8CDDM')
+
+        public_keypair = keychain.Keypair.from_public_der(keypair.public_key_der)
+        self.assertEqual(public_keypair.thumbprint, keypair.thumbprint)
+
+    def test_thumbprint_matches_secret_key(self):
+        pem_path = os.path.join(self.x509_PATH, 'ec_sha256.pem')
+        keypair = keychain.Keypair.from_secret_pem(path=pem_path)
+        public_keypair = keychain.Keypair.from_public_der(keypair.public_key_der)
+
+        self.assertEqual(public_keypair.thumbprint, keypair.thumbprint)
+        self.assertNotEqual(keypair.thumbprint, service.create_secret_key().thumbprint)
+
+    def test_thumbprint_unsupported_curve(self):
+        keypair = keychain.Keypair(
+            secret_bytes=ec.generate_private_key(ec.SECP256K1(), default_backend())
+        )
+
+        with self.assertRaises(ValueError):
+            keypair.thumbprint
+
+    def test_sign_verify_chunks(self):
+        keypair = service.create_secret_key()
+        chunks = ['header', '.', b'payload' * 1000]
+        payload = b''.join(utils.to_bytes(chunk) for chunk in chunks)
+
+        self.assertTrue(keypair.verify(payload, keypair.sign_chunks(chunks)))
+        self.assertTrue(keypair.verify_chunks(chunks, keypair.sign(payload)))
+
+        with self.assertRaises(InvalidSignature):
+            keypair.verify_chunks(chunks[:-1], keypair.sign(payload))
+
+    def test_base_keypair_chunks(self):
+        class JoiningKeypair(keychain.BaseKeypair):
+            def __init__(self):
+                self.wrapped = service.create_secret_key()
+
+            def sign(self, payload):
+                return self.wrapped.sign(payload)
+
+            def verify(self, payload, signature):
+                return self.wrapped.verify(payload, signature)
+
+        keypair = JoiningKeypair()
+        signature = keypair.sign_chunks(['header', '.', b'payload'])
+        self.assertTrue(keypair.wrapped.verify('header.payload', signature))
+        self.assertTrue(keypair.verify_chunks([b'header', '.', 'payload'], signature))
+
+    @unittest.skipIf(keychain.Prehashed is None, 'requires cryptography>=1.6')
+    def test_sign_verify_digest(self):
+        keypair = service.create_secret_key()
+        payload = b'payload' * 1000
+        digest = hashlib.sha256(payload).digest()
+
+        self.assertTrue(keypair.verify(payload, keypair.sign_digest(digest)))
+        self.assertTrue(keypair.verify_digest(digest, keypair.sign(payload)))
+
+        with self.assertRaises(InvalidSignature):
+            keypair.verify_digest(hashlib.sha256(b'other').digest(), keypair.sign(payload))
+
+
+class TestKeyring(unittest.TestCase):
+    BASE_PATH = os.path.dirname(__file__)
+    x509_PATH = os.path.join(BASE_PATH, 'x509')
+
+    def setUp(self):
+        self.keypair = keychain.Keypair.from_secret_pem(
+            path=os.path.join(self.x509_PATH, 'ec_sha256.pem')
+        )
+        self.keypair.identity = 'me'
+        self.keyring = keychain.Keyring(max_size=2)
+
+    def test_add_get(self):
+        self.keyring.add('me', self.keypair)
+
+        self.assertIs(self.keyring.get('me'), self.keypair)
+        self.assertIs(self.keyring['me'], self.keypair)
+        self.assertIn('me', self.keyring)
+        self.assertEqual(len(self.keyring), 1)
+
+    def test_missing(self):
+        self.assertIsNone(self.keyring.get('nobody'))
+        self.assertEqual(self.keyring.get('nobody', 'default'), 'default')
+        self.assertNotIn('nobody', self.keyring)
+
+        with self.assertRaises(KeyError):
+            self.keyring['nobody']
+
+    def test_add_public_key_bytes(self):
+        pem = self.keyring.add('pem', self.keypair.public_key_pem)
+        der = self.keyring.add('der', self.keypair.public_key_der)
+
+        for identity, keypair in [('pem', pem), ('der', der)]:
+            self.assertIsInstance(keypair, keychain.Keypair)
+            self.assertEqual(keypair.identity, identity)
+            self.assertEqual(keypair.public_key_der, self.keypair.public_key_der)
+
+    def test_add_sets_missing_identity(self):
+        keypair = keychain.Keypair.from_public_der(self.keypair.public_key_der)
+
+        self.assertIs(self.keyring.add('them', keypair), keypair)
+        self.assertEqual(keypair.identity, 'them')
+
+        # keypairs that already have an identity are left alone
+        self.keyring.add('other', self.keypair)
+        self.assertEqual(self.keypair.identity, 'me')
+
+    def test_least_recently_used(self):
+        self.keyring.add('a', self.keypair)
+        self.keyring.add('b', self.keypair)
+        self.keyring.get('a')
+        self.keyring.add('c', self.keypair)
+
+        self.assertIn('a', self.keyring)
+        self.assertNotIn('b', self.keyring)
+        self.assertIn('c', self.keyring)
+        self.assertEqual(len(self.keyring), 2)
+
+    def test_ttl(self):
+        keyring = keychain.Keyring(ttl=10)
+        now = time.time()
+
+        with mock.patch('time.time', return_value=now):
+            keyring.add('me', self.keypair)
+            self.assertIn('me', keyring)
+
+        with mock.patch('time.time', return_value=now + 11):
+            self.assertNotIn('me', keyring)
+            self.assertEqual(len(keyring), 0)
+
+    def test_remove(self):
+        self.keyring.add('me', self.keypair)
+        self.keyring.remove('me')
+        self.keyring.remove('me')
+
+        self.assertNotIn('me', self.keyring)
+
+    def test_loader(self):
+        loaded = []
+
+        def loader(identity):
+            loaded.append(identity)
+            return self.keypair.public_key_der if identity == 'me' else None
+
+        keyring = keychain.Keyring(loader=loader)
+
+        self.assertEqual(keyring.get('me').public_key_der, self.keypair.public_key_der)
+        self.assertEqual(keyring.get('me').public_key_der, self.keypair.public_key_der)
+        self.assertIsNone(keyring.get('nobody'))
+        self.assertEqual(loaded, ['me', 'nobody'])
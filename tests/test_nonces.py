@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import logging
+
+import unittest
+import mock
+
+from oneid import nonces, utils
+
+logger = logging.getLogger(__name__)
+
+
+class TestBaseNonceStore(unittest.TestCase):
+    def test_burn(self):
+        store = nonces.BaseNonceStore()
+        with self.assertRaises(NotImplementedError):
+            store.burn(utils.make_nonce(), time.time())
+
+
+class TestMemoryNonceStore(unittest.TestCase):
+    def setUp(self):
+        self.store = nonces.MemoryNonceStore()
+
+    def test_burn_once(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('nonce', now))
+        self.assertFalse(self.store.burn('nonce', now))
+        self.assertTrue(self.store.burn('other', now))
+        self.assertEqual(len(self.store), 2)
+
+    def test_burn_expired(self):
+        then = int(time.time()) - nonces.NONCE_LIFETIME_SEC - nonces.NONCE_BUCKET_SEC
+        self.assertFalse(self.store.burn('nonce', then))
+
+    def test_evict_expired_buckets(self):
+        now = int(time.time())
+        self.store.burn('old', now - nonces.NONCE_LIFETIME_SEC + 1)
+        self.store.burn('new', now)
+        self.assertEqual(len(self.store), 2)
+
+        later = now + 2 * nonces.NONCE_BUCKET_SEC
+        with mock.patch('time.time', return_value=later):
+            self.store.burn('newer', later)
+        self.assertEqual(len(self.store), 2)
+
+    def test_evict_after_long_gap(self):
+        now = int(time.time())
+        for i in range(3):
+            self.store.burn('nonce-{}'.format(i), now - i * nonces.NONCE_BUCKET_SEC)
+
+        later = now + 10 * nonces.NONCE_LIFETIME_SEC
+        with mock.patch('time.time', return_value=later):
+            self.assertTrue(self.store.burn('nonce-0', later))
+        self.assertEqual(len(self.store), 1)
+
+    def test_verify_and_burn_nonce(self):
+        nonce = utils.make_nonce()
+        self.assertTrue(utils.verify_and_burn_nonce(nonce, self.store))
+        self.assertFalse(utils.verify_and_burn_nonce(nonce, self.store))
+        self.assertFalse(utils.verify_and_burn_nonce('bogus', self.store))
+
+
+class TestSharedMemoryNonceStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'nonces')
+        self.store = nonces.SharedMemoryNonceStore(self.path, capacity=64)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_burn_once(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('nonce', now))
+        self.assertFalse(self.store.burn('nonce', now))
+        self.assertTrue(self.store.burn('other', now))
+
+    def test_burn_expired(self):
+        then = int(time.time()) - nonces.NONCE_LIFETIME_SEC
+        self.assertFalse(self.store.burn('nonce', then))
+
+    def test_shared_between_instances(self):
+        now = int(time.time())
+        other = nonces.SharedMemoryNonceStore(self.path, capacity=64)
+
+        try:
+            self.assertTrue(self.store.burn('nonce', now))
+            self.assertFalse(other.burn('nonce', now))
+        finally:
+            other.close()
+
+    def test_shared_between_processes(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('parent', now))
+
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            ok = not self.store.burn('parent', now) and self.store.burn('child', now)
+            os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertFalse(self.store.burn('child', now))
+
+    def test_reopen_after_fork(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('parent', now))
+        table = self.store._table
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.assertFalse(self.store.burn('parent', now))
+            self.assertTrue(self.store.burn('child', now))
+
+        self.assertIsNot(self.store._table, table)
+
+    def test_reuse_expired_slots(self):
+        now = int(time.time())
+        store = nonces.SharedMemoryNonceStore(
+            os.path.join(self.tempdir, 'tiny'), capacity=2, lifetime=10,
+        )
+
+        try:
+            self.assertTrue(store.burn('a', now - 5))
+            self.assertTrue(store.burn('b', now))
+            self.assertFalse(store.burn('c', now))
+
+            with mock.patch('time.time', return_value=now + 6):
+                self.assertTrue(store.burn('c', now))
+                self.assertFalse(store.burn('b', now))
+        finally:
+            store.close()
+
+    def test_mismatched_capacity(self):
+        with self.assertRaises(ValueError):
+            nonces.SharedMemoryNonceStore(self.path, capacity=32)
+
+    def test_close_twice(self):
+        self.store.close()
+        self.store.close()
+
+
+class TestSQLiteNonceStore(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'nonces.db')
+        self.store = nonces.SQLiteNonceStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tempdir)
+
+    def _count_rows(self):
+        db = sqlite3.connect(self.path)
+        try:
+            return db.execute('SELECT COUNT(*) FROM nonces').fetchone()[0]
+        finally:
+            db.close()
+
+    def test_burn_once(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('nonce', now))
+        self.assertFalse(self.store.burn('nonce', now))
+
+        self.store.flush()
+        self.assertFalse(self.store.burn('nonce', now))
+        self.assertTrue(self.store.burn('other', now))
+
+    def test_burn_expired(self):
+        then = int(time.time()) - nonces.NONCE_LIFETIME_SEC
+        self.assertFalse(self.store.burn('nonce', then))
+
+    def test_survives_restart(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('nonce', now))
+        self.store.close()
+        self.store.close()
+
+        self.store = nonces.SQLiteNonceStore(self.path)
+        self.assertFalse(self.store.burn('nonce', now))
+
+    def test_group_commit(self):
+        now = int(time.time())
+        for i in range(10):
+            self.store.burn('nonce-{}'.format(i), now)
+
+        deadline = time.time() + 5
+        while self._count_rows() < 10 and time.time() < deadline:
+            time.sleep(nonces.SQLITE_COMMIT_INTERVAL_SEC)
+
+        self.assertEqual(self._count_rows(), 10)
+
+    def test_prune(self):
+        now = int(time.time())
+        self.store.close()
+        self.store = nonces.SQLiteNonceStore(self.path, lifetime=10, prune_interval=0)
+
+        self.store.burn('old', now - 5)
+        self.store.burn('new', now)
+        self.store.flush()
+        self.assertEqual(self._count_rows(), 2)
+
+        with mock.patch('time.time', return_value=now + 6):
+            self.store.flush()
+        self.assertEqual(self._count_rows(), 1)
+
+    def test_after_fork(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('parent', now))
+        self.store.flush()
+
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            ok = not self.store.burn('parent', now) and self.store.burn('child', now)
+            self.store.close()
+            os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertFalse(self.store.burn('child', now))
+
+    def test_reopen_after_fork(self):
+        now = int(time.time())
+        self.assertTrue(self.store.burn('parent', now))
+        self.store.flush()
+        self.assertTrue(self.store.burn('unflushed', now))
+        db = self.store._db
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.assertFalse(self.store.burn('parent', now))
+            self.assertTrue(self.store.burn('child', now))
+
+        # the parent's connection and pending nonces aren't used by the child
+        self.assertIsNot(self.store._db, db)
+        self.assertNotIn('unflushed', self.store._pending)
+        db.close()
+
+    def test_rollback(self):
+        now = int(time.time())
+        db = self.store._db
+        self.store._pending['nonce'] = now
+
+        failing_db = mock.Mock(wraps=db)
+        failing_db.executemany.side_effect = sqlite3.OperationalError('disk I/O error')
+        self.store._db = failing_db
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.store.flush()
+
+        failing_db.execute.assert_called_with('ROLLBACK')
+        self.assertIn('nonce', self.store._pending)
+
+        self.store._db = db
+        self.store.flush()
+        self.assertEqual(self._count_rows(), 1)
@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import os
+import types
 import tempfile
+import threading
 import logging
 
 import unittest
 import mock
 
+from concurrent import futures
+
 from oneid import service, session, keychain, utils
 
 # TODO: this is starting to look like a fixture
@@ -51,6 +56,18 @@ class TestServiceCreator(unittest.TestCase):
         self.assertEqual(self.service.__class__.__name__, "svc")
         self.assertTrue(hasattr(self.service, "test_method"))
 
+    def test_created_url_templates(self):
+        self.model['test_method']['endpoint'] = '/projects/{project_id}/devices/{in_url}'
+        methods = self.service_creator._create_methods(self.model, base_url='https://myservice')
+
+        with mock.patch.object(service.BaseService, '_make_api_request') as mock_request:
+            methods['test_method'](self.service, in_jwt='a', in_url='b')
+
+        template = mock_request.call_args[0][0]
+        self.assertIsInstance(template, service.UrlTemplate)
+        self.assertEqual(str(template), 'https://myservice/projects/{project_id}/devices/{in_url}')
+        self.assertEqual(template.fields, ('project_id', 'in_url'))
+
     def test_service_class_with_project_creds(self):
         mock_proj_keypair = keychain.Keypair.from_secret_pem(
             key_bytes=TestSession.proj_key_bytes
@@ -65,19 +82,19 @@ class TestServiceCreator(unittest.TestCase):
         self.assertEqual(svc.__class__.__name__, "svc")
         self.assertTrue(hasattr(svc, "test_method"))
 
-    @mock.patch('oneid.session.request', side_effect=mock_request)
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
     def test_call_created_method(self, mock_request):
         test_method = self.service.test_method(in_jwt="a",
                                                in_url="b",
                                                optional=None)
         self.assertEqual(test_method, "tested")
 
-    @mock.patch('oneid.session.request', side_effect=mock_request)
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
     def test_call_created_method_missing_args(self, mock_request):
         with self.assertRaises(TypeError):
             self.service.test_method()
 
-    @mock.patch('oneid.session.request', side_effect=mock_request)
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
     def test_call_created_method_with_body(self, mock_request):
         test_method = self.service.test_method(body="hello")
         self.assertEqual(test_method, "tested")
@@ -108,6 +125,33 @@ class TestBaseService(unittest.TestCase):
         url = '/{test_unknown}/end_test'
         self.assertRaises(TypeError, self.service._format_url, url)
 
+    def test_form_url_template(self):
+        template = service.UrlTemplate(
+            'https://myservice/projects/{project_id}/cosign/{identity}{suffix}'
+        )
+        self.assertEqual(template.fields, ('project_id', 'identity', 'suffix'))
+
+        self.service.project_id = 'proj'
+        self.service.suffix = '/'
+        self.assertEqual(
+            self.service._format_url(template, identity='dev'),
+            'https://myservice/projects/proj/cosign/dev/',
+        )
+        self.assertEqual(
+            self.service._format_url(template, identity='dev', project_id='other', suffix=''),
+            'https://myservice/projects/other/cosign/dev',
+        )
+
+        del self.service.suffix
+        with self.assertRaises(TypeError):
+            self.service._format_url(template, identity='dev')
+
+    def test_form_url_template_literals(self):
+        template = service.UrlTemplate('/{a}/{not-a-field}')
+        self.assertEqual(template.fields, ('a',))
+        self.assertEqual(str(template), '/{a}/{not-a-field}')
+        self.assertEqual(self.service._format_url(template, a=1), '/1/{not-a-field}')
+
     def test_string_encryption(self):
         key = service.create_aes_key()
         data = 'Hello, Im Data'
@@ -187,3 +231,134 @@ class TestEncryptDecryptAttributes(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             service.decrypt_attr_value(enc, self.key)
+
+    def test_no_cipher_cache(self):
+        # keys aren't kept for the life of the process
+        with mock.patch('oneid.service.AESGCMCipher', wraps=keychain.AESGCMCipher) as mock_cipher:
+            enc = service.encrypt_attr_value(self.data, self.key)
+            service.decrypt_attr_value(enc, self.key)
+
+        self.assertEqual(mock_cipher.call_count, 2)
+
+
+class TestEncryptDecryptAttributeBatches(unittest.TestCase):
+    def setUp(self):
+        self.key = service.create_aes_key()
+        self.data = ['hoôray!🎉 {}'.format(i) for i in range(20)]
+
+    def test_round_trip(self):
+        encrypted = service.encrypt_attr_values(self.data, self.key)
+        self.assertIsInstance(encrypted, types.GeneratorType)
+
+        encrypted = list(encrypted)
+        self.assertEqual(len(set(enc['iv'] for enc in encrypted)), len(self.data))
+
+        self.assertEqual(
+            [utils.to_string(value) for value in service.decrypt_attr_values(encrypted, self.key)],
+            self.data,
+        )
+        self.assertEqual(
+            [utils.to_string(service.decrypt_attr_value(enc, self.key)) for enc in encrypted],
+            self.data,
+        )
+
+    def test_dict(self):
+        data = {'attr{}'.format(i): value for i, value in enumerate(self.data)}
+        encrypted = dict(service.encrypt_attr_values(data, self.key))
+
+        self.assertEqual(set(encrypted), set(data))
+        self.assertEqual(
+            {name: utils.to_string(value)
+             for name, value in service.decrypt_attr_values(encrypted, self.key)},
+            data,
+        )
+
+    @mock.patch('oneid.service.ATTR_BATCH_CHUNK_SIZE', 3)
+    def test_bulk_ivs(self):
+        with mock.patch('os.urandom', wraps=os.urandom) as mock_urandom:
+            list(service.encrypt_attr_values(self.data, self.key))
+
+        self.assertEqual(mock_urandom.call_count, 7)
+        self.assertEqual(mock_urandom.call_args_list[0], mock.call(48))
+
+    @mock.patch('oneid.service.ATTR_BATCH_CHUNK_SIZE', 3)
+    def test_backends(self):
+        executor = futures.ThreadPoolExecutor(2)
+
+        for backend in ('thread', 'process', executor):
+            encrypted = list(service.encrypt_attr_values(
+                iter(self.data), self.key, backend=backend, max_workers=2,
+            ))
+            self.assertEqual(
+                [utils.to_string(value) for value in service.decrypt_attr_values(
+                    encrypted, self.key, backend=backend, max_workers=2,
+                )],
+                self.data,
+            )
+
+        executor.shutdown()
+
+    def test_lazy(self):
+        def values():
+            for value in self.data:
+                consumed.append(value)
+                yield value
+
+        consumed = []
+        with mock.patch('oneid.service.ATTR_BATCH_CHUNK_SIZE', 3):
+            encrypted = service.encrypt_attr_values(values(), self.key)
+            next(encrypted)
+
+        self.assertEqual(consumed, self.data[:3])
+        encrypted.close()
+
+    @mock.patch('oneid.service.ATTR_BATCH_CHUNK_SIZE', 1)
+    def test_close_early(self):
+        release = threading.Event()
+        encrypt_chunk = service._encrypt_attr_chunk
+        chunks = []
+
+        def slow_chunk(attr_values, aes_key):
+            chunks.append(attr_values)
+            if len(chunks) > 1:
+                release.wait(5)
+            return encrypt_chunk(attr_values, aes_key)
+
+        executor = futures.ThreadPoolExecutor(1)
+
+        with mock.patch('oneid.service._encrypt_attr_chunk', slow_chunk):
+            encrypted = service.encrypt_attr_values(
+                self.data, self.key, backend=executor, max_workers=1,
+            )
+            next(encrypted)
+            encrypted.close()
+
+        release.set()
+        executor.shutdown()
+
+        # chunks still queued behind the running one were cancelled
+        self.assertEqual(chunks[:1], [self.data[:1]])
+        self.assertLessEqual(len(chunks), 2)
+
+    def test_decrypts_chunk_with_one_cipher(self):
+        encrypted = list(service.encrypt_attr_values(self.data, self.key))
+
+        with mock.patch('oneid.service.AESGCMCipher', wraps=keychain.AESGCMCipher) as mock_cipher:
+            list(service.decrypt_attr_values(encrypted, self.key))
+
+        self.assertEqual(mock_cipher.call_count, 1)
+
+    def test_invalid_value(self):
+        encrypted = list(service.encrypt_attr_values(self.data, self.key))
+        encrypted[5] = 'foo'
+
+        results = service.decrypt_attr_values(encrypted, self.key, backend='thread')
+        with self.assertRaises(ValueError):
+            list(results)
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            service.encrypt_attr_values(self.data, self.key, backend='cloud')
+
+        with self.assertRaises(ValueError):
+            service.decrypt_attr_values([], self.key, backend='cloud')
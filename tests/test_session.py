@@ -1,11 +1,16 @@
+import os
+import shutil
+import tempfile
+import threading
 import logging
 
+import yaml
 import unittest
 import mock
 
 from cryptography.exceptions import InvalidSignature
 
-from oneid import session, service, keychain, jwts, exceptions
+from oneid import session, service, keychain, jwts, tokens, exceptions
 
 logger = logging.getLogger(__name__)
 
@@ -104,7 +109,7 @@ class TestBaseSession(unittest.TestCase):
         self.assertRaises(TypeError, base.make_http_request,
                           "UNKOWN", "http://localhost:8080")
 
-    @mock.patch('oneid.session.request', side_effect=mock_request)
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
     def test_authentication_error(self, mock_request):
         base = session.SessionBase()
         self.assertRaises(exceptions.InvalidAuthentication,
@@ -200,6 +205,20 @@ class TestDeviceSession(unittest.TestCase):
         self.assertIn("b", claims)
         self.assertEqual(claims.get("b"), 2)
 
+    def test_verify_parsed_message(self):
+        message = jwts.ParsedJWS(jwts.make_jws(
+            {'b': 2},
+            [self.mock_proj_keypair, self.mock_oneid_keypair]
+        ))
+
+        sess = session.DeviceSession(
+            self.id_credentials, self.proj_credentials, self.oneid_credentials
+        )
+
+        claims = sess.verify_message(message)
+        self.assertIsInstance(claims, dict)
+        self.assertEqual(claims.get("b"), 2)
+
     def test_verify_message_with_rekey(self):
         message = jwts.make_jws({'c': 3}, [
             self.mock_proj_keypair, self.mock_oneid_keypair,
@@ -320,7 +339,7 @@ class TestServerSession(unittest.TestCase):
 
         self.assertTrue(hasattr(sess, "test_service"))
 
-    @mock.patch('oneid.session.request', side_effect=mock_request)
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
     def test_service_request(self, mock_request):
         sess = session.ServerSession(
             identity_credentials=self.server_credentials,
@@ -330,6 +349,64 @@ class TestServerSession(unittest.TestCase):
         test_method = sess.test_service.test_method()
         self.assertEqual(test_method, "tested")
 
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
+    def test_service_request_auth_tokens(self, mock_request):
+        sess = session.ServerSession(
+            identity_credentials=self.server_credentials,
+            config=self.fake_config,
+        )
+
+        sess.test_service.test_method()
+        auth_tokens = sess.auth_tokens
+        sess.test_service.test_method()
+        self.assertIs(sess.auth_tokens, auth_tokens)
+
+        auth_headers = [call[1]['headers']['Authorization'] for call in mock_request.call_args_list]
+        self.assertEqual(len(set(auth_headers)), 2)
+
+        for auth_header in auth_headers:
+            self.assertTrue(jwts.verify_jwt(
+                auth_header.split(' ', 1)[1], self.server_credentials.keypair
+            ))
+
+        sess.identity_credentials = keychain.Credentials(
+            'other', service.create_secret_key()
+        )
+        sess.test_service.test_method()
+        self.assertIsNot(sess.auth_tokens, auth_tokens)
+
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
+    def test_short_lived_sessions_start_no_threads(self, mock_request):
+        threads = threading.active_count()
+
+        for _ in range(20):
+            sess = session.ServerSession(
+                identity_credentials=self.server_credentials,
+                config=self.fake_config,
+            )
+            sess.test_service.test_method()
+
+        self.assertEqual(threading.active_count(), threads)
+
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
+    def test_close(self, mock_request):
+        with session.ServerSession(
+            identity_credentials=self.server_credentials,
+            config=self.fake_config,
+        ) as sess:
+            for _ in range(tokens.AUTH_TOKEN_PREFETCH_AFTER):
+                sess.test_service.test_method()
+
+            minter = sess.auth_tokens._minter
+            self.assertTrue(minter.is_alive())
+
+        self.assertIsNone(sess.auth_tokens)
+        minter.join(5)
+        self.assertFalse(minter.is_alive())
+
+        # closing again is harmless
+        sess.close()
+
     def test_prepare_message(self):
         sess = session.ServerSession(
             identity_credentials=self.server_credentials,
@@ -437,7 +514,7 @@ class TestAdminSession(unittest.TestCase):
                                     config=self.custom_config)
         self.assertRaises(TypeError, sess.test_service.test_method)
 
-    @mock.patch('oneid.session.request', side_effect=mock_request)
+    @mock.patch('oneid.transport.HTTPTransport.request', side_effect=mock_request)
     def test_admin_session_service_request(self, mock_request):
         """
         Revoke a device
@@ -447,3 +524,145 @@ class TestAdminSession(unittest.TestCase):
                                     config=self.custom_config)
         response = sess.test_service.test_method(my_argument='Hello World')
         self.assertEqual(response, 'hello world')
+
+
+class TestSessionConfigCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.tempdir, 'config.yaml')
+        self.write_config('/my/endpoint')
+
+        keypair = keychain.Keypair.from_secret_pem(key_bytes=TestSession.id_key_bytes)
+        self.credentials = keychain.Credentials('me', keypair)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write_config(self, endpoint, mtime=None):
+        with open(self.config_path, 'w') as config:
+            config.write(
+                'GLOBAL:\n'
+                '  base_url: https://myservice\n'
+                'test_service:\n'
+                '  test_method:\n'
+                '    endpoint: {}\n'
+                '    method: GET\n'
+                '    arguments: {{}}\n'.format(endpoint)
+            )
+
+        if mtime:
+            os.utime(self.config_path, (mtime, mtime))
+
+    def test_reuses_config_and_classes(self):
+        with mock.patch('yaml.safe_load', wraps=yaml.safe_load) as mock_load:
+            sess1 = session.ServerSession(self.credentials, config=self.config_path)
+            sess2 = session.ServerSession(self.credentials, config=self.config_path)
+
+        self.assertEqual(mock_load.call_count, 1)
+        self.assertIs(type(sess1.test_service), type(sess2.test_service))
+        self.assertIsNot(sess1.test_service, sess2.test_service)
+        self.assertIs(sess2.test_service.session, sess2)
+
+    def test_default_config(self):
+        sess1 = session.ServerSession(self.credentials)
+        sess2 = session.ServerSession(self.credentials)
+        self.assertIs(type(sess1.authenticate), type(sess2.authenticate))
+
+        admin = session.AdminSession(self.credentials)
+        self.assertIsNot(type(admin.revoke), type(sess1.authenticate))
+
+    def test_modified_config(self):
+        sess1 = session.ServerSession(self.credentials, config=self.config_path)
+        self.write_config('/other/endpoint', mtime=os.path.getmtime(self.config_path) + 10)
+        sess2 = session.ServerSession(self.credentials, config=self.config_path)
+
+        self.assertIsNot(type(sess1.test_service), type(sess2.test_service))
+
+        with mock.patch('oneid.transport.HTTPTransport.request') as mock_request:
+            sess2.test_service.test_method()
+
+        self.assertEqual(mock_request.call_args[0][1], 'https://myservice/other/endpoint')
+
+    def test_project_credentials_not_shared(self):
+        project_credentials = keychain.Credentials('proj', self.credentials.keypair)
+
+        sess1 = session.ServerSession(self.credentials, project_credentials=project_credentials,
+                                      config=self.config_path)
+        sess2 = session.ServerSession(self.credentials, config=self.config_path)
+
+        self.assertEqual(sess1.test_service.project_id, 'proj')
+        self.assertFalse(hasattr(sess2.test_service, 'project_id'))
+        self.assertNotIn('project_credentials', sess2._load_config(self.config_path)['GLOBAL'])
+
+    def test_config_dict_not_cached(self):
+        config = {
+            'GLOBAL': {'base_url': 'https://myservice'},
+            'test_service': {},
+        }
+        project_credentials = keychain.Credentials('proj', self.credentials.keypair)
+
+        sess1 = session.ServerSession(self.credentials, project_credentials=project_credentials,
+                                      config=config)
+        sess2 = session.ServerSession(self.credentials, config=config)
+
+        self.assertIsNot(type(sess1.test_service), type(sess2.test_service))
+        self.assertEqual(config['GLOBAL'], {'base_url': 'https://myservice'})
+
+    def test_disk_cache(self):
+        cache_dir = os.path.join(self.tempdir, 'cache')
+        os.mkdir(cache_dir)
+
+        with mock.patch('oneid.session.CONFIG_CACHE_DIR', cache_dir):
+            session._config_cache.clear()
+            params = session.SessionBase()._load_config(self.config_path)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            session._config_cache.clear()
+            with mock.patch('yaml.safe_load') as mock_load:
+                cached_params = session.SessionBase()._load_config(self.config_path)
+
+            self.assertEqual(mock_load.call_count, 0)
+            self.assertEqual(cached_params, params)
+
+            # a stale cache is re-parsed
+            self.write_config('/other/endpoint', mtime=os.path.getmtime(self.config_path) + 10)
+            params = session.SessionBase()._load_config(self.config_path)
+            self.assertEqual(params['test_service']['test_method']['endpoint'], '/other/endpoint')
+
+    def test_bad_disk_cache(self):
+        cache_dir = os.path.join(self.tempdir, 'cache')
+        os.mkdir(cache_dir)
+
+        with mock.patch('oneid.session.CONFIG_CACHE_DIR', cache_dir):
+            session._config_cache.clear()
+            session.SessionBase()._load_config(self.config_path)
+
+            cache_file = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+            with open(cache_file, 'w') as f:
+                f.write('not json')
+
+            session._config_cache.clear()
+            params = session.SessionBase()._load_config(self.config_path)
+            self.assertEqual(params['GLOBAL']['base_url'], 'https://myservice')
+
+    def test_unwritable_disk_cache(self):
+        missing_dir = os.path.join(self.tempdir, 'missing')
+
+        with mock.patch('oneid.session.CONFIG_CACHE_DIR', missing_dir):
+            session._config_cache.clear()
+            params = session.SessionBase()._load_config(self.config_path)
+
+        self.assertEqual(params['GLOBAL']['base_url'], 'https://myservice')
+
+    def test_failed_disk_cache_write(self):
+        cache_dir = os.path.join(self.tempdir, 'cache')
+        os.mkdir(cache_dir)
+
+        with mock.patch('oneid.session.CONFIG_CACHE_DIR', cache_dir):
+            session._config_cache.clear()
+            with mock.patch('json.dump', side_effect=ValueError('unserializable')):
+                params = session.SessionBase()._load_config(self.config_path)
+
+        self.assertEqual(params['GLOBAL']['base_url'], 'https://myservice')
+        # the partly-written temporary file was removed
+        self.assertEqual(os.listdir(cache_dir), [])
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import logging
+
+import unittest
+import six
+
+from cryptography.hazmat.primitives.asymmetric.utils \
+    import decode_dss_signature, encode_dss_signature
+
+from oneid import signatures
+
+logger = logging.getLogger(__name__)
+
+
+class TestSignatureCodec(unittest.TestCase):
+    SIZES = [32, 48, 66]
+
+    def _values(self, size):
+        yield 0
+        yield 1
+        yield 0x7f
+        yield 0x80
+        yield 2 ** (size * 8) - 1
+        yield 2 ** (size * 8 - 1)
+
+        for _ in range(50):
+            yield signatures.bytes_to_int(os.urandom(size))
+
+        for _ in range(50):
+            yield signatures.bytes_to_int(os.urandom(size)) >> (8 * (size // 2))
+
+    def test_raw_to_der(self):
+        for size in self.SIZES:
+            for r in self._values(size):
+                s = signatures.bytes_to_int(os.urandom(size))
+                raw = signatures.int_to_bytes(r, size) + signatures.int_to_bytes(s, size)
+
+                self.assertEqual(signatures.raw_to_der(raw), encode_dss_signature(r, s))
+
+    def test_der_to_raw(self):
+        for size in self.SIZES:
+            for r in self._values(size):
+                s = signatures.bytes_to_int(os.urandom(size))
+                der = encode_dss_signature(r, s)
+                raw = signatures.der_to_raw(der, size)
+
+                self.assertEqual(len(raw), 2 * size)
+                self.assertEqual(signatures.bytes_to_int(raw[:size]), r)
+                self.assertEqual(signatures.bytes_to_int(raw[size:]), s)
+                self.assertEqual(decode_dss_signature(signatures.raw_to_der(raw)), (r, s))
+
+    def test_invalid_raw(self):
+        for raw in [b'', b'\x01', b'\x01\x02\x03']:
+            with self.assertRaises(ValueError):
+                signatures.raw_to_der(raw)
+
+    def test_invalid_der(self):
+        valid = encode_dss_signature(0x1234, 0x5678)
+
+        for der in [
+            b'',
+            b'\x31' + valid[1:],
+            valid[:-1],
+            valid + b'\x00',
+            b'\x30\x06\x03\x02\x12\x34\x02\x02\x56\x78',
+            b'\x30\x06\x02\x02\x12\x34\x02\x00\x56\x78',
+            b'\x30\x06\x02\x02\x12\x34\x02\x03\x56\x78',
+            b'\x30\x06\x02\x02\x92\x34\x02\x02\x56\x78',
+            b'\x30\x07\x02\x03\x00\x12\x34\x02\x02\x56\x78',
+            b'\x30\x80',
+            b'\x30\x81\x06\x02\x02\x12\x34\x02\x02\x56\x78',
+            b'\x30\x85\x00\x00\x00\x00\x06',
+            b'\x30\x06\x02\x02\x12\x34',
+            b'\x30\x04\x02\x02\x12\x34',
+            b'\x30\x05\x02\x02\x12\x34\x02',
+        ]:
+            with self.assertRaises(ValueError):
+                signatures.der_to_raw(der, 32)
+
+    def test_malformed_der(self):
+        # each well-framed, so that it reaches the intended check
+        for der, message in [
+            (b'\x30\x09\x02\x02\x12\x34\x02\x02\x56\x78\x00', 'unexpected data'),
+            (b'\x30\x06\x02\x00\x02\x02\x56\x78', 'invalid DER INTEGER length'),
+            (b'\x30\x08\x02\x02\x12\x34\x02\x03\x56\x78', 'invalid DER INTEGER length'),
+            (b'\x30\x08\x02\x02\x92\x34\x02\x02\x56\x78', 'must be positive'),
+            (b'\x30\x09\x02\x03\x00\x12\x34\x02\x02\x56\x78', 'non-minimal DER INTEGER'),
+        ]:
+            with six.assertRaisesRegex(self, ValueError, message):
+                signatures.der_to_raw(der, 32)
+
+    def test_der_value_too_large(self):
+        der = encode_dss_signature(2 ** 256, 1)
+
+        with self.assertRaises(ValueError):
+            signatures.der_to_raw(der, 32)
+
+    def test_long_form_length(self):
+        r = s = 2 ** 527 - 1
+        der = encode_dss_signature(r, s)
+
+        self.assertEqual(signatures.raw_to_der(signatures.der_to_raw(der, 66)), der)
+
+    def test_int_to_bytes(self):
+        self.assertEqual(signatures.int_to_bytes(1, 4), b'\x00\x00\x00\x01')
+        self.assertEqual(signatures.bytes_to_int(b'\x00\x00\x01\x00'), 256)
+
+        with self.assertRaises(OverflowError):
+            signatures.int_to_bytes(2 ** 32, 4)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import time
+import logging
+
+import unittest
+import mock
+
+from oneid import tokens, service, jwts, nonces
+
+logger = logging.getLogger(__name__)
+
+
+class TestAuthTokenProvider(unittest.TestCase):
+    def setUp(self):
+        self.keypair = service.create_secret_key()
+        self.keypair.identity = 'my-id'
+        self.provider = tokens.AuthTokenProvider(self.keypair, pool_size=4, prefetch_after=1)
+
+    def tearDown(self):
+        self.provider.close()
+
+    def wait_for_pool(self, size):
+        for _ in range(500):
+            if len(self.provider._tokens) >= size:
+                return
+            time.sleep(0.01)
+
+        self.fail('pool was not refilled')
+
+    def test_get_token(self):
+        token = self.provider.get_token()
+        claims = jwts.verify_jwt(token, self.keypair)
+
+        self.assertEqual(claims['iss'], 'my-id')
+
+    def test_prefills_pool(self):
+        self.provider.get_token()
+        self.wait_for_pool(4)
+
+        self.assertEqual(len(self.provider._tokens), 4)
+
+    def test_tokens_used_once(self):
+        nonce_store = nonces.MemoryNonceStore()
+
+        for _ in range(20):
+            token = self.provider.get_token()
+            self.assertTrue(jwts.verify_jwt(token, self.keypair, nonce_store=nonce_store))
+            self.wait_for_pool(1)
+
+        self.assertEqual(len(nonce_store), 20)
+
+    def test_discards_old_tokens(self):
+        self.provider.get_token()
+        self.wait_for_pool(4)
+        pooled = set(token for _, token in self.provider._tokens)
+
+        with mock.patch('time.time', return_value=time.time() + tokens.AUTH_TOKEN_MAX_AGE_SEC + 1):
+            token = self.provider._pop_token()
+
+        self.assertIsNone(token)
+        self.assertNotIn(self.provider.get_token(), pooled)
+
+    def test_no_pool(self):
+        provider = tokens.AuthTokenProvider(self.keypair, pool_size=0)
+
+        self.assertTrue(jwts.verify_jwt(provider.get_token(), self.keypair))
+        self.assertIsNone(provider._minter)
+
+    def test_prefetch_after(self):
+        provider = tokens.AuthTokenProvider(self.keypair, pool_size=4)
+
+        for _ in range(tokens.AUTH_TOKEN_PREFETCH_AFTER - 1):
+            self.assertTrue(jwts.verify_jwt(provider.get_token(), self.keypair))
+            self.assertIsNone(provider._minter)
+
+        provider.get_token()
+        self.assertIsNotNone(provider._minter)
+        provider.close()
+
+    def test_idle_minter_stops(self):
+        provider = tokens.AuthTokenProvider(self.keypair, pool_size=4, max_age=0.05,
+                                            prefetch_after=1)
+        provider.get_token()
+        minter = provider._minter
+
+        minter.join(5)
+        self.assertFalse(minter.is_alive())
+        self.assertIsNone(provider._minter)
+        self.assertEqual(len(provider._tokens), 0)
+
+        provider.get_token()
+        self.assertIsNotNone(provider._minter)
+        self.assertIsNot(provider._minter, minter)
+        provider.close()
+
+    def test_idle_minter_keeps_running_when_requested(self):
+        self.provider.get_token()
+        self.provider._refill_needed.set()
+
+        self.assertFalse(self.provider._stop_idle_minter())
+        self.assertIsNotNone(self.provider._minter)
+
+    def test_close(self):
+        self.provider.get_token()
+        self.wait_for_pool(4)
+        self.provider.close()
+
+        self.assertEqual(len(self.provider._tokens), 0)
+        self.assertTrue(jwts.verify_jwt(self.provider.get_token(), self.keypair))
+
+        self.provider._minter.join(1)
+        self.assertFalse(self.provider._minter.is_alive())
+
+    def test_new_pool_after_fork(self):
+        self.provider.get_token()
+        self.wait_for_pool(4)
+        minter = self.provider._minter
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.provider.get_token()
+
+        self.assertIsNot(self.provider._minter, minter)
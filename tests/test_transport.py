@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import threading
+import logging
+
+import unittest
+import mock
+
+from six.moves import BaseHTTPServer
+
+from oneid import transport, session
+
+logger = logging.getLogger(__name__)
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.client_ports.add(self.client_address[1])
+        self.server.cookies.append(self.headers.get('Cookie'))
+
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'tenant=me; Path=/')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPTransport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.server.client_ports = set()
+        cls.server.cookies = []
+        cls.url = 'http://127.0.0.1:{}/'.format(cls.server.server_port)
+
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.client_ports.clear()
+        del self.server.cookies[:]
+        self.transport = transport.HTTPTransport()
+
+    def tearDown(self):
+        self.transport.close()
+
+    def test_request(self):
+        response = self.transport.request('GET', self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'ok')
+
+    def test_reuses_connections(self):
+        for _ in range(5):
+            self.transport.request('GET', self.url)
+
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_no_cookies(self):
+        for _ in range(2):
+            self.transport.request('GET', self.url)
+
+        self.assertEqual(self.server.cookies, [None, None])
+        self.assertEqual(len(self.transport._get_session().cookies), 0)
+
+    def test_close(self):
+        self.transport.request('GET', self.url)
+        self.transport.close()
+        self.transport.request('GET', self.url)
+
+        self.assertEqual(len(self.server.client_ports), 2)
+
+    def test_new_pools_after_fork(self):
+        self.transport.request('GET', self.url)
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.transport.request('GET', self.url)
+
+        self.assertEqual(len(self.server.client_ports), 2)
+
+    def test_timeouts(self):
+        custom = transport.HTTPTransport(connect_timeout=1, read_timeout=2)
+        self.assertEqual(custom.timeout, (1, 2))
+
+        with mock.patch('requests.Session.request') as mock_request:
+            custom.request('POST', self.url, headers={'a': 'b'}, data='body')
+
+        mock_request.assert_called_once_with(
+            'POST', self.url, headers={'a': 'b'}, data='body', timeout=(1, 2),
+        )
+
+    def test_pool_size(self):
+        custom = transport.HTTPTransport(pool_connections=2, pool_maxsize=7)
+        adapter = custom._get_session().get_adapter(self.url)
+
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 7)
+
+
+class TestDefaultTransport(unittest.TestCase):
+    def tearDown(self):
+        transport.set_default_transport(None)
+
+    def test_shared(self):
+        self.assertIs(transport.get_default_transport(), transport.get_default_transport())
+        self.assertIs(session.SessionBase().transport, session.SessionBase().transport)
+
+    def test_set_default(self):
+        custom = transport.HTTPTransport()
+        transport.set_default_transport(custom)
+
+        self.assertIs(transport.get_default_transport(), custom)
+        self.assertIs(session.SessionBase().transport, custom)
+
+    def test_session_transport(self):
+        custom = transport.HTTPTransport()
+        self.assertIs(session.SessionBase(transport=custom).transport, custom)
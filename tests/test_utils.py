@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+import os
+import time
+import calendar
+import logging
+
+import unittest
+import mock
+
+from oneid import utils
+
+logger = logging.getLogger(__name__)
+
+
+class TestNonceTimestamps(unittest.TestCase):
+    def test_parse_nonce_timestamp(self):
+        for year in (2000, 2016, 2024, 2100, 2400):
+            for month in range(1, 13):
+                timestamp = calendar.timegm((year, month, 28, 23, 59, 58))
+                nonce = '001{}aB3dE6'.format(
+                    time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+                )
+                self.assertEqual(utils.parse_nonce_timestamp(nonce), timestamp)
+
+    def test_parse_nonce_timestamp_leap_day(self):
+        self.assertEqual(
+            utils.parse_nonce_timestamp('0012016-02-29T00:00:00Z123456'),
+            calendar.timegm((2016, 2, 29, 0, 0, 0)),
+        )
+        self.assertIsNone(utils.parse_nonce_timestamp('0012015-02-29T00:00:00Z123456'))
+        self.assertIsNone(utils.parse_nonce_timestamp('0012100-02-29T00:00:00Z123456'))
+        self.assertIsNone(utils.parse_nonce_timestamp('0012016-04-31T00:00:00Z123456'))
+
+    def test_parse_invalid_nonces(self):
+        for nonce in [
+            '',
+            '0022016-01-01T00:00:00Z123456',
+            '0011999-01-01T00:00:00Z123456',
+            '0012016-13-01T00:00:00Z123456',
+            '0012016-01-01T24:00:00Z123456',
+            '0012016-01-01T00:60:00Z123456',
+            '0012016-01-01T00:00:00Z12345',
+            '0012016-01-01T00:00:00Z1234567',
+            '0012016-01-01T00:00:00Z12345!',
+            '0012016-01-01T00:00:00Z123456\n',
+            '001２016-01-01T00:00:00Z123456',
+        ]:
+            self.assertIsNone(utils.parse_nonce_timestamp(nonce), nonce)
+
+    def test_verify_and_burn_nonce(self):
+        now = int(time.time())
+
+        for offset, valid in [(0, True), (-59 * 60, True), (60, True),
+                              (-61 * 60, False), (3 * 60, False)]:
+            nonce = '001{}123456'.format(
+                time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now + offset))
+            )
+            self.assertEqual(utils.verify_and_burn_nonce(nonce), valid, offset)
+
+        self.assertFalse(utils.verify_and_burn_nonce('bogus'))
+
+
+class TestNonceGenerator(unittest.TestCase):
+    def test_format(self):
+        generator = utils.NonceGenerator()
+
+        for _ in range(100):
+            nonce = generator()
+            self.assertIsNotNone(utils.parse_nonce_timestamp(nonce), nonce)
+            self.assertTrue(utils.verify_and_burn_nonce(nonce))
+
+    def test_alphabet(self):
+        legacy_chars = ''.join(
+            chr(i) for i in range(128) if chr(i).isalpha() or chr(i).isalnum()
+        )
+        self.assertEqual(utils.NONCE_CHARS, legacy_chars)
+
+    def test_refill(self):
+        generator = utils.NonceGenerator(buffer_size=8)
+        nonces = [generator() for _ in range(100)]
+
+        self.assertEqual(len(set(nonces)), len(nonces))
+        for nonce in nonces:
+            self.assertTrue(set(nonce[-6:]) <= set(utils.NONCE_CHARS))
+
+    def test_timestamp(self):
+        generator = utils.NonceGenerator()
+
+        with mock.patch('time.time', return_value=1460000000.5):
+            self.assertTrue(generator().startswith('0012016-04-07T03:33:20Z'))
+        with mock.patch('time.time', return_value=1460000001.0):
+            self.assertTrue(generator().startswith('0012016-04-07T03:33:21Z'))
+
+    def test_after_fork(self):
+        generator = utils.NonceGenerator()
+        generator()
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            os.write(write_fd, utils.to_bytes(generator()))
+            os._exit(0)
+
+        os.waitpid(pid, 0)
+        child_nonce = utils.to_string(os.read(read_fd, 64))
+        os.close(read_fd)
+        os.close(write_fd)
+
+        self.assertNotEqual(child_nonce[-6:], generator()[-6:])